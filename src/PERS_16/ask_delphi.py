@@ -1,3 +1,4 @@
+import os
 import re
 import json
 import httpx
@@ -14,6 +15,13 @@ class Delphi(Enum):
     SAROSH_KHANNA = "sarosh"
 
 
+DEFAULT_DELPHI_BASE_URL = "https://www.delphi.ai"
+
+
+def _base_url() -> str:
+    # Read at call time, so a local stand-in server can be targeted by setting the variable (see `delphi_stub.py`)
+    return os.getenv("DELPHI_BASE_URL", DEFAULT_DELPHI_BASE_URL).rstrip("/")
+
 
 async def _init_conversation(delphi: Delphi, auth_token: str | None = None) -> str:
 
@@ -26,7 +34,7 @@ async def _init_conversation(delphi: Delphi, auth_token: str | None = None) -> s
 
     async with httpx.AsyncClient() as client:
         response = await client.get(
-            f'https://www.delphi.ai/{delphi.value}/talk',
+            f'{_base_url()}/{delphi.value}/talk',
             cookies=cookies,
             timeout=httpx.Timeout(connect=10.0, read=15.0, write=10.0, pool=10.0),
         )
@@ -73,7 +81,7 @@ async def ask_delphi(message: str, delphi: Delphi, auth_token: str | None = None
     async with httpx.AsyncClient() as client:
         async with client.stream(
             'POST',
-            'https://www.delphi.ai/api/clone/talk/messages/stream',
+            f'{_base_url()}/api/clone/talk/messages/stream',
             json=json_data,
             headers={"Accept": "text/event-stream"},
             timeout=httpx.Timeout(connect=10.0, read=None, write=10.0, pool=10.0),
@@ -99,6 +107,9 @@ async def ask_delphi(message: str, delphi: Delphi, auth_token: str | None = None
 
                 buffer.append(line)
 
+    if last_message is None:
+        raise ValueError("No message received")
+
     return last_message.strip()
 
 
@@ -291,3 +291,21 @@ Options:
 Start by thinking outloud about how accurately this statement describes you.
 Then finish your answer with the letter of the option. Your answer must end like this ": <letter>", including the colon and the letter, without the quotes nor any punctuation.
 """
+
+
+BATCHED_QUESTION_TEMPLATE = """\
+Questions: Given the following {num_questions} statements of you:
+{statements}
+
+For each statement, please choose from the following options to identify how accurately it describes you.
+
+Options:
+• A. Very Accurate
+• B. Moderately Accurate
+• C. Neither Accurate Nor Inaccurate
+• D. Moderately Inaccurate
+• E. Very Inaccurate
+
+Answer each statement independently, with one line per statement in the form "<number>: <letter>" (e.g. "1: C"), from 1 to {num_questions}.
+Limit yourself to only letters A, B, C, D, or E, as corresponding to the options given. Only output these lines, no other text.
+"""
@@ -0,0 +1,349 @@
+"""
+Local stand-in of the Delphi endpoints used by `ask_delphi.py`, for load and regression testing without www.delphi.ai.
+
+    1. `serve`: runs the stand-in server (stdlib asyncio, no dependency). It mimics:
+       - `GET /<slug>/talk`: an HTML page with the conversation id embedded in an escaped JSON payload
+       - `POST /api/clone/talk/messages/stream`: a Server-Sent Events stream of cumulative `{"text": ...}` events
+       with a configurable first-event latency, token rate, share of dropped connections and of malformed events.
+       Point the PERS-16 scripts at it with `DELPHI_BASE_URL=http://127.0.0.1:<port>`.
+    2. `benchmark`: starts the server in a background thread and drives the PERS-16 flows against it (one question
+       per message, batched questionnaire, open-ended dataset generation). Reports questions/s, messages, retried and
+       failed calls, the latency percentiles of the `ask_delphi` calls (retries included) and the faults the server
+       injected (dropped streams, malformed events), so the retries they cause are not hidden in the latencies.
+
+The answers follow the prompt templates (a letter, a reasoning ending with ": <letter>", "<number>: <letter>" lines or
+free text), and the letter of a statement is a deterministic function of the clone and the statement, so the flows parse
+them like real answers.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import threading
+import numpy as np
+import evaluate
+import generate_delphi_dataset
+
+from typing import Any, Callable, Dict, Iterator, List
+from contextlib import contextmanager
+from pydantic import BaseModel
+from tenacity import RetryCallState
+from ask_delphi import ask_delphi, Delphi
+
+
+LETTERS = "ABCDE"
+FILLER_WORDS = "I think that honestly this is something I have reflected on a lot over the years and it shaped how I work".split()
+
+_STATEMENT_REGEX = re.compile(r"“You (.+?)\.”")
+_NUMBERED_STATEMENT_REGEX = re.compile(r"^(\d+)\. “You (.+?)\.”", flags=re.MULTILINE)
+
+
+class StubConfig(BaseModel):
+    latency: float = 0.2 # seconds before the first event
+    latency_jitter: float = 0.1 # uniform extra latency, in seconds
+    tokens_per_second: float = 500.0 # one event per word
+    disconnect_rate: float = 0.0 # share of streams cut before their end
+    malformed_rate: float = 0.0 # share of streams with an invalid JSON event
+    answer_words: int = 60 # length of the free-text answers
+    seed: int = 0
+
+
+class DelphiStubServer:
+    def __init__(self, config: StubConfig) -> None:
+        self.config = config
+        self.counters = {"talk_pages": 0, "streams": 0, "disconnects": 0, "malformed_events": 0, "unknown_conversations": 0}
+        self._conversations: set[str] = set()
+        self._rng = random.Random(config.seed)
+        self._server: asyncio.Server | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+            request_line, *header_lines = head.rstrip("\r\n").split("\r\n")
+            method, path, _ = request_line.split(" ", 2)
+            headers = {name.strip().lower(): value.strip() for name, value in (line.split(":", 1) for line in header_lines if ":" in line)}
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            talk_match = re.fullmatch(r"/([^/]+)/talk", path.split("?")[0])
+            if method == "GET" and talk_match is not None:
+                await self._talk_page(writer, talk_match.group(1))
+            elif method == "POST" and path == "/api/clone/talk/messages/stream":
+                await self._stream(writer, json.loads(body))
+            else:
+                await self._respond(writer, 404, "application/json", json.dumps({"error": "not found"}).encode())
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, content_type: str, body: bytes) -> None:
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def _talk_page(self, writer: asyncio.StreamWriter, slug: str) -> None:
+        conversation_id = str(uuid.uuid4())
+        self._conversations.add(conversation_id)
+        self.counters["talk_pages"] += 1
+
+        # Same shape as the Next.js flight data of the real page: JSON with escaped quotes inside a script string
+        payload = json.dumps({"clone": {"slug": slug}, "conversation": {"id": conversation_id, "messages": []}}).replace('"', '\\"')
+        html = f'<!DOCTYPE html><html><head><title>{slug}</title></head><body><script>self.__next_f.push([1,"{payload}"])</script></body></html>'
+        await self._respond(writer, 200, "text/html; charset=utf-8", html.encode())
+
+    async def _stream(self, writer: asyncio.StreamWriter, data: Dict[str, Any]) -> None:
+        message = data["message"]
+        if message["conversationId"] not in self._conversations:
+            self.counters["unknown_conversations"] += 1
+            await self._respond(writer, 404, "application/json", json.dumps({"error": "conversation not found"}).encode())
+            return
+
+        self.counters["streams"] += 1
+        words = answer(message["text"], message["slug"], self.config.answer_words).split(" ")
+        disconnect_at = self._rng.randrange(len(words)) if self._rng.random() < self.config.disconnect_rate else None
+        malformed_at = self._rng.randrange(len(words)) if self._rng.random() < self.config.malformed_rate else None
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        await asyncio.sleep(self.config.latency + self._rng.random() * self.config.latency_jitter)
+
+        for index in range(len(words)):
+            if index == disconnect_at:
+                # NOTE: closed without the terminating chunk, the client sees an incomplete body (not a short answer)
+                self.counters["disconnects"] += 1
+                return
+
+            event = f"data: {json.dumps({'text': ' '.join(words[:index + 1])})}\n\n"
+            if index == malformed_at:
+                self.counters["malformed_events"] += 1
+                event = event[:len(event) // 2] + "\n\n"
+
+            chunk = event.encode()
+            writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            await writer.drain()
+            await asyncio.sleep(1 / self.config.tokens_per_second)
+
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+def _letter(slug: str, statement: str) -> str:
+    return LETTERS[hashlib.sha256(f"{slug}:{statement}".encode()).digest()[0] % len(LETTERS)]
+
+
+def answer(text: str, slug: str, answer_words: int) -> str:
+    """Answer of the stand-in clone, in the format asked by the PERS-16 templates."""
+
+    filler = " ".join(FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(answer_words))
+
+    numbered_statements = _NUMBERED_STATEMENT_REGEX.findall(text)
+    if len(numbered_statements) > 0:
+        return "\n".join(f"{number}: {_letter(slug, statement)}" for number, statement in numbered_statements)
+
+    statement = _STATEMENT_REGEX.search(text)
+    if statement is not None and "Only output the letter" in text:
+        return _letter(slug, statement.group(1))
+    if statement is not None and "finish your answer with the letter" in text:
+        return f"{filler}: {_letter(slug, statement.group(1))}"
+
+    return filler
+
+
+@contextmanager
+def running_server(config: StubConfig) -> Iterator[DelphiStubServer]:
+    """Runs the server on its own event loop in a background thread, with `DELPHI_BASE_URL` pointing to it."""
+
+    loop = asyncio.new_event_loop()
+    server = DelphiStubServer(config)
+    port = loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    previous_base_url = os.environ.get("DELPHI_BASE_URL")
+    os.environ["DELPHI_BASE_URL"] = f"http://127.0.0.1:{port}"
+    try:
+        yield server
+    finally:
+        if previous_base_url is None:
+            del os.environ["DELPHI_BASE_URL"]
+        else:
+            os.environ["DELPHI_BASE_URL"] = previous_base_url
+
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.run_until_complete(server.close())
+        loop.close()
+
+
+@contextmanager
+def _timed_ask_delphi(latencies: List[float], failures: List[str], retries: List[str]) -> Iterator[None]:
+    """
+    Swaps the `ask_delphi` used by the PERS-16 flows for a wrapper recording the latency of every successful call, the
+    errors of the attempts `ask_delphi` retried on its own, and the errors of the calls that failed after its retries.
+    """
+
+    def _record_retry(retry_state: RetryCallState) -> None:
+        retries.append(type(retry_state.outcome.exception()).__name__)
+
+    # Same retry policy as `ask_delphi`, with the retried attempts recorded
+    _ask_delphi = ask_delphi.retry_with(before_sleep=_record_retry)
+
+    async def _timed(message: str, delphi: Delphi, auth_token: str | None = None) -> str:
+        start = time.perf_counter()
+        try:
+            response = await _ask_delphi(message, delphi, auth_token)
+        except Exception as _error:
+            failures.append(type(_error).__name__)
+            raise
+        latencies.append(time.perf_counter() - start)
+        return response
+
+    modules = [evaluate, generate_delphi_dataset]
+    for module in modules:
+        module.ask_delphi = _timed
+    try:
+        yield
+    finally:
+        for module in modules:
+            module.ask_delphi = ask_delphi
+
+
+async def _single_flow() -> int:
+    await evaluate.evaluate_model_pers_16(use_cot=True)
+    return len(evaluate.IPIP_QUESTIONS)
+
+
+async def _batched_flow(batch_size: int) -> int:
+    await evaluate.evaluate_model_pers_16_batched(batch_size=batch_size)
+    return len(evaluate.IPIP_QUESTIONS)
+
+
+async def _open_ended_flow() -> int:
+    with tempfile.TemporaryDirectory() as directory:
+        responses = await generate_delphi_dataset.generate_delphi_dataset(Delphi.SAROSH_KHANNA, os.path.join(directory, "answers.txt"))
+    return len(responses)
+
+
+def run_benchmark(config: StubConfig, flows: Dict[str, Callable[[], Any]]) -> Dict[str, Dict]:
+    results = {}
+
+    for name, flow in flows.items():
+        latencies: List[float] = []
+        failures: List[str] = []
+        retries: List[str] = []
+
+        with running_server(config) as server, _timed_ask_delphi(latencies, failures, retries):
+            start = time.perf_counter()
+            num_questions = asyncio.run(flow())
+            duration = time.perf_counter() - start
+
+        percentiles = np.percentile(latencies, [50, 90, 99]) if latencies else [float("nan")] * 3
+        results[name] = {
+            "num_questions": num_questions,
+            "num_messages": len(latencies) + len(failures),
+            "num_failed_calls": len(failures),
+            "failures": {failure: failures.count(failure) for failure in set(failures)},
+            "num_retries": len(retries),
+            "retried_errors": {retry: retries.count(retry) for retry in set(retries)},
+            "duration": duration,
+            "questions_per_second": num_questions / duration,
+            "latency_p50": float(percentiles[0]),
+            "latency_p90": float(percentiles[1]),
+            "latency_p99": float(percentiles[2]),
+            "server": dict(server.counters),
+        }
+
+    return results
+
+
+def print_benchmark(results: Dict[str, Dict]) -> None:
+    print(
+        f"{'flow':<12} {'questions/s':>12} {'questions':>10} {'messages':>9} {'retries':>8} {'failed':>7} {'p50 (s)':>8} {'p90 (s)':>8} {'p99 (s)':>8} "
+        f"{'streams':>8} {'disconnects':>12} {'malformed':>10}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<12} {result['questions_per_second']:>12.2f} {result['num_questions']:>10} {result['num_messages']:>9} {result['num_retries']:>8} "
+            f"{result['num_failed_calls']:>7} {result['latency_p50']:>8.2f} {result['latency_p90']:>8.2f} {result['latency_p99']:>8.2f} "
+            f"{result['server']['streams']:>8} {result['server']['disconnects']:>12} {result['server']['malformed_events']:>10}"
+        )
+
+
+def _add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = StubConfig()
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="seconds before the first event")
+    parser.add_argument("--latency-jitter", type=float, default=defaults.latency_jitter)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--disconnect-rate", type=float, default=defaults.disconnect_rate, help="share of streams cut before their end")
+    parser.add_argument("--malformed-rate", type=float, default=defaults.malformed_rate, help="share of streams with an invalid JSON event")
+    parser.add_argument("--answer-words", type=int, default=defaults.answer_words)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    _add_config_arguments(serve)
+
+    benchmark = subparsers.add_parser("benchmark")
+    benchmark.add_argument("--flows", nargs="+", default=["single", "batched", "open_ended"], choices=["single", "batched", "open_ended"])
+    benchmark.add_argument("--batch-size", type=int, default=evaluate.BATCH_SIZE)
+    _add_config_arguments(benchmark)
+
+    args = parser.parse_args()
+    config = StubConfig(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        tokens_per_second=args.tokens_per_second,
+        disconnect_rate=args.disconnect_rate,
+        malformed_rate=args.malformed_rate,
+        answer_words=args.answer_words,
+        seed=args.seed,
+    )
+
+    if args.command == "serve":
+        async def _serve():
+            server = DelphiStubServer(config)
+            port = await server.start(args.host, args.port)
+            print(f"Delphi stand-in listening, use DELPHI_BASE_URL=http://{args.host}:{port}")
+            await asyncio.Event().wait()
+
+        asyncio.run(_serve())
+
+    elif args.command == "benchmark":
+        flows = {
+            "single": _single_flow,
+            "batched": lambda: _batched_flow(args.batch_size),
+            "open_ended": _open_ended_flow,
+        }
+        results = run_benchmark(config, {name: flows[name] for name in args.flows})
+        print_benchmark(results)
+
+        os.makedirs("output", exist_ok=True)
+        with open("output/delphi_benchmark.json", "w") as f:
+            json.dump({"config": config.model_dump(), "results": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
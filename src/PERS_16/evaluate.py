@@ -1,15 +1,30 @@
+import os
+import re
+import sys
+import random
 import asyncio
 
 from tqdm import tqdm
-from openai import AsyncOpenAI
 from typing import Dict, Literal
-from statistics import stdev, mean
+from statistics import mean
 from tenacity import retry, stop_after_attempt, wait_fixed, RetryCallState
-from constants import IPIP_QUESTIONS, QUESTION_TEMPLATE, COT_QUESTION_TEMPLATE, PERS16_LABELS, SCORES, IPIPQuestion
+from constants import IPIP_QUESTIONS, QUESTION_TEMPLATE, COT_QUESTION_TEMPLATE, BATCHED_QUESTION_TEMPLATE, SCORES, IPIPQuestion
 from ask_delphi import ask_delphi, Delphi
 
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
-openai_client = AsyncOpenAI()
+from llm_backends.base import resolve_backend
+
+
+# Model answering the IPIP questions directly (without Delphi), may be prefixed by a backend (e.g. "local:Qwen/Qwen2.5-0.5B-Instruct")
+IPIP_MODEL = "gpt-4.1"
+IPIP_DEFAULT_BACKEND = "openai"
+
+# Batched questionnaire (see `evaluate_model_pers_16_batched`): k items per Delphi message instead of one
+BATCH_SIZE = 10
+MAX_BATCH_REASKS = 2 # items still unparsed after these re-asks are asked one by one
+
+_BATCH_ANSWER_REGEX = re.compile(r"^\W*(\d+)\W+([A-E])\b", flags=re.MULTILINE)
 
 
 def __log_retried_error(retry_state: RetryCallState) -> None:
@@ -36,8 +51,10 @@ async def evaluate_question_with_delphi(question: IPIPQuestion, delphi: Delphi,
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), reraise=True)
 async def evaluate_ipip_question(question: IPIPQuestion) -> Literal["A", "B", "C", "D", "E"]:
-    response = await openai_client.responses.create(
-        model="gpt-4.1",
+    backend, model_name = resolve_backend(IPIP_MODEL, IPIP_DEFAULT_BACKEND)
+
+    response = await backend.create(
+        model=model_name,
         input=[
             {"role": "user", "content": QUESTION_TEMPLATE.format(question=question.question)},
         ],
@@ -49,33 +66,190 @@ async def evaluate_ipip_question(question: IPIPQuestion) -> Literal["A", "B", "C
     return response.output_text
 
 
-async def evaluate_model_pers_16(use_cot: bool = False) -> Dict[PERS16_LABELS, float]:
-
-    scores_by_label: Dict[PERS16_LABELS, list[int]] = {k: [] for k in PERS16_LABELS}
+async def evaluate_model_pers_16(delphi: Delphi = Delphi.SAROSH_KHANNA, use_cot: bool = False) -> list[Literal["A", "B", "C", "D", "E"]]:
+    """Raw answers of `delphi`, in the order of `IPIP_QUESTIONS` (scored by `scoring.py`)."""
 
     semaphore = asyncio.Semaphore(3)
 
-    async def _bounded_eval(question: IPIPQuestion):
+    async def _bounded_eval(index: int, question: IPIPQuestion):
         async with semaphore:
-            response = await evaluate_question_with_delphi(question, Delphi.SAROSH_KHANNA, use_cot=use_cot)
-            return question, response
+            response = await evaluate_question_with_delphi(question, delphi, use_cot=use_cot)
+            return index, response
 
-    tasks = [asyncio.create_task(_bounded_eval(q)) for q in IPIP_QUESTIONS]
+    tasks = [asyncio.create_task(_bounded_eval(index, q)) for index, q in enumerate(IPIP_QUESTIONS)]
 
+    responses = [None] * len(IPIP_QUESTIONS)
     with tqdm(total=len(tasks), desc="Evaluating IPIP questions") as pbar:
         for completed in asyncio.as_completed(tasks):
-            question, response = await completed
-            score = SCORES[question.weight][response]
-            scores_by_label[question.label].append(score)
+            index, response = await completed
+            responses[index] = response
             pbar.update(1)
 
-    return {label: {"mean": mean(scores), "std": stdev(scores)} for label, scores in scores_by_label.items()}
+    return responses
+
+
+def parse_batched_response(response: str, num_questions: int) -> Dict[int, Literal["A", "B", "C", "D", "E"]]:
+    """Answers of a batched reply ("<number>: <letter>" lines) by 0-based item index; ambiguous or missing items are left out."""
+
+    answers: Dict[int, set[str]] = {}
+    for match in _BATCH_ANSWER_REGEX.finditer(response):
+        number = int(match.group(1))
+        if 1 <= number <= num_questions:
+            answers.setdefault(number - 1, set()).add(match.group(2))
+
+    return {index: letters.pop() for index, letters in answers.items() if len(letters) == 1}
+
+
+async def evaluate_questions_batch_with_delphi(questions: list[IPIPQuestion], delphi: Delphi) -> tuple[list[str], int]:
+    """
+    Asks all the `questions` in one numbered message, then re-asks (batched again) only the items whose answer could
+    not be parsed. Returns the answers in the order of `questions` and the number of messages sent.
+    """
+
+    answers: Dict[int, str] = {}
+    pending = list(range(len(questions)))
+    num_messages = 0
+
+    for _ in range(1 + MAX_BATCH_REASKS):
+        statements = "\n".join(f"{position + 1}. “You {questions[index].question}.”" for position, index in enumerate(pending))
+        try:
+            response = await ask_delphi(BATCHED_QUESTION_TEMPLATE.format(num_questions=len(pending), statements=statements), delphi)
+            parsed = parse_batched_response(response, len(pending))
+        except Exception as _error:
+            print(f"Batched question failed, re-asking {len(pending)} items: {_error}")
+            parsed = {}
+        num_messages += 1
+
+        answers.update({pending[position]: answer for position, answer in parsed.items()})
+        pending = [index for index in pending if index not in answers]
+        if len(pending) == 0:
+            break
+
+    # NOTE: last resort, the single-item path has its own retries on unparsable answers
+    for index in pending:
+        answers[index] = await evaluate_question_with_delphi(questions[index], delphi)
+        num_messages += 1
+
+    return [answers[index] for index in range(len(questions))], num_messages
+
+
+def order_effects_report(answers_per_item: Dict[int, list[tuple[int, str]]], batch_size: int) -> Dict[str, object]:
+    """
+    Order effects of the batched questionnaire, from `answers_per_item` (item index -> (position in its batch, answer)
+    for every shuffle): agreement of each item with itself across shuffles, and the mean agreement level (A=5 .. E=1,
+    before reverse-keying) by position in the batch. A drift along the positions means the clone answers the list, not the items.
+    """
+
+    agreement_level = SCORES["positive"]
+    consistencies = []
+    levels_by_position: Dict[int, list[int]] = {position: [] for position in range(batch_size)}
+
+    for item_answers in answers_per_item.values():
+        letters = [answer for _, answer in item_answers]
+        consistencies.append(max(letters.count(letter) for letter in set(letters)) / len(letters))
+        for position, answer in item_answers:
+            levels_by_position[position].append(agreement_level[answer])
+
+    levels = [(position, level) for position, position_levels in levels_by_position.items() for level in position_levels]
+    position_mean = mean(position for position, _ in levels)
+    level_mean = mean(level for _, level in levels)
+    covariance = sum((position - position_mean) * (level - level_mean) for position, level in levels)
+    variance = sum((position - position_mean) ** 2 for position, _ in levels)
+
+    return {
+        "num_shuffles": max(len(item_answers) for item_answers in answers_per_item.values()),
+        "mean_item_consistency": mean(consistencies),
+        "num_inconsistent_items": sum(1 for consistency in consistencies if consistency < 1),
+        "mean_level_by_position": {position: mean(position_levels) for position, position_levels in levels_by_position.items() if position_levels},
+        "level_slope_per_position": covariance / variance if variance > 0 else 0.0,
+    }
+
+
+def print_order_effects_report(report: Dict[str, object]) -> None:
+    print(
+        f"Order effects over {report['num_shuffles']} shuffles: mean item consistency {report['mean_item_consistency']:.2f} "
+        f"({report['num_inconsistent_items']} items answered differently), agreement level slope {report['level_slope_per_position']:+.3f} per position"
+    )
+    print("Mean agreement level by position: " + ", ".join(f"{position + 1}: {level:.2f}" for position, level in report["mean_level_by_position"].items()))
+
+
+async def evaluate_model_pers_16_batched(
+    delphi: Delphi = Delphi.SAROSH_KHANNA,
+    batch_size: int = BATCH_SIZE,
+    num_shuffles: int = 1,
+    seed: int = 0,
+) -> tuple[list[list[str]], Dict[str, object]]:
+    """
+    Same answers as `evaluate_model_pers_16` (one list per shuffle), with `batch_size` items per Delphi message
+    (~`batch_size` times fewer round trips). Every shuffle asks the whole questionnaire again with the items in a new
+    random order, so the same item is seen at different positions and in different batches; the order effects report
+    compares these answers.
+    """
+
+    rng = random.Random(seed)
+    semaphore = asyncio.Semaphore(3)
 
+    batches: list[tuple[int, list[int]]] = []
+    for shuffle in range(num_shuffles):
+        order = list(range(len(IPIP_QUESTIONS)))
+        rng.shuffle(order)
+        batches.extend((shuffle, order[start:start + batch_size]) for start in range(0, len(order), batch_size))
 
-if __name__ == "__main__":
-    import asyncio
+    async def _bounded_eval(shuffle: int, batch: list[int]):
+        async with semaphore:
+            responses, num_messages = await evaluate_questions_batch_with_delphi([IPIP_QUESTIONS[index] for index in batch], delphi)
+            return shuffle, batch, responses, num_messages
+
+    tasks = [asyncio.create_task(_bounded_eval(shuffle, batch)) for shuffle, batch in batches]
+
+    responses_per_shuffle = [[None] * len(IPIP_QUESTIONS) for _ in range(num_shuffles)]
+    answers_per_item: Dict[int, list[tuple[int, str]]] = {index: [] for index in range(len(IPIP_QUESTIONS))}
+    total_messages = 0
+
+    with tqdm(total=len(tasks), desc="Evaluating IPIP question batches") as pbar:
+        for completed in asyncio.as_completed(tasks):
+            shuffle, batch, responses, num_messages = await completed
+            total_messages += num_messages
+            for position, (index, response) in enumerate(zip(batch, responses)):
+                responses_per_shuffle[shuffle][index] = response
+                answers_per_item[index].append((position, response))
+            pbar.update(1)
+
+    print(f"{total_messages} Delphi messages for {len(IPIP_QUESTIONS) * num_shuffles} item answers ({len(batches)} batches of up to {batch_size})")
+
+    return responses_per_shuffle, order_effects_report(answers_per_item, batch_size)
 
-    scores = asyncio.run(evaluate_model_pers_16(use_cot=True))
 
-    for label, score in scores.items():
-        print(f"{label}: score: {score['mean']:>6.2f} std: {score['std']:>6.2f}")
+if __name__ == "__main__":
+    import json
+    import asyncio
+    import argparse
+    import scoring
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clones", nargs="+", default=[Delphi.SAROSH_KHANNA.name], choices=[delphi.name for delphi in Delphi])
+    parser.add_argument("--runs", type=int, default=1, help="passes over the questionnaire per clone (in batched mode, each in a new random item order)")
+    parser.add_argument("--batch-size", type=int, default=1, help="IPIP items per Delphi message (1: one message per item, with chain of thought)")
+    parser.add_argument("--resamples", type=int, default=scoring.NUM_BOOTSTRAP_RESAMPLES, help="bootstrap resamples of the confidence intervals")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    responses = [] # [clone][run][item]
+    for clone in args.clones:
+        if args.batch_size > 1:
+            clone_responses, order_effects = asyncio.run(evaluate_model_pers_16_batched(Delphi[clone], batch_size=args.batch_size, num_shuffles=args.runs, seed=args.seed))
+            print_order_effects_report(order_effects)
+        else:
+            clone_responses = [asyncio.run(evaluate_model_pers_16(Delphi[clone], use_cot=True)) for _ in range(args.runs)]
+        responses.append(clone_responses)
+
+    # NOTE: the raw answers are saved before scoring, so they are not lost if the scoring fails
+    os.makedirs("output", exist_ok=True)
+    with open("output/pers16_scores.json", "w") as f:
+        json.dump({"responses": dict(zip(args.clones, responses))}, f, indent=4)
+
+    summary = scoring.summarize(scoring.response_array(responses), args.clones, num_resamples=args.resamples, seed=args.seed)
+    scoring.print_summary(summary)
+
+    with open("output/pers16_scores.json", "w") as f:
+        json.dump({"responses": dict(zip(args.clones, responses)), "summary": summary.model_dump()}, f, indent=4)
@@ -1,7 +1,11 @@
+import os
+import json
 import asyncio
+import hashlib
 
 from ask_delphi import ask_delphi, Delphi
 from constants import COT_QUESTION_TEMPLATE, IPIP_QUESTIONS
+from pydantic import BaseModel
 from tqdm import tqdm
 
 
@@ -144,29 +148,124 @@ Knowing what you know about yourself, how accurately does this statement describ
 Start by thinking outloud about how accurately this statement describes you. Reference every element of your life and experience that is relevant to the statement.
 Take the time to think about it, and then finish your answer. Be very thorough in your reasoning.
 """
-QUESTIONS.extend([PERS16_TEMPLATE.format(question=_q.question) for _q in IPIP_QUESTIONS])
+# Prompt templates by name, part of the answer store keys: (template, question) pairs are the prompts sent to the clone
+TEMPLATES = {
+    "open_ended": "{question}",
+    "pers16": PERS16_TEMPLATE,
+}
+PROMPTS = [("open_ended", _q) for _q in QUESTIONS] + [("pers16", _q.question) for _q in IPIP_QUESTIONS]
 
 
-async def generate_delphi_dataset(delphi: Delphi, output_file: str, max_concurrency: int = 5) -> list[str]:
+class DelphiAnswer(BaseModel):
+    clone: str
+    question_hash: str
+    template: str
+    question: str
+    answer: str
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        return self.clone, self.question_hash, self.template
+
+
+def question_hash(question: str) -> str:
+    return hashlib.sha256(question.encode()).hexdigest()[:16]
+
+
+class AnswerStore:
+    """
+    Append-only JSONL store of the clone answers, one line per (clone, question hash, template) key. Each answer is
+    flushed as soon as it arrives, so an interrupted or failed run keeps everything answered so far, and a rerun only
+    asks the missing keys.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.answers: dict[tuple[str, str, str], DelphiAnswer] = {}
+
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                lines = f.readlines()
+
+            valid_size = 0
+            for index, line in enumerate(lines):
+                if line.strip():
+                    try:
+                        answer = DelphiAnswer.model_validate_json(line)
+                    except ValueError:
+                        if index < len(lines) - 1:
+                            raise
+                        # NOTE: a torn last line (run killed mid-write) is dropped, so the next append starts on a clean line
+                        print(f"Warning: dropping the incomplete last line of {path}, its answer will be asked again")
+                        with open(path, "r+b") as f:
+                            f.truncate(valid_size)
+                        break
+                    self.answers[answer.key] = answer # the last answer of a key wins
+                valid_size += len(line)
+
+    def __contains__(self, key: tuple[str, str, str]) -> bool:
+        return key in self.answers
+
+    def append(self, answer: DelphiAnswer) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(answer.model_dump()) + "\n")
+            f.flush()
+        self.answers[answer.key] = answer
+
+
+def _default_store_file(output_file: str) -> str:
+    return os.path.splitext(output_file)[0] + ".jsonl"
+
+
+def export_txt(store: AnswerStore, delphi: Delphi, output_file: str) -> list[str]:
+    """Writes the answers of `delphi` to the plain text format (one answer per line), in the order of `PROMPTS`."""
+
+    responses = []
+    for template, question in PROMPTS:
+        answer = store.answers.get((delphi.value, question_hash(question), template))
+        if answer is not None:
+            responses.append(answer.answer)
+
+    with open(output_file, "w") as f:
+        f.write("\n".join(responses))
+
+    return responses
+
+
+async def generate_delphi_dataset(delphi: Delphi, output_file: str, max_concurrency: int = 5, store_file: str | None = None) -> list[str]:
+    store = AnswerStore(store_file or _default_store_file(output_file))
     semaphore = asyncio.Semaphore(max_concurrency)
 
-    async def call_with_limit(question: str) -> str:
+    async def call_with_limit(template: str, question: str) -> DelphiAnswer | None:
         async with semaphore:
-            return await ask_delphi(question, delphi)
+            try:
+                response = await ask_delphi(TEMPLATES[template].format(question=question), delphi)
+            except Exception as _error:
+                print(f"Failed to get an answer ({template}, {question[:50]!r}): {_error}")
+                return None
+
+        return DelphiAnswer(clone=delphi.value, question_hash=question_hash(question), template=template, question=question, answer=response)
+
+    pending = [(template, question) for template, question in PROMPTS if (delphi.value, question_hash(question), template) not in store]
+    print(f"{len(PROMPTS) - len(pending)}/{len(PROMPTS)} answers already in {store.path}")
 
-    tasks = [asyncio.create_task(call_with_limit(q)) for q in QUESTIONS]
+    tasks = [asyncio.create_task(call_with_limit(template, question)) for template, question in pending]
 
-    responses: list[str] = []
+    num_failed = 0
     with tqdm(total=len(tasks), desc="Generating Delphi dataset", leave=False) as pbar:
         for future in asyncio.as_completed(tasks):
-            result = await future
-            responses.append(result)
+            answer = await future
+            if answer is None:
+                num_failed += 1
+            else:
+                store.append(answer)
             pbar.update(1)
 
-    with open(output_file, "w") as f:
-        f.write("\n".join(responses))
+    if num_failed > 0:
+        print(f"{num_failed} questions failed, rerun to ask them again (answered questions are skipped)")
 
-    return responses
+    return export_txt(store, delphi, output_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,184 @@
+"""
+Vectorized PERS-16 scoring of raw IPIP answers, stored as an (items x runs x clones) array of letters.
+
+The reverse-keying of `SCORES` is a single fancy-indexing lookup in a (weight x letter) table. Per-factor statistics
+come from one-hot (factor x item) matrix products, so every factor, run and clone is scored at once.
+
+Confidence intervals use a Poisson cluster bootstrap over the items: each item gets one Poisson(1) weight per resample,
+shared by all its runs and all the clones. The runs of an item are repeated answers to the same question, so they are
+not independent, and resampling the items (the clusters) rather than the individual answers keeps the intervals from
+being too narrow. Sharing the weights across the clones pairs the between-clone effect sizes (Cohen's d on the item
+scores, pooled standard deviation) on the same items. All the resamples are done in a few batched matrix products.
+"""
+
+import numpy as np
+
+from typing import List, Sequence
+from itertools import combinations
+from pydantic import BaseModel
+from constants import IPIP_QUESTIONS, PERS16_LABELS, SCORES
+
+
+LETTERS = "ABCDE"
+FACTORS = list(PERS16_LABELS)
+WEIGHTS = list(SCORES)
+
+NUM_BOOTSTRAP_RESAMPLES = 2000
+CONFIDENCE_LEVEL = 0.95
+
+# (weight x letter) scores, the extra last column (NaN) is looked up by missing answers (code -1)
+SCORE_TABLE = np.array([[SCORES[weight][letter] for letter in LETTERS] + [np.nan] for weight in WEIGHTS])
+ITEM_WEIGHTS = np.array([WEIGHTS.index(question.weight) for question in IPIP_QUESTIONS])
+ITEM_FACTORS = np.array([FACTORS.index(question.label) for question in IPIP_QUESTIONS])
+FACTOR_ITEMS = (ITEM_FACTORS[None, :] == np.arange(len(FACTORS))[:, None]).astype(float) # (factor x item) one-hot
+
+
+class EffectSize(BaseModel):
+    factor: str
+    clone_a: str
+    clone_b: str
+    cohens_d: float # positive when clone_a scores higher
+    ci_low: float
+    ci_high: float
+
+
+class Pers16Summary(BaseModel):
+    clones: List[str]
+    factors: List[str]
+    num_runs: int
+    num_resamples: int
+    confidence_level: float
+    # (factor x clone), over all the items of the factor and all the runs
+    mean: List[List[float]]
+    std: List[List[float]]
+    ci_low: List[List[float]]
+    ci_high: List[List[float]]
+    effect_sizes: List[EffectSize]
+
+
+def response_array(responses: Sequence[Sequence[Sequence[str | None]]]) -> np.ndarray:
+    """(items x runs x clones) letters from answers indexed [clone][run][item] (item order of `IPIP_QUESTIONS`)."""
+
+    return np.array([[[answer or "" for answer in run] for run in clone] for clone in responses], dtype="U1").transpose(2, 1, 0)
+
+
+def encode_responses(responses: np.ndarray) -> np.ndarray:
+    """Letter codes (0 for A .. 4 for E), -1 for missing or invalid answers."""
+
+    codes = np.full(responses.shape, -1)
+    for code, letter in enumerate(LETTERS):
+        codes[responses == letter] = code
+    return codes
+
+
+def score_responses(responses: np.ndarray) -> np.ndarray:
+    """Reverse-keyed scores (1-5) of an (items x runs x clones) letters array, NaN for missing answers."""
+
+    return SCORE_TABLE[ITEM_WEIGHTS[:, None, None], encode_responses(responses)]
+
+
+def _factor_sums(values: np.ndarray) -> np.ndarray:
+    """(... x items x runs x clones) -> (... x factor x clones) sums, as one batched matrix product."""
+
+    *batch, num_items, num_runs, num_clones = values.shape
+    sums = np.matmul(FACTOR_ITEMS.astype(values.dtype), values.reshape(*batch, num_items, num_runs * num_clones))
+    return sums.reshape(*batch, len(FACTORS), num_runs, num_clones).sum(axis=-2)
+
+
+def _moments(weights: np.ndarray, scores: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Weighted count, mean and (population) variance per factor; `weights` is (... x items x runs x clones)."""
+
+    weighted_scores = weights * scores.astype(weights.dtype)
+    count = _factor_sums(weights).astype(float)
+    total = _factor_sums(weighted_scores).astype(float)
+    total_squares = _factor_sums(weighted_scores * scores.astype(weights.dtype)).astype(float)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        return count, mean, np.maximum(total_squares / count - mean ** 2, 0.0)
+
+
+def _cohens_d(count: np.ndarray, mean: np.ndarray, variance: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+    """Cohen's d of every clone pair, from population moments (... x factor x clone) -> (... x factor x pair)."""
+
+    a, b = pairs[:, 0], pairs[:, 1]
+    n_a, n_b = count[..., a], count[..., b]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pooled_std = np.sqrt((n_a * variance[..., a] + n_b * variance[..., b]) / (n_a + n_b - 2))
+        return (mean[..., a] - mean[..., b]) / pooled_std
+
+
+def summarize(
+    responses: np.ndarray,
+    clones: List[str],
+    num_resamples: int = NUM_BOOTSTRAP_RESAMPLES,
+    confidence_level: float = CONFIDENCE_LEVEL,
+    seed: int = 0,
+) -> Pers16Summary:
+    """Factor means, standard deviations and bootstrap confidence intervals per clone, and effect sizes between clones."""
+
+    scores = score_responses(responses)
+    valid = ~np.isnan(scores)
+    scores = np.nan_to_num(scores)
+
+    count, mean, variance = _moments(valid.astype(float), scores)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt(variance * count / (count - 1))
+
+    # NOTE: float32 weights, the (resamples x items x runs x clones) array is the only large allocation
+    rng = np.random.default_rng(seed)
+    item_weights = rng.poisson(1.0, size=(num_resamples, scores.shape[0], 1, 1)).astype(np.float32)
+    weights = item_weights * valid.astype(np.float32)
+    resampled_count, resampled_mean, resampled_variance = _moments(weights, scores)
+
+    quantiles = [(1 - confidence_level) / 2 * 100, (1 + confidence_level) / 2 * 100]
+    ci_low, ci_high = np.nanpercentile(resampled_mean, quantiles, axis=0)
+
+    effect_sizes = []
+    if len(clones) >= 2:
+        pairs = np.array(list(combinations(range(len(clones)), 2)), dtype=int)
+        cohens_d = _cohens_d(count, mean, variance, pairs)
+        d_low, d_high = np.nanpercentile(_cohens_d(resampled_count, resampled_mean, resampled_variance, pairs), quantiles, axis=0)
+
+        effect_sizes = [
+            EffectSize(
+                factor=factor.name,
+                clone_a=clones[a],
+                clone_b=clones[b],
+                cohens_d=float(cohens_d[f, p]),
+                ci_low=float(d_low[f, p]),
+                ci_high=float(d_high[f, p]),
+            )
+            for f, factor in enumerate(FACTORS)
+            for p, (a, b) in enumerate(pairs)
+        ]
+
+    return Pers16Summary(
+        clones=clones,
+        factors=[factor.name for factor in FACTORS],
+        num_runs=responses.shape[1],
+        num_resamples=num_resamples,
+        confidence_level=confidence_level,
+        mean=mean.tolist(),
+        std=std.tolist(),
+        ci_low=ci_low.tolist(),
+        ci_high=ci_high.tolist(),
+        effect_sizes=effect_sizes,
+    )
+
+
+def print_summary(summary: Pers16Summary) -> None:
+    confidence = f"{summary.confidence_level:.0%} CI"
+    for c, clone in enumerate(summary.clones):
+        print(f"{clone} ({summary.num_runs} runs, {confidence} over {summary.num_resamples} bootstrap resamples):")
+        for f, factor in enumerate(summary.factors):
+            print(
+                f"  {factor}: score: {summary.mean[f][c]:>6.2f} std: {summary.std[f][c]:>6.2f} "
+                f"CI: [{summary.ci_low[f][c]:.2f}, {summary.ci_high[f][c]:.2f}]"
+            )
+
+    if summary.effect_sizes:
+        print(f"Between-clone effect sizes (Cohen's d, {confidence}):")
+        for effect in summary.effect_sizes:
+            marker = " *" if effect.ci_low > 0 or effect.ci_high < 0 else "" # the CI excludes 0
+            print(f"  {effect.factor} {effect.clone_a} vs {effect.clone_b}: d = {effect.cohens_d:+.2f} [{effect.ci_low:+.2f}, {effect.ci_high:+.2f}]{marker}")
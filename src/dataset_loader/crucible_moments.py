@@ -3,6 +3,7 @@ import re
 import random
 
 from typing import Dict, Iterator, List, Tuple
+from dataset_loader.dedup import DEFAULT_DEDUP_THRESHOLD, remove_near_duplicates
 
 
 def _iter_text_files(data_dir: str) -> Iterator[str]:
@@ -117,11 +118,24 @@ def _train_test_split_batches(
     return batches[:n_train], batches[n_train:]
 
 
+def load_file_batches(path: str, max_words_per_batch: int = 2000, dedup_threshold: float | None = DEFAULT_DEDUP_THRESHOLD) -> List[List[str]]:
+    """
+    Batches of a single file, parsed and deduplicated like `load_dataset` does (used to score new files incrementally).
+    Only the near-duplicates within the file are dropped, the earlier files of the persona are not compared.
+    """
+
+    segments = _extract_host_paragraphs(_read_file(path))
+    if dedup_threshold is not None:
+        segments = remove_near_duplicates({path: segments}, threshold=dedup_threshold)[path]
+    return _batch_segments_by_words(segments, max_words_per_batch=max_words_per_batch)
+
+
 def load_dataset(
     data_dir: str,
     max_words_per_batch: int = 2000,
     train_ratio: float = 0.5,
     val_ratio: float = 0.2,
+    dedup_threshold: float | None = DEFAULT_DEDUP_THRESHOLD,
 ) -> tuple[List[List[str]], List[List[str]], List[List[str]]]:
     """
     Build host-only batches for Crucible Moments transcripts.
@@ -131,6 +145,8 @@ def load_dataset(
     """
 
     segments_per_file = _collect_segments_per_file(data_dir)
+    if dedup_threshold is not None:
+        segments_per_file = remove_near_duplicates(segments_per_file, threshold=dedup_threshold)
 
     nb_file_validation = int(len(segments_per_file) * val_ratio)
 
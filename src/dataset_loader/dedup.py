@@ -0,0 +1,104 @@
+import re
+import zlib
+import numpy as np
+
+from typing import Dict, List
+
+
+DEFAULT_DEDUP_THRESHOLD = 0.8 # estimated Jaccard similarity (word 5-grams) from which a paragraph is a near-duplicate
+NUM_PERMUTATIONS = 128
+SHINGLE_SIZE = 5
+MIN_WORDS = 8 # shorter paragraphs ("Yeah.", "Exactly.") are part of the persona's style, never dropped
+TOKENS_PER_WORD = 1.3 # rough English average, for the report only
+
+_WORD_REGEX = re.compile(r"\w+")
+
+# Multiply-shift hash family: h_i(x) = ((x ^ b_i) * a_i mod 2^64) >> 32, a_i odd
+_rng = np.random.default_rng(0)
+_MULTIPLIERS = _rng.integers(1, 2**63, size=NUM_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_OFFSETS = _rng.integers(0, 2**32, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def _shingles(paragraph: str) -> np.ndarray:
+    words = _WORD_REGEX.findall(paragraph.lower())
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))}
+    return np.array([zlib.crc32(shingle.encode()) for shingle in shingles], dtype=np.uint64)
+
+
+def minhash_signatures(paragraphs: List[str]) -> np.ndarray:
+    """(paragraphs x NUM_PERMUTATIONS) MinHash signatures over word 5-grams."""
+
+    signatures = np.empty((len(paragraphs), NUM_PERMUTATIONS), dtype=np.uint64)
+    for index, paragraph in enumerate(paragraphs):
+        hashes = ((_shingles(paragraph)[None, :] ^ _OFFSETS[:, None]) * _MULTIPLIERS[:, None]) >> np.uint64(32)
+        signatures[index] = hashes.min(axis=1)
+    return signatures
+
+
+def _banding(threshold: float) -> tuple[int, int]:
+    """
+    (bands, rows per band) with the highest LSH S-curve, (1/bands)^(1/rows), not above `threshold` (16 x 8, ~0.71, for
+    0.8). A steeper banding above the threshold would miss true near-duplicates just over it (false negatives are never
+    recovered, while the extra candidates below it are rejected by the Jaccard check).
+    """
+
+    candidates = [(NUM_PERMUTATIONS // rows, rows) for rows in range(1, NUM_PERMUTATIONS + 1) if NUM_PERMUTATIONS % rows == 0]
+    s_curve = lambda banding: (1 / banding[0]) ** (1 / banding[1])
+    below = [banding for banding in candidates if s_curve(banding) <= threshold]
+    return max(below, key=s_curve) if below else min(candidates, key=s_curve)
+
+
+def find_near_duplicates(paragraphs: List[str], threshold: float = DEFAULT_DEDUP_THRESHOLD) -> List[int]:
+    """
+    Indices of the paragraphs that are near-duplicates of an earlier kept paragraph.
+
+    Candidates are the kept paragraphs sharing a bucket in at least one LSH band; they are confirmed when their estimated
+    Jaccard similarity (share of equal MinHash values) reaches `threshold`. Dropped paragraphs are never compared again,
+    so in a chain A ~ B ~ C (C not close to A) only B is dropped.
+    """
+
+    eligible = [index for index, paragraph in enumerate(paragraphs) if len(paragraph.split()) >= MIN_WORDS]
+    if len(eligible) < 2:
+        return []
+
+    signatures = minhash_signatures([paragraphs[index] for index in eligible])
+    num_bands, rows = _banding(threshold)
+
+    buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(num_bands)] # per band: band hash -> kept paragraphs (positions in `eligible`)
+    duplicates = []
+    for position, signature in enumerate(signatures):
+        band_hashes = [signature[band * rows:(band + 1) * rows].tobytes() for band in range(num_bands)]
+        candidates = {kept for band, band_hash in enumerate(band_hashes) for kept in buckets[band].get(band_hash, [])}
+
+        if any((signatures[kept] == signature).mean() >= threshold for kept in candidates):
+            duplicates.append(position)
+            continue
+
+        for band, band_hash in enumerate(band_hashes):
+            buckets[band].setdefault(band_hash, []).append(position)
+
+    return [eligible[position] for position in duplicates]
+
+
+def remove_near_duplicates(segments_per_file: Dict[str, List[str]], threshold: float = DEFAULT_DEDUP_THRESHOLD) -> Dict[str, List[str]]:
+    """
+    Drop the paragraphs repeated (almost verbatim) across all the files of a persona: boilerplate, intros,
+    near-identical answers. The first occurrence is kept. Prints how many words/tokens each scoring pass saves.
+    """
+
+    paragraphs = [(path, segment) for path, segments in segments_per_file.items() for segment in segments]
+    duplicates = set(find_near_duplicates([segment for _, segment in paragraphs], threshold))
+
+    output: Dict[str, List[str]] = {path: [] for path in segments_per_file}
+    for index, (path, segment) in enumerate(paragraphs):
+        if index not in duplicates:
+            output[path].append(segment)
+
+    num_words = sum(len(segment.split()) for _, segment in paragraphs)
+    num_dropped_words = sum(len(paragraphs[index][1].split()) for index in duplicates)
+    print(
+        f"Near-duplicate removal (Jaccard >= {threshold}): {len(duplicates)}/{len(paragraphs)} paragraphs dropped, "
+        f"{num_dropped_words}/{num_words} words (~{int(num_dropped_words * TOKENS_PER_WORD)} tokens) saved per scoring pass"
+    )
+
+    return output
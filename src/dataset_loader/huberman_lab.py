@@ -3,6 +3,7 @@ import re
 import random
 
 from typing import Any, Dict, Iterator, List, Tuple
+from dataset_loader.dedup import DEFAULT_DEDUP_THRESHOLD, remove_near_duplicates
 
 
 # Example expected header formats:
@@ -177,11 +178,24 @@ def train_test_split_batches(batches: List[List[str]], train_ratio: float = 0.5)
     n_train = int(len(batches) * train_ratio)
     return batches[:n_train], batches[n_train:]
 
+
+def load_file_batches(path: str, max_words_per_batch: int = 2000, dedup_threshold: float | None = DEFAULT_DEDUP_THRESHOLD) -> List[List[str]]:
+    """
+    Batches of the host segments of a single file, parsed and deduplicated like `load_dataset` does (used to score new
+    files incrementally). Only the near-duplicates within the file are dropped, the earlier files are not compared.
+    """
+    segments = [seg.get("text") for seg in load_transcript_file(path) if int(seg.get("speaker", -1)) == 0 and seg.get("text") is not None]
+    if dedup_threshold is not None:
+        segments = remove_near_duplicates({path: segments}, threshold=dedup_threshold)[path]
+    return batch_segments_by_words(segments, max_words_per_batch=max_words_per_batch)
+
+
 def load_dataset(
     data_dir: str,
     max_words_per_batch: int = 2000,
     train_ratio: float = 0.5,
     val_ratio: float = 0.2,
+    dedup_threshold: float | None = DEFAULT_DEDUP_THRESHOLD,
 ) -> tuple[List[List[str]], List[List[str]], List[List[str]]]:
     """Convenience: collect host-only segments, batch them, then split into train/test."""
 
@@ -189,6 +203,8 @@ def load_dataset(
         raise ValueError(f"data_dir does not exist or is empty: {data_dir}")
 
     segments_per_file = collect_segments_per_file(data_dir)
+    if dedup_threshold is not None:
+        segments_per_file = remove_near_duplicates(segments_per_file, threshold=dedup_threshold)
 
     nb_file_validation = int(len(segments_per_file) * val_ratio)
 
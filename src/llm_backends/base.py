@@ -0,0 +1,177 @@
+import asyncio
+
+from abc import ABC, abstractmethod
+from pydantic import BaseModel
+from typing import Any, Awaitable, Callable, Dict, List, Type
+
+
+# Wraps every provider request of a multi-sample call (e.g. to hold a concurrency slot, hedge or time it out)
+RequestGate = Callable[[Callable[[], Awaitable[Any]]], Awaitable[Any]]
+
+
+class BackendUsage(BaseModel):
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+class BackendResponse(BaseModel):
+    """Subset of an OpenAI `Response` that the scoring code relies on, shared by every backend."""
+    output_text: str
+    output_parsed: Any = None
+    usage: BackendUsage = BackendUsage()
+
+
+class LogprobsResponse(BaseModel):
+    """Log-probabilities of the most likely first tokens of an answer, with the usage of the call."""
+    logprobs: Dict[str, float]
+    usage: BackendUsage = BackendUsage()
+
+
+async def _ungated(make_call: Callable[[], Awaitable[Any]]) -> Any:
+    return await make_call()
+
+
+async def _fan_out(make_call: Callable[[], Awaitable[BackendResponse]], n: int) -> List[BackendResponse | Exception]:
+    # One call first, so the provider caches the prompt, then the other n - 1 concurrently (they hit the prompt cache)
+    try:
+        first = await make_call()
+    except Exception as _error:
+        first = _error
+    return [first, *await asyncio.gather(*[make_call() for _ in range(n - 1)], return_exceptions=True)]
+
+
+class LLMBackend(ABC):
+    """
+    Minimal interface over an LLM provider.
+
+    `input` follows the OpenAI Responses API format: a list of {"role": ..., "content": ...} messages.
+    `max_output_tokens` caps the length of the answer (None: no cap other than the provider/backend default).
+    """
+
+    @abstractmethod
+    async def create(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+    ) -> BackendResponse:
+        ...
+
+    @abstractmethod
+    async def parse(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        text_format: Type[BaseModel],
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+    ) -> BackendResponse:
+        """Same as `create` but `output_parsed` holds an instance of `text_format`."""
+        ...
+
+    async def create_samples(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        n: int,
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+        gate: RequestGate = _ungated,
+    ) -> List[BackendResponse | Exception]:
+        """
+        `n` independent samples for the same input. Backends able to return several completions per request override it
+        (the prompt is then processed and paid once); by default, see `_fan_out`.
+
+        Every provider request goes through `gate`. A failed sample is returned as its exception, in place, so the other
+        samples are kept (a failed request of several completions fails all of them).
+        """
+        return await _fan_out(lambda: gate(lambda: self.create(model, input, temperature=temperature, timeout=timeout, max_output_tokens=max_output_tokens)), n)
+
+    async def parse_samples(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        text_format: Type[BaseModel],
+        n: int,
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+        gate: RequestGate = _ungated,
+    ) -> List[BackendResponse | Exception]:
+        """Same as `create_samples` for `parse`."""
+        return await _fan_out(lambda: gate(lambda: self.parse(model, input, text_format, temperature=temperature, timeout=timeout, max_output_tokens=max_output_tokens)), n)
+
+    async def first_token_logprobs(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        top_logprobs: int = 20,
+        timeout: float | None = None,
+    ) -> LogprobsResponse:
+        """
+        Log-probabilities of the `top_logprobs` most likely first tokens of the answer (greedy, a single token is generated).
+
+        Raises `NotImplementedError` when the backend (or the provider behind it) does not expose log-probabilities.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support logprobs")
+
+
+def _create_openrouter_backend() -> LLMBackend:
+    from llm_backends.openai_compatible import OpenRouterBackend
+    return OpenRouterBackend()
+
+
+def _create_openai_backend() -> LLMBackend:
+    from llm_backends.openai_compatible import OpenAIBackend
+    return OpenAIBackend()
+
+
+def _create_mock_backend() -> LLMBackend:
+    from llm_backends.mock import MockBackend
+    return MockBackend()
+
+
+def _create_local_backend() -> LLMBackend:
+    from llm_backends.local_transformers import LocalTransformersBackend
+    return LocalTransformersBackend()
+
+
+# Backends are created lazily, so optional dependencies (e.g. transformers) are only imported when used
+BACKEND_FACTORIES: Dict[str, Callable[[], LLMBackend]] = {
+    "openrouter": _create_openrouter_backend,
+    "openai": _create_openai_backend,
+    "mock": _create_mock_backend,
+    "local": _create_local_backend,
+}
+
+_backends: Dict[str, LLMBackend] = {}
+
+
+def get_backend(name: str) -> LLMBackend:
+    if name not in BACKEND_FACTORIES:
+        raise ValueError(f"Unknown LLM backend: {name} (available: {list(BACKEND_FACTORIES)})")
+
+    if name not in _backends:
+        _backends[name] = BACKEND_FACTORIES[name]()
+
+    return _backends[name]
+
+
+def resolve_backend(model: str, default_backend: str) -> tuple[LLMBackend, str]:
+    """
+    Route a model name to its backend.
+
+    A "<backend>:" prefix selects the backend explicitly (e.g. "local:Qwen/Qwen2.5-0.5B-Instruct", "mock:any"),
+    otherwise `default_backend` is used. Returns the backend and the model name without the prefix.
+    """
+
+    backend_name, separator, model_name = model.partition(":")
+
+    if separator and backend_name in BACKEND_FACTORIES:
+        return get_backend(backend_name), model_name
+
+    return get_backend(default_backend), model
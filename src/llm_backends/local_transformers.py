@@ -0,0 +1,260 @@
+import re
+import json
+import asyncio
+
+from pydantic import BaseModel, ValidationError
+from typing import Any, Dict, List, Type
+from llm_backends.base import LLMBackend, BackendResponse, BackendUsage, LogprobsResponse, RequestGate, _ungated
+
+
+DEFAULT_LOCAL_MODEL = "Qwen/Qwen2.5-0.5B-Instruct"
+
+STRUCTURED_OUTPUT_SYSTEM_PROMPT = """
+Answer ONLY with a single JSON object that validates against the following JSON schema, without any other text:
+{schema}
+""".strip()
+
+
+class _GenerationRequest(BaseModel):
+    model: str
+    messages: List[Dict[str, str]]
+    temperature: float
+    max_new_tokens: int
+    num_samples: int = 1
+    future: Any # asyncio.Future[List[tuple[str, int, int]]], one (text, input tokens, output tokens) per sample
+
+
+def _extract_json_object(text: str) -> str:
+    # Small models tend to wrap JSON in markdown fences or add a sentence around it
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end == -1:
+        raise ValueError(f"No JSON object in local model output: {text[:200]}")
+    return text[start:end + 1]
+
+
+def _raise_if_failed(response: BackendResponse | Exception) -> BackendResponse:
+    if isinstance(response, Exception):
+        raise response
+    return response
+
+
+class LocalTransformersBackend(LLMBackend):
+    """
+    Runs small instruction models on CPU with `transformers`, no per-token cost nor network latency.
+
+    Concurrent calls are collected for up to `batch_wait` seconds and generated together (up to `max_batch_size`
+    prompts per `generate` call, left padded), on a worker thread so the event loop keeps running. Multiple samples of
+    the same input are generated with `num_return_sequences` in that same call.
+    Structured outputs are obtained by asking for JSON matching the pydantic schema, then validated.
+    """
+
+    def __init__(
+        self,
+        default_model: str = DEFAULT_LOCAL_MODEL,
+        max_batch_size: int = 8,
+        batch_wait: float = 0.05,
+        max_new_tokens: int = 768,
+        device: str = "cpu",
+    ) -> None:
+        try:
+            import torch
+            import transformers
+        except ImportError as _error:
+            raise ImportError("The local backend requires `transformers` and `torch` (pip install transformers torch)") from _error
+
+        self._torch = torch
+        self._transformers = transformers
+        self.default_model = default_model
+        self.max_batch_size = max_batch_size
+        self.batch_wait = batch_wait
+        self.max_new_tokens = max_new_tokens
+        self.device = device
+
+        self._loaded: Dict[str, tuple[Any, Any]] = {} # model name -> (tokenizer, model)
+        self._queue: asyncio.Queue[_GenerationRequest] | None = None
+        self._batching_task: asyncio.Task | None = None
+
+    def _load(self, model: str) -> tuple[Any, Any]:
+        if model not in self._loaded:
+            tokenizer = self._transformers.AutoTokenizer.from_pretrained(model, padding_side="left")
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+
+            causal_lm = self._transformers.AutoModelForCausalLM.from_pretrained(model, torch_dtype=self._torch.float32)
+            causal_lm.to(self.device).eval()
+            self._loaded[model] = (tokenizer, causal_lm)
+
+        return self._loaded[model]
+
+    def _generate_batch(self, model: str, batch_messages: List[List[Dict[str, str]]], temperature: float, max_new_tokens: int, num_samples: int = 1) -> List[List[tuple[str, int, int]]]:
+        tokenizer, causal_lm = self._load(model)
+
+        prompts = [tokenizer.apply_chat_template(messages, add_generation_prompt=True, tokenize=False) for messages in batch_messages]
+        inputs = tokenizer(prompts, return_tensors="pt", padding=True).to(self.device)
+
+        sampling = {"do_sample": True, "temperature": temperature} if temperature > 0 else {"do_sample": False}
+        with self._torch.inference_mode():
+            # `num_return_sequences` rows per prompt, in prompt order
+            generated = causal_lm.generate(**inputs, max_new_tokens=max_new_tokens, pad_token_id=tokenizer.pad_token_id, num_return_sequences=num_samples, **sampling)
+
+        prompt_length = inputs["input_ids"].shape[1]
+        outputs = [[] for _ in batch_messages]
+        for index, row in enumerate(generated):
+            new_tokens = row[prompt_length:]
+            new_tokens = new_tokens[new_tokens != tokenizer.pad_token_id]
+            # The prompt is processed once per prompt, its tokens are counted on the first sample only
+            input_tokens = int(inputs["attention_mask"][index // num_samples].sum()) if index % num_samples == 0 else 0
+            outputs[index // num_samples].append((tokenizer.decode(new_tokens, skip_special_tokens=True), input_tokens, len(new_tokens)))
+
+        return outputs
+
+    async def _batching_loop(self) -> None:
+        while True:
+            first = await self._queue.get()
+            requests = [first]
+
+            # Collect other requests arriving shortly after, to fill the batch
+            deadline = asyncio.get_running_loop().time() + self.batch_wait
+            while len(requests) < self.max_batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    requests.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except TimeoutError:
+                    break
+
+            # One `generate` call per distinct (model, sampling) setting
+            groups: Dict[tuple[str, float, int, int], List[_GenerationRequest]] = {}
+            for request in requests:
+                groups.setdefault((request.model, request.temperature, request.max_new_tokens, request.num_samples), []).append(request)
+
+            for (model, temperature, max_new_tokens, num_samples), group in groups.items():
+                try:
+                    outputs = await asyncio.to_thread(self._generate_batch, model, [r.messages for r in group], temperature, max_new_tokens, num_samples)
+                    for request, output in zip(group, outputs):
+                        if not request.future.done():
+                            request.future.set_result(output)
+                except Exception as _error:
+                    for request in group:
+                        if not request.future.done():
+                            request.future.set_exception(_error)
+
+    async def _generate(self, model: str, messages: List[Dict[str, str]], temperature: float | None, max_new_tokens: int | None = None, num_samples: int = 1) -> List[tuple[str, int, int]]:
+        if self._batching_task is None or self._batching_task.done():
+            self._queue = asyncio.Queue()
+            self._batching_task = asyncio.create_task(self._batching_loop())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_GenerationRequest(
+            model=model or self.default_model,
+            messages=messages,
+            temperature=temperature if temperature is not None else 0.0,
+            max_new_tokens=max_new_tokens or self.max_new_tokens,
+            num_samples=num_samples,
+            future=future,
+        ))
+        return await future
+
+    async def create_samples(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        n: int,
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+        gate: RequestGate = _ungated,
+    ) -> List[BackendResponse | Exception]:
+        try:
+            outputs = await gate(lambda: asyncio.wait_for(self._generate(model, input, temperature, max_output_tokens, num_samples=n), timeout))
+        except Exception as _error:
+            return [_error] * n
+        return [
+            BackendResponse(output_text=text, usage=BackendUsage(input_tokens=input_tokens, output_tokens=output_tokens))
+            for text, input_tokens, output_tokens in outputs
+        ]
+
+    async def create(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+    ) -> BackendResponse:
+        return _raise_if_failed((await self.create_samples(model, input, 1, temperature=temperature, timeout=timeout, max_output_tokens=max_output_tokens))[0])
+
+    async def parse_samples(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        text_format: Type[BaseModel],
+        n: int,
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+        gate: RequestGate = _ungated,
+    ) -> List[BackendResponse | Exception]:
+        schema_instruction = STRUCTURED_OUTPUT_SYSTEM_PROMPT.format(schema=json.dumps(text_format.model_json_schema(), separators=(",", ":")))
+
+        # Most chat templates only accept a leading system message, so the instruction is merged into it
+        if len(input) > 0 and input[0]["role"] == "system":
+            messages = [{"role": "system", "content": f"{input[0]['content']}\n\n{schema_instruction}"}, *input[1:]]
+        else:
+            messages = [{"role": "system", "content": schema_instruction}, *input]
+
+        responses = await self.create_samples(model, messages, n, temperature=temperature, timeout=timeout, max_output_tokens=max_output_tokens, gate=gate)
+
+        # Invalid samples are returned as their parsing error, in place
+        parsed_responses = []
+        for response in responses:
+            if isinstance(response, Exception):
+                parsed_responses.append(response)
+                continue
+            try:
+                response.output_parsed = text_format.model_validate_json(_extract_json_object(response.output_text))
+                parsed_responses.append(response)
+            except (ValidationError, ValueError) as _error:
+                parsed_responses.append(ValueError(f"Local model output does not match {text_format.__name__}: {_error}"))
+
+        return parsed_responses
+
+    async def parse(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        text_format: Type[BaseModel],
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+    ) -> BackendResponse:
+        return _raise_if_failed((await self.parse_samples(model, input, text_format, 1, temperature=temperature, timeout=timeout, max_output_tokens=max_output_tokens))[0])
+
+    def _first_token_logprobs(self, model: str, messages: List[Dict[str, str]], top_logprobs: int) -> LogprobsResponse:
+        tokenizer, causal_lm = self._load(model)
+
+        prompt = tokenizer.apply_chat_template(messages, add_generation_prompt=True, tokenize=False)
+        inputs = tokenizer(prompt, return_tensors="pt").to(self.device)
+
+        with self._torch.inference_mode():
+            logits = causal_lm(**inputs).logits[0, -1]
+
+        logprobs = self._torch.log_softmax(logits.float(), dim=-1)
+        values, indices = self._torch.topk(logprobs, top_logprobs)
+
+        return LogprobsResponse(
+            logprobs={tokenizer.decode([int(index)]): float(value) for value, index in zip(values, indices)},
+            usage=BackendUsage(input_tokens=int(inputs["input_ids"].shape[1]), output_tokens=1),
+        )
+
+    async def first_token_logprobs(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        top_logprobs: int = 20,
+        timeout: float | None = None,
+    ) -> LogprobsResponse:
+        # A single forward pass, no generation needed
+        return await asyncio.wait_for(asyncio.to_thread(self._first_token_logprobs, model or self.default_model, input, top_logprobs), timeout)
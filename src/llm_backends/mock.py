@@ -0,0 +1,158 @@
+import re
+import json
+import math
+import random
+import asyncio
+import hashlib
+
+from pydantic import BaseModel, ValidationError
+from typing import Any, Dict, List, Type, get_args, get_origin
+from llm_backends.base import LLMBackend, BackendResponse, BackendUsage, LogprobsResponse
+
+
+_REPR_FIELD_REGEX = r"{field}=(?P<quote>['\"])(?P<value>.*?)(?<!\\)(?P=quote)"
+
+
+def _find_json_objects(text: str, model_class: Type[BaseModel]) -> List[BaseModel]:
+    """Return the JSON objects embedded in `text` that validate as `model_class`."""
+
+    decoder = json.JSONDecoder()
+    found, position = [], 0
+    while (start := text.find("{", position)) != -1:
+        try:
+            candidate, end = decoder.raw_decode(text, start)
+            found.append(model_class.model_validate(candidate))
+            position = end
+        except (ValueError, ValidationError):
+            position = start + 1
+
+    return found
+
+
+def _find_reprs(text: str, model_class: Type[BaseModel]) -> List[BaseModel]:
+    """Same as `_find_json_objects` for models injected in prompts with their pydantic repr (`name='...' description='...'`)."""
+
+    first_field = next(iter(model_class.model_fields))
+    chunks = re.split(rf"(?=\b{re.escape(first_field)}=['\"])", text)[1:]
+
+    found = []
+    for chunk in chunks:
+        values = {}
+        for field_name in model_class.model_fields:
+            match = re.search(_REPR_FIELD_REGEX.format(field=re.escape(field_name)), chunk, flags=re.DOTALL)
+            if match is None:
+                break
+            values[field_name] = match.group("value")
+        else:
+            try:
+                found.append(model_class.model_validate(values))
+            except ValidationError:
+                pass
+
+    return found
+
+
+def _find_models(text: str, model_class: Type[BaseModel]) -> List[BaseModel]:
+    return _find_json_objects(text, model_class) or _find_reprs(text, model_class)
+
+
+class MockBackend(LLMBackend):
+    """
+    Offline backend returning deterministic, schema-valid outputs (seeded by the prompt and the call count).
+
+    Nested models found in the prompt (e.g. the `Feature` being scored) are echoed back, so outputs can be grouped
+    by feature like real ones. Scores are drawn uniformly in [0, 10].
+    """
+
+    def __init__(self, seed: int = 0, latency: float = 0.0) -> None:
+        self.seed = seed
+        self.latency = latency
+        self.num_calls = 0
+
+    def _rng(self, model: str, input: List[Dict[str, str]]) -> random.Random:
+        self.num_calls += 1
+        digest = hashlib.sha256(json.dumps([self.seed, self.num_calls, model, input]).encode()).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def _fake_value(self, annotation: Any, prompt: str, rng: random.Random) -> Any:
+        origin = get_origin(annotation)
+
+        if origin in (list, List):
+            (item_annotation,) = get_args(annotation)
+            if isinstance(item_annotation, type) and issubclass(item_annotation, BaseModel):
+                echoed = _find_models(prompt, item_annotation)
+                if echoed:
+                    return echoed
+            return [self._fake_value(item_annotation, prompt, rng) for _ in range(3)]
+
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            echoed = _find_models(prompt, annotation)
+            return echoed[0] if echoed else self._fake_instance(annotation, prompt, rng)
+
+        if annotation is float:
+            return round(rng.uniform(0, 10), 1)
+
+        if annotation is int:
+            return rng.randint(0, 10)
+
+        if annotation is bool:
+            return rng.random() < 0.5
+
+        return f"mock-{rng.randint(0, 10**6)}"
+
+    def _fake_instance(self, model_class: Type[BaseModel], prompt: str, rng: random.Random) -> BaseModel:
+        return model_class(**{
+            field_name: self._fake_value(field.annotation, prompt, rng)
+            for field_name, field in model_class.model_fields.items()
+        })
+
+    async def create(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+    ) -> BackendResponse:
+        await asyncio.sleep(self.latency)
+        rng = self._rng(model, input)
+        text = f"Mock analysis {rng.randint(0, 10**6)} from {model}."
+        if max_output_tokens is not None:
+            text = " ".join(text.split()[:max_output_tokens])
+        return BackendResponse(output_text=text, usage=BackendUsage(input_tokens=sum(len(m["content"].split()) for m in input), output_tokens=len(text.split())))
+
+    async def parse(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        text_format: Type[BaseModel],
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+    ) -> BackendResponse:
+        await asyncio.sleep(self.latency)
+        prompt = "\n".join(message["content"] for message in input if message["role"] != "system")
+        parsed = self._fake_instance(text_format, prompt, self._rng(model, input))
+        text = parsed.model_dump_json()
+        return BackendResponse(output_text=text, output_parsed=parsed, usage=BackendUsage(input_tokens=len(prompt.split()), output_tokens=len(text.split())))
+
+    async def first_token_logprobs(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        top_logprobs: int = 20,
+        timeout: float | None = None,
+    ) -> LogprobsResponse:
+        await asyncio.sleep(self.latency)
+        rng = self._rng(model, input)
+
+        # Discretized gaussian over the 0-10 scores, with a random center and spread
+        center, spread = rng.uniform(0, 10), rng.uniform(0.5, 2.0)
+        weights = {str(score): math.exp(-((score - center) / spread) ** 2 / 2) for score in range(11)}
+        total = sum(weights.values())
+
+        logprobs = {token: math.log(weight / total) for token, weight in weights.items() if weight > 0}
+        return LogprobsResponse(
+            logprobs=dict(sorted(logprobs.items(), key=lambda item: item[1], reverse=True)[:top_logprobs]),
+            usage=BackendUsage(input_tokens=sum(len(m["content"].split()) for m in input), output_tokens=1),
+        )
@@ -0,0 +1,174 @@
+import os
+
+from openai import AsyncOpenAI
+from pydantic import BaseModel
+from typing import Any, Dict, List, Type
+from llm_backends.base import LLMBackend, BackendResponse, BackendUsage, LogprobsResponse, RequestGate, _ungated
+
+
+def _drop_none(**kwargs: Any) -> Dict[str, Any]:
+    return {key: value for key, value in kwargs.items() if value is not None}
+
+
+def _usage(response: Any) -> BackendUsage:
+    usage = getattr(response, "usage", None)
+    return BackendUsage(
+        input_tokens=getattr(usage, "input_tokens", None) or 0,
+        output_tokens=getattr(usage, "output_tokens", None) or 0,
+    )
+
+
+def _split_chat_samples(response: Any, outputs: List[tuple[str, Any]]) -> List[BackendResponse]:
+    # The prompt is paid once for all the choices: the whole usage is reported on the first sample
+    usage = getattr(response, "usage", None)
+    total_usage = BackendUsage(
+        input_tokens=getattr(usage, "prompt_tokens", None) or 0,
+        output_tokens=getattr(usage, "completion_tokens", None) or 0,
+    )
+    return [
+        BackendResponse(output_text=text, output_parsed=parsed, usage=total_usage if index == 0 else BackendUsage())
+        for index, (text, parsed) in enumerate(outputs)
+    ]
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Any provider exposing the OpenAI Responses API.
+
+    With `supports_n`, multiple samples are requested as the `n` choices of one Chat Completions call (the Responses
+    API has no `n`), otherwise they fall back to `LLMBackend.create_samples`.
+    """
+
+    supports_n: bool = False
+
+    def __init__(self, base_url: str | None = None, api_key: str | None = None) -> None:
+        self.client = AsyncOpenAI(base_url=base_url, api_key=api_key)
+
+    async def create(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+    ) -> BackendResponse:
+        response = await self.client.responses.create(
+            model=model,
+            input=input,
+            **_drop_none(temperature=temperature, timeout=timeout, max_output_tokens=max_output_tokens),
+        )
+        return BackendResponse(output_text=response.output_text, usage=_usage(response))
+
+    async def parse(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        text_format: Type[BaseModel],
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+    ) -> BackendResponse:
+        response = await self.client.responses.parse(
+            model=model,
+            input=input,
+            text_format=text_format,
+            **_drop_none(temperature=temperature, timeout=timeout, max_output_tokens=max_output_tokens),
+        )
+        return BackendResponse(output_text=response.output_text, output_parsed=response.output_parsed, usage=_usage(response))
+
+    async def create_samples(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        n: int,
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+        gate: RequestGate = _ungated,
+    ) -> List[BackendResponse | Exception]:
+        if not self.supports_n or n == 1:
+            return await super().create_samples(model, input, n, temperature=temperature, timeout=timeout, max_output_tokens=max_output_tokens, gate=gate)
+
+        try:
+            response = await gate(lambda: self.client.chat.completions.create(
+                model=model,
+                messages=input,
+                n=n,
+                **_drop_none(temperature=temperature, timeout=timeout, max_completion_tokens=max_output_tokens),
+            ))
+        except Exception as _error:
+            return [_error] * n
+        return _split_chat_samples(response, [(choice.message.content or "", None) for choice in response.choices])
+
+    async def parse_samples(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        text_format: Type[BaseModel],
+        n: int,
+        temperature: float | None = None,
+        timeout: float | None = None,
+        max_output_tokens: int | None = None,
+        gate: RequestGate = _ungated,
+    ) -> List[BackendResponse | Exception]:
+        if not self.supports_n or n == 1:
+            return await super().parse_samples(model, input, text_format, n, temperature=temperature, timeout=timeout, max_output_tokens=max_output_tokens, gate=gate)
+
+        try:
+            response = await gate(lambda: self.client.chat.completions.parse(
+                model=model,
+                messages=input,
+                response_format=text_format,
+                n=n,
+                **_drop_none(temperature=temperature, timeout=timeout, max_completion_tokens=max_output_tokens),
+            ))
+        except Exception as _error:
+            return [_error] * n
+        return _split_chat_samples(response, [(choice.message.content or "", choice.message.parsed) for choice in response.choices])
+
+    async def first_token_logprobs(
+        self,
+        model: str,
+        input: List[Dict[str, str]],
+        top_logprobs: int = 20,
+        timeout: float | None = None,
+    ) -> LogprobsResponse:
+        # Logprobs are only exposed by the Chat Completions API
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=input,
+            max_tokens=1,
+            temperature=0.0,
+            logprobs=True,
+            top_logprobs=top_logprobs,
+            **_drop_none(timeout=timeout),
+        )
+
+        logprobs = response.choices[0].logprobs
+        if logprobs is None or not logprobs.content:
+            raise NotImplementedError(f"No logprobs returned for {model}")
+
+        usage = response.usage
+        return LogprobsResponse(
+            logprobs={candidate.token: candidate.logprob for candidate in logprobs.content[0].top_logprobs},
+            usage=BackendUsage(input_tokens=getattr(usage, "prompt_tokens", None) or 0, output_tokens=getattr(usage, "completion_tokens", None) or 0),
+        )
+
+
+class OpenRouterBackend(OpenAICompatibleBackend):
+
+    def __init__(self) -> None:
+        api_key = os.getenv("OPENROUTER_API_KEY")
+
+        if not api_key:
+            raise ValueError("OPENROUTER_API_KEY is not set")
+
+        super().__init__(base_url="https://openrouter.ai/api/v1", api_key=api_key)
+
+
+class OpenAIBackend(OpenAICompatibleBackend):
+
+    supports_n = True
+
+    def __init__(self) -> None:
+        super().__init__() # reads OPENAI_API_KEY from the environment
@@ -0,0 +1,211 @@
+import json
+import model
+import asyncio
+import numpy as np
+import scoring_modes
+
+from typing import Any, Dict, List
+from model import Feature, StatsFeatureEvaluation
+from constants import MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL, MAX_FEATURE_CORRELATION
+
+
+def build_score_matrix(per_conversation_stats: List[List[StatsFeatureEvaluation]], features: List[Feature]) -> np.ndarray:
+    """
+    Build the (conversation x feature) matrix of mean scores.
+
+    Cells for which a conversation has no evaluation of a feature are NaN.
+    """
+
+    feature_index = {feature.name: j for j, feature in enumerate(features)}
+    scores = np.full((len(per_conversation_stats), len(features)), np.nan)
+
+    for i, conversation_stats in enumerate(per_conversation_stats):
+        for stats in conversation_stats:
+            j = feature_index.get(stats.evaluations[0].feature.name)
+            if j is not None:
+                scores[i, j] = stats.average_score
+
+    return scores
+
+
+def feature_correlation_matrix(scores: np.ndarray) -> np.ndarray:
+    """Pearson correlation between feature columns (missing cells are imputed with the feature mean)."""
+
+    column_means = np.nanmean(scores, axis=0)
+    filled = np.where(np.isnan(scores), column_means[None, :], scores)
+
+    centered = filled - filled.mean(axis=0, keepdims=True)
+    norms = np.linalg.norm(centered, axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlation = (centered.T @ centered) / np.outer(norms, norms)
+
+    # Constant features (zero variance) are uncorrelated to everything but themselves
+    correlation = np.nan_to_num(correlation, nan=0.0)
+    np.fill_diagonal(correlation, 1.0)
+
+    return np.clip(correlation, -1.0, 1.0)
+
+
+def hierarchical_clusters(correlation: np.ndarray, max_correlation: float) -> List[List[int]]:
+    """
+    Average-linkage agglomerative clustering on the distance `1 - |r|`.
+
+    Both strong positive and strong negative correlations are merged (an inverted axis measures the same construct).
+    Merging stops once the closest pair of clusters has an average |r| lower than `max_correlation`.
+    """
+
+    distance = 1.0 - np.abs(correlation)
+    clusters: List[List[int]] = [[i] for i in range(len(correlation))]
+
+    # Cluster-to-cluster average distances, updated with the Lance-Williams formula
+    linkage = distance.copy()
+    np.fill_diagonal(linkage, np.inf)
+    sizes = np.ones(len(correlation))
+    active = np.ones(len(correlation), dtype=bool)
+
+    while active.sum() > 1:
+        masked = np.where(active[:, None] & active[None, :], linkage, np.inf)
+        a, b = np.unravel_index(np.argmin(masked), masked.shape)
+
+        if masked[a, b] > 1.0 - max_correlation:
+            break
+
+        # Merge cluster b into cluster a
+        linkage[a, :] = (sizes[a] * linkage[a, :] + sizes[b] * linkage[b, :]) / (sizes[a] + sizes[b])
+        linkage[:, a] = linkage[a, :]
+        linkage[a, a] = np.inf
+        sizes[a] += sizes[b]
+        active[b] = False
+        clusters[a].extend(clusters[b])
+        clusters[b] = []
+
+    return [sorted(cluster) for cluster in clusters if len(cluster) > 0]
+
+
+def representative_index(cluster: List[int], correlation: np.ndarray, scores: np.ndarray) -> int:
+    """Pick the member that is the most correlated to the rest of its cluster (ties broken by lowest score dispersion)."""
+
+    if len(cluster) == 1:
+        return cluster[0]
+
+    sub_correlation = np.abs(correlation[np.ix_(cluster, cluster)])
+    centrality = (sub_correlation.sum(axis=1) - 1.0) / (len(cluster) - 1)
+    dispersion = np.nanstd(scores[:, cluster], axis=0)
+
+    order = np.lexsort((dispersion, -centrality))
+    return cluster[order[0]]
+
+
+async def compact_features_bank(
+    features: List[Feature],
+    per_conversation_stats: List[List[StatsFeatureEvaluation]],
+    max_correlation: float = MAX_FEATURE_CORRELATION,
+    num_models: int = len(MODELS_TO_ANALYZE),
+    num_evaluations_per_model: int = NUM_EVALUATIONS_PER_MODEL,
+    merge_with_llm: bool = False,
+) -> tuple[List[Feature], Dict[str, Any]]:
+    """
+    Collapse groups of highly correlated features into a single one.
+
+    By default each group is replaced by its most representative feature (scores already known to be stable).
+    With `merge_with_llm`, the group is instead sent to `model.merge_similar_features` to write a broader feature;
+    if the model does not return exactly one feature, the representative is kept.
+
+    Returns the compacted bank along with an audit report.
+    """
+
+    scores = build_score_matrix(per_conversation_stats, features)
+    correlation = feature_correlation_matrix(scores)
+    clusters = hierarchical_clusters(correlation, max_correlation)
+
+    compacted_bank: List[Feature] = []
+    audit_clusters: List[Dict[str, Any]] = []
+
+    for cluster in clusters:
+        representative = representative_index(cluster, correlation, scores)
+        kept_feature = features[representative]
+        strategy = "representative"
+
+        if merge_with_llm and len(cluster) > 1:
+            try:
+                merged = await model.merge_similar_features([features[i] for i in cluster])
+                if len(merged) == 1:
+                    kept_feature = merged[0]
+                    strategy = "llm_merge"
+            except Exception as _error:
+                print(f"Error while merging cluster {[features[i].name for i in cluster]}: {_error}")
+
+        compacted_bank.append(kept_feature)
+
+        if len(cluster) > 1:
+            audit_clusters.append({
+                "kept": kept_feature.name,
+                "strategy": strategy,
+                "members": [features[i].name for i in cluster],
+                "correlations_to_representative": {
+                    features[i].name: round(float(correlation[representative, i]), 4)
+                    for i in cluster if i != representative
+                },
+            })
+
+    # Every feature costs 2 requests (analysis + scoring) per model, per repeat, per conversation
+    requests_per_feature = 2 * num_models * num_evaluations_per_model
+    report = {
+        "max_correlation": max_correlation,
+        "num_conversations": int(scores.shape[0]),
+        "num_features_before": len(features),
+        "num_features_after": len(compacted_bank),
+        "requests_per_conversation_before": len(features) * requests_per_feature,
+        "requests_per_conversation_after": len(compacted_bank) * requests_per_feature,
+        "scoring_cost_removed_ratio": round(1.0 - len(compacted_bank) / max(len(features), 1), 4),
+        "clusters": audit_clusters,
+    }
+
+    return compacted_bank, report
+
+
+def print_compaction_report(report: Dict[str, Any]) -> None:
+    print(f"Bank compaction (|r| >= {report['max_correlation']}): {report['num_features_before']} -> {report['num_features_after']} features")
+    for cluster in report["clusters"]:
+        print(f"- Kept '{cluster['kept']}' ({cluster['strategy']}) for: {', '.join(cluster['members'])}")
+    print(
+        f"Requests per conversation: {report['requests_per_conversation_before']} -> {report['requests_per_conversation_after']} "
+        f"({report['scoring_cost_removed_ratio'] * 100:.1f}% of the scoring cost removed)"
+    )
+    print("-" * 100, end="\n\n")
+
+
+async def main():
+
+    import sys, os
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+    from dataset_loader.dara import load_dataset
+
+    train_set, _, _ = load_dataset("dataset/dara")
+
+    features_bank = json.load(open("output/features_bank.json"))
+    features_bank = [Feature.model_validate(_feature) for _feature in features_bank]
+
+    per_conversation_stats = await scoring_modes.evaluate_features_scores_per_conversation(train_set, features_bank, stage="bank_building")
+
+    compacted_bank, report = await compact_features_bank(features_bank, per_conversation_stats)
+    print_compaction_report(report)
+
+    # NOTE: the backup is only written once, so that a second run does not replace the original bank by a compacted one
+    if os.path.exists("output/features_bank_uncompacted.json"):
+        print("Keeping the existing backup output/features_bank_uncompacted.json (bank before the first compaction)")
+    else:
+        with open("output/features_bank_uncompacted.json", "w") as f:
+            json.dump([feature.model_dump() for feature in features_bank], f, indent=4)
+
+    with open("output/features_bank.json", "w") as f:
+        json.dump([feature.model_dump() for feature in compacted_bank], f, indent=4)
+
+    with open("output/bank_compaction_report.json", "w") as f:
+        json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
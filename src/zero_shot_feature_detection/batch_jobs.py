@@ -0,0 +1,388 @@
+"""
+Offline scoring through Batch-API style JSONL files (OpenAI `/v1/batches` format).
+
+The two-step scorer becomes two batch waves:
+    1. `export-analysis`: one request per (conversation, feature, model, repeat) for the step 1 analysis
+    2. `export-scoring`: once the analysis results are downloaded, the step 2 scoring requests (embedding the analyses)
+    3. `import`: the scoring results are aggregated into `StatsFeatureEvaluation`, as `evaluate_features_scores_across_conversations` does
+
+`run-local` processes a request file with a local backend (mock by default) and writes a result file in the same
+format as the Batch API, so the round trip can be tested offline.
+"""
+
+import os
+import json
+import model
+import asyncio
+import evidence
+import constants
+import argparse
+import importlib
+
+from tqdm import tqdm
+from pydantic import BaseModel
+from typing import Any, Dict, Iterator, List, Type
+from model import Feature, FeatureEvaluation, StatsFeatureEvaluation
+from constants import MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL, BATCH_MAX_REQUESTS_PER_FILE, BATCH_MAX_BYTES_PER_FILE
+
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+# Structured output formats the scoring wave can request (schema name -> pydantic model)
+TEXT_FORMATS: Dict[str, Type[BaseModel]] = {
+    "FeatureEvaluation": FeatureEvaluation,
+    "LeanFeatureEvaluation": model.LeanFeatureEvaluation,
+    "ScoreOnlyFeatureEvaluation": model.ScoreOnlyFeatureEvaluation,
+}
+
+
+class BatchManifest(BaseModel):
+    conversations: List[str]
+    features: List[Feature]
+    models: List[str]
+    num_evaluations_per_model: int
+    scoring_profile: str = "full" # `constants.SCORING_PROFILE` at export time, both waves and the import follow it
+    evidence_verification: str = "off" # `constants.EVIDENCE_VERIFICATION` at export time, applied on import
+
+
+def _custom_id(conversation_index: int, feature_index: int, model_index: int, repeat: int) -> str:
+    return f"c{conversation_index}-f{feature_index}-m{model_index}-r{repeat}"
+
+
+def _parse_custom_id(custom_id: str) -> tuple[int, int, int, int]:
+    conversation, feature, model_index, repeat = custom_id.split("-")
+    return int(conversation[1:]), int(feature[1:]), int(model_index[1:]), int(repeat[1:])
+
+
+def _custom_ids(manifest: BatchManifest) -> Iterator[str]:
+    """Every (conversation, feature, model, repeat) cell of the manifest."""
+    for i in range(len(manifest.conversations)):
+        for j in range(len(manifest.features)):
+            for k in range(len(manifest.models)):
+                for repeat in range(manifest.num_evaluations_per_model):
+                    yield _custom_id(i, j, k, repeat)
+
+
+def _batch_model_name(model_name: str) -> str:
+    # OpenRouter names ("openai/gpt-4.1-mini") are not known by the provider batch endpoints
+    _, model_name = model.get_backend(model_name)
+    return model_name.split("/", 1)[-1]
+
+
+def _strict_json_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Make a pydantic JSON schema compatible with strict structured outputs (no extra keys, every property required)."""
+
+    if schema.get("type") == "object" and "properties" in schema:
+        schema["additionalProperties"] = False
+        schema["required"] = list(schema["properties"].keys())
+
+    for value in schema.values():
+        if isinstance(value, dict):
+            _strict_json_schema(value)
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    _strict_json_schema(item)
+
+    return schema
+
+
+def _request_line(custom_id: str, model_name: str, input: List[Dict[str, str]], temperature: float, text_format: Type[BaseModel] | None = None, max_output_tokens: int | None = None) -> Dict[str, Any]:
+    body: Dict[str, Any] = {
+        "model": _batch_model_name(model_name),
+        "input": input,
+        "temperature": temperature,
+    }
+
+    if max_output_tokens is not None:
+        body["max_output_tokens"] = max_output_tokens
+
+    if text_format is not None:
+        body["text"] = {
+            "format": {
+                "type": "json_schema",
+                "name": text_format.__name__,
+                "schema": _strict_json_schema(text_format.model_json_schema()),
+                "strict": True,
+            }
+        }
+
+    return {"custom_id": custom_id, "method": "POST", "url": "/v1/responses", "body": body}
+
+
+def write_request_files(lines: Iterator[Dict[str, Any]], output_dir: str, prefix: str) -> List[str]:
+    """Write request lines to as many JSONL files as needed to respect the Batch API size limits."""
+
+    paths: List[str] = []
+    current_file = None
+    current_requests = current_bytes = 0
+
+    for line in lines:
+        encoded = (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+
+        if current_file is None or current_requests >= BATCH_MAX_REQUESTS_PER_FILE or current_bytes + len(encoded) > BATCH_MAX_BYTES_PER_FILE:
+            if current_file is not None:
+                current_file.close()
+            paths.append(os.path.join(output_dir, f"{prefix}_{len(paths):03d}.jsonl"))
+            current_file = open(paths[-1], "wb")
+            current_requests = current_bytes = 0
+
+        current_file.write(encoded)
+        current_requests += 1
+        current_bytes += len(encoded)
+
+    if current_file is not None:
+        current_file.close()
+
+    return paths
+
+
+def _response_text(result: Dict[str, Any]) -> str | None:
+    """Output text of a Batch API result line (None if the request failed)."""
+
+    response = result.get("response") or {}
+    if result.get("error") is not None or response.get("status_code") != 200:
+        return None
+
+    texts = [
+        content["text"]
+        for item in response["body"].get("output", [])
+        if item.get("type") == "message"
+        for content in item.get("content", [])
+        if content.get("type") == "output_text"
+    ]
+    return "".join(texts) if texts else None
+
+
+def read_results(paths: List[str]) -> tuple[Dict[str, str], int]:
+    """Map each custom_id to its output text, from Batch API result files. Also returns the number of failed requests."""
+
+    outputs: Dict[str, str] = {}
+    num_errors = 0
+
+    for path in paths:
+        with open(path, "r") as f:
+            for raw_line in f:
+                if not raw_line.strip():
+                    continue
+                result = json.loads(raw_line)
+                text = _response_text(result)
+                if text is None:
+                    num_errors += 1
+                    continue
+                outputs[result["custom_id"]] = text
+
+    return outputs, num_errors
+
+
+def _load_manifest(batch_dir: str) -> BatchManifest:
+    with open(os.path.join(batch_dir, MANIFEST_FILE_NAME), "r") as f:
+        return BatchManifest.model_validate_json(f.read())
+
+
+def export_analysis_wave(conversations: List[List[str]], features: List[Feature], models: List[str], num_evaluations_per_model: int, batch_dir: str) -> List[str]:
+    """
+    Wave 1: write the manifest and the step 1 (analysis) requests, following `constants.SCORING_PROFILE`.
+
+    Profiles without analysis (score-only) write no request: the scoring wave can be exported right away, without results.
+    """
+
+    os.makedirs(batch_dir, exist_ok=True)
+    profile = model.SCORING_PROFILES[constants.SCORING_PROFILE]
+
+    manifest = BatchManifest(
+        conversations=["\n".join([segment for segment in batch]) for batch in conversations],
+        features=features,
+        models=models,
+        num_evaluations_per_model=num_evaluations_per_model,
+        scoring_profile=profile.name,
+        evidence_verification=constants.EVIDENCE_VERIFICATION,
+    )
+    with open(os.path.join(batch_dir, MANIFEST_FILE_NAME), "w") as f:
+        f.write(manifest.model_dump_json(indent=4))
+
+    if not profile.use_analysis:
+        print(f"The '{profile.name}' scoring profile has no analysis step, export the scoring wave directly")
+        return []
+
+    def _lines() -> Iterator[Dict[str, Any]]:
+        for custom_id in _custom_ids(manifest):
+            i, j, k, _ = _parse_custom_id(custom_id)
+            yield _request_line(
+                custom_id,
+                manifest.models[k],
+                model.build_feature_match_input(manifest.conversations[i], manifest.features[j], profile),
+                model.FEATURE_MATCH_TEMPERATURE,
+                max_output_tokens=profile.max_analysis_tokens,
+            )
+
+    return write_request_files(_lines(), batch_dir, prefix="analysis_requests")
+
+
+def export_scoring_wave(batch_dir: str, analysis_result_paths: List[str]) -> List[str]:
+    """Wave 2: write the step 2 (scoring) requests for every analysis that succeeded (every cell without analysis step)."""
+
+    manifest = _load_manifest(batch_dir)
+    profile = model.SCORING_PROFILES[manifest.scoring_profile]
+    text_format, max_output_tokens = model.scoring_output_format(profile)
+
+    if profile.use_analysis:
+        analyses, num_errors = read_results(analysis_result_paths)
+        if num_errors > 0:
+            print(f"{num_errors} analysis request(s) failed, their scoring requests are skipped")
+    else:
+        analyses = {custom_id: None for custom_id in _custom_ids(manifest)}
+
+    def _lines() -> Iterator[Dict[str, Any]]:
+        for custom_id, analysis in analyses.items():
+            i, j, k, _ = _parse_custom_id(custom_id)
+            yield _request_line(
+                custom_id,
+                manifest.models[k],
+                model.build_feature_scoring_input(manifest.conversations[i], manifest.features[j], analysis, profile),
+                model.FEATURE_SCORING_TEMPERATURE,
+                text_format=text_format,
+                max_output_tokens=max_output_tokens,
+            )
+
+    return write_request_files(_lines(), batch_dir, prefix="scoring_requests")
+
+
+def import_scoring_results(batch_dir: str, scoring_result_paths: List[str]) -> List[StatsFeatureEvaluation]:
+    """
+    Aggregate the scoring results like `model.evaluate_features_scores_across_conversations` would, evidence verification
+    included. Evaluations dropped for fabricated evidence cannot be re-sampled here, they are only left out.
+    """
+
+    manifest = _load_manifest(batch_dir)
+    text_format, _ = model.scoring_output_format(model.SCORING_PROFILES[manifest.scoring_profile])
+    outputs, num_errors = read_results(scoring_result_paths)
+
+    if num_errors > 0:
+        print(f"{num_errors} scoring request(s) failed")
+
+    evaluations_per_conversation: List[Dict[str, List[FeatureEvaluation]]] = [{} for _ in manifest.conversations]
+    num_fabricated = 0
+    for custom_id, text in outputs.items():
+        i, j, _, _ = _parse_custom_id(custom_id)
+        try:
+            evaluation = model.as_feature_evaluation(text_format.model_validate_json(text), manifest.features[j])
+        except ValueError as _error:
+            print(f"Error parsing scoring result {custom_id}: {_error}")
+            continue
+
+        try:
+            evaluation = model.verify_evidence(evaluation, manifest.conversations[i], manifest.evidence_verification)
+        except evidence.FabricatedEvidenceError:
+            num_fabricated += 1
+            continue
+        evaluations_per_conversation[i].setdefault(manifest.features[j].name, []).append(evaluation)
+
+    if num_fabricated > 0:
+        print(f"{num_fabricated} evaluation(s) dropped for fabricated evidence (EVIDENCE_VERIFICATION = 'drop' at export)")
+
+    per_conversation_stats = [model.aggregate_features_evaluations(evaluations) for evaluations in evaluations_per_conversation]
+    return model.merge_conversations_stats(per_conversation_stats, manifest.features)
+
+
+async def run_batch_file_locally(input_path: str, output_path: str, backend: str = "mock", max_concurrency: int = 16) -> None:
+    """Local stand-in for the Batch API: run every request of `input_path` and write a result file."""
+
+    with open(input_path, "r") as f:
+        requests = [json.loads(raw_line) for raw_line in f if raw_line.strip()]
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _process(request: Dict[str, Any]) -> Dict[str, Any]:
+        body = request["body"]
+        llm_backend, model_name = model.get_backend(f"{backend}:{body['model']}")
+        text_format = body.get("text", {}).get("format")
+
+        try:
+            async with semaphore:
+                if text_format is None:
+                    response = await llm_backend.create(model=model_name, input=body["input"], temperature=body.get("temperature"), max_output_tokens=body.get("max_output_tokens"))
+                else:
+                    response = await llm_backend.parse(model=model_name, input=body["input"], text_format=TEXT_FORMATS[text_format["name"]], temperature=body.get("temperature"), max_output_tokens=body.get("max_output_tokens"))
+        except Exception as _error:
+            return {"id": f"batch_req_{request['custom_id']}", "custom_id": request["custom_id"], "response": None, "error": {"code": type(_error).__name__, "message": str(_error)}}
+
+        output_text = response.output_parsed.model_dump_json() if response.output_parsed is not None else response.output_text
+        return {
+            "id": f"batch_req_{request['custom_id']}",
+            "custom_id": request["custom_id"],
+            "response": {
+                "status_code": 200,
+                "body": {
+                    "model": body["model"],
+                    "output": [{"type": "message", "role": "assistant", "content": [{"type": "output_text", "text": output_text}]}],
+                    "usage": response.usage.model_dump(),
+                },
+            },
+            "error": None,
+        }
+
+    results = []
+    for future in tqdm(asyncio.as_completed([_process(request) for request in requests]), total=len(requests), desc=f"Processing {os.path.basename(input_path)}", leave=False):
+        results.append(await future)
+
+    with open(output_path, "w") as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def _print_stats(stats: List[StatsFeatureEvaluation]) -> None:
+    for stats_feature_evaluation in stats:
+        print(f"{stats_feature_evaluation.evaluations[0].feature.name}: score: {stats_feature_evaluation.average_score:>6.2f} std: {stats_feature_evaluation.standard_deviation:>6.2f} (n={stats_feature_evaluation.num_evaluations})")
+
+
+def main():
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_analysis = subparsers.add_parser("export-analysis")
+    export_analysis.add_argument("--dataset", default="jess_lee", help="name of a `dataset_loader` module, data is read from dataset/<name>")
+    export_analysis.add_argument("--bank", default="output/features_bank.json")
+    export_analysis.add_argument("--batch-dir", default="output/batch")
+
+    export_scoring = subparsers.add_parser("export-scoring")
+    export_scoring.add_argument("--batch-dir", default="output/batch")
+    export_scoring.add_argument("results", nargs="*", help="analysis result files downloaded from the Batch API (none for profiles without analysis)")
+
+    import_results = subparsers.add_parser("import")
+    import_results.add_argument("--batch-dir", default="output/batch")
+    import_results.add_argument("results", nargs="+", help="scoring result files downloaded from the Batch API")
+
+    run_local = subparsers.add_parser("run-local")
+    run_local.add_argument("--backend", default="mock")
+    run_local.add_argument("requests", nargs="+", help="request files, results are written next to them (`*_requests_*` -> `*_results_*`)")
+
+    args = parser.parse_args()
+
+    if args.command == "export-analysis":
+        load_dataset = importlib.import_module(f"dataset_loader.{args.dataset}").load_dataset
+        train_set, test_set, validation_set = load_dataset(f"dataset/{args.dataset}", max_words_per_batch=2000)
+        conversations = validation_set + train_set + test_set
+
+        features_bank = [Feature.model_validate(_feature) for _feature in json.load(open(args.bank))]
+        paths = export_analysis_wave(conversations, features_bank, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL, args.batch_dir)
+        print("\n".join(paths))
+
+    elif args.command == "export-scoring":
+        print("\n".join(export_scoring_wave(args.batch_dir, args.results)))
+
+    elif args.command == "import":
+        _print_stats(import_scoring_results(args.batch_dir, args.results))
+
+    elif args.command == "run-local":
+        for path in args.requests:
+            output_path = path.replace("_requests_", "_results_")
+            asyncio.run(run_batch_file_locally(path, output_path, backend=args.backend))
+            print(output_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import time
+import model
+import asyncio
+import metrics
+import numpy as np
+
+from typing import Dict, List
+from model import Feature, StatsFeatureEvaluation, SCORING_PROFILES
+from constants import MODELS_TO_ANALYZE, MODEL_PRICES
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from dataset_loader.jess_lee import load_dataset
+
+
+MAX_CONVERSATIONS = 3
+NUM_EVALUATIONS_PER_MODEL = 3
+
+
+def _means_by_cell(per_conversation_stats: List[List[StatsFeatureEvaluation]]) -> Dict[tuple[int, str], float]:
+    return {
+        (index, stats.evaluations[0].feature.name): stats.average_score
+        for index, conversation_stats in enumerate(per_conversation_stats)
+        for stats in conversation_stats
+    }
+
+
+def score_drift(reference: List[List[StatsFeatureEvaluation]], candidate: List[List[StatsFeatureEvaluation]]) -> Dict:
+    """Drift of the (conversation, feature) mean scores of `candidate` against `reference`."""
+
+    reference_means, candidate_means = _means_by_cell(reference), _means_by_cell(candidate)
+    cells = [cell for cell in reference_means if cell in candidate_means]
+
+    reference_scores = np.array([reference_means[cell] for cell in cells])
+    candidate_scores = np.array([candidate_means[cell] for cell in cells])
+    differences = np.abs(reference_scores - candidate_scores)
+
+    return {
+        "num_cells": len(cells),
+        "mean_absolute_drift": float(differences.mean()) if len(cells) > 0 else None,
+        "max_absolute_drift": float(differences.max()) if len(cells) > 0 else None,
+        "correlation": float(np.corrcoef(reference_scores, candidate_scores)[0, 1]) if len(cells) > 1 else None,
+    }
+
+
+async def benchmark_scoring_profiles(conversations: List[List[str]], features: List[Feature], models: List[str], num_evaluations_per_model: int) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = {}
+    per_conversation_stats_by_profile: Dict[str, List[List[StatsFeatureEvaluation]]] = {}
+
+    for profile_name, profile in SCORING_PROFILES.items():
+        print(f"Scoring with profile '{profile_name}'...")
+
+        usage_before = metrics.usage_snapshot()
+        started_at = time.monotonic()
+        per_conversation_stats_by_profile[profile_name] = await model.evaluate_features_scores_per_conversation(
+            conversations, features, models, num_evaluations_per_model, profile=profile
+        )
+        seconds = time.monotonic() - started_at
+
+        usage = metrics.usage_since(usage_before)
+        num_calls = sum(_usage["calls"] for _usage in usage.values())
+
+        results[profile_name] = {
+            "seconds": seconds,
+            "calls": num_calls,
+            "mean_call_latency_seconds": sum(_usage["latency_seconds"] for _usage in usage.values()) / num_calls if num_calls > 0 else None,
+            "input_tokens": sum(_usage["input_tokens"] for _usage in usage.values()),
+            "output_tokens": sum(_usage["output_tokens"] for _usage in usage.values()),
+            "cost_usd": metrics.estimate_cost(usage, MODEL_PRICES),
+            "drift_vs_full": score_drift(per_conversation_stats_by_profile["full"], per_conversation_stats_by_profile[profile_name]),
+        }
+
+    return results
+
+
+def print_benchmark(results: Dict[str, Dict]) -> None:
+    print(f"{'profile':<12} {'seconds':>8} {'latency':>8} {'out tok':>9} {'cost $':>8} {'drift':>6} {'corr':>6}")
+    for profile_name, result in results.items():
+        drift = result["drift_vs_full"]
+        print(
+            f"{profile_name:<12} {result['seconds']:>8.1f} {result['mean_call_latency_seconds'] or 0:>8.2f} {result['output_tokens']:>9.0f} "
+            f"{result['cost_usd']:>8.3f} {drift['mean_absolute_drift'] or 0:>6.2f} {drift['correlation'] if drift['correlation'] is not None else float('nan'):>6.2f}"
+        )
+
+
+async def main():
+    _, _, validation_set = load_dataset("dataset/jess_lee", max_words_per_batch=2000)
+
+    features_bank = json.load(open("output/features_bank.json"))
+    features_bank = [Feature.model_validate(_feature) for _feature in features_bank]
+
+    results = await benchmark_scoring_profiles(validation_set[:MAX_CONVERSATIONS], features_bank, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL)
+    print_benchmark(results)
+
+    with open("output/scoring_profiles_benchmark.json", "w") as f:
+        json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
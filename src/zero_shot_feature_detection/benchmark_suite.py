@@ -0,0 +1,274 @@
+"""
+Quality-vs-speed regression benchmark on a frozen golden set.
+
+    1. `freeze`: samples conversations from the datasets (fixed seed), freezes a features bank and records the
+       reference score distributions with the current two-step scorer (full profile, single sampled calls).
+       Written to `benchmark/golden/`, to be committed so every run compares against the same reference.
+    2. `run`: runs each pipeline configuration (see `CONFIGURATIONS`) on the golden set and reports throughput, cost
+       and latency next to the agreement with the reference (MAE, Spearman rank correlation, std ratio).
+       Configurations outside the `GATE` thresholds are reported as regressions, and the exit code is 1.
+"""
+
+import os
+import sys
+import json
+import time
+import model
+import random
+import asyncio
+import metrics
+import cascade
+import argparse
+import constants
+import importlib
+import correlation
+import numpy as np
+import logprob_scoring
+
+from contextlib import contextmanager
+from pydantic import BaseModel
+from typing import Any, Dict, Iterator, List, Literal
+from model import Feature, StatsFeatureEvaluation
+
+
+GOLDEN_DIR = "benchmark/golden"
+GOLDEN_DATASETS = ["jess_lee", "dara", "thytu", "huberman_lab", "crucible_moments"]
+NUM_CONVERSATIONS_PER_DATASET = 2
+REFERENCE_NUM_EVALUATIONS_PER_MODEL = 10
+
+
+class BenchmarkConfiguration(BaseModel):
+    scorer: Literal["sampling", "logprobs", "cascade"] = "sampling"
+    num_evaluations_per_model: int = REFERENCE_NUM_EVALUATIONS_PER_MODEL
+    constants: Dict[str, Any] = {} # overrides of `constants` during the run
+
+
+# The reference settings, every configuration starts from them
+REFERENCE_CONSTANTS = {
+    "SCORING_PROFILE": "full",
+    "USE_MULTI_SAMPLE_REQUESTS": False,
+    "USE_REQUEST_HEDGING": False,
+    "EVIDENCE_VERIFICATION": "flag",
+}
+
+CONFIGURATIONS: Dict[str, BenchmarkConfiguration] = {
+    "reference": BenchmarkConfiguration(),
+    "multi_sample": BenchmarkConfiguration(constants={"USE_MULTI_SAMPLE_REQUESTS": True}),
+    "hedging": BenchmarkConfiguration(constants={"USE_REQUEST_HEDGING": True}),
+    "fewer_repeats": BenchmarkConfiguration(num_evaluations_per_model=3),
+    "compact": BenchmarkConfiguration(constants={"SCORING_PROFILE": "compact"}),
+    "brief": BenchmarkConfiguration(constants={"SCORING_PROFILE": "brief"}),
+    "score_only": BenchmarkConfiguration(constants={"SCORING_PROFILE": "score-only"}),
+    "evidence_drop": BenchmarkConfiguration(constants={"EVIDENCE_VERIFICATION": "drop"}),
+    "logprobs": BenchmarkConfiguration(scorer="logprobs"),
+    "cascade": BenchmarkConfiguration(scorer="cascade"),
+}
+
+# Regression gate, on the agreement of the (conversation, feature) mean scores with the reference
+GATE = {
+    "max_mae": 1.0,
+    "min_spearman": 0.8,
+    "min_std_ratio": 0.5,
+    "max_std_ratio": 2.0,
+}
+
+
+class GoldenCell(BaseModel):
+    conversation_index: int
+    feature_name: str
+    scores: List[float]
+
+
+class GoldenSet(BaseModel):
+    conversations: List[str]
+    datasets: List[str] # dataset of each conversation
+    features: List[Feature]
+    models: List[str]
+    reference: List[GoldenCell]
+
+
+@contextmanager
+def _override_constants(overrides: Dict[str, Any]) -> Iterator[None]:
+    # NOTE: the scoring code reads these through `constants.<NAME>` at call time, so overriding the module attributes is enough
+    previous = {name: getattr(constants, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(constants, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(constants, name, value)
+
+
+async def _score_golden_set(golden_set: GoldenSet, configuration: BenchmarkConfiguration) -> List[List[StatsFeatureEvaluation]]:
+    """Stats per conversation (in golden set order) with the given configuration."""
+
+    with _override_constants(REFERENCE_CONSTANTS | configuration.constants):
+        if configuration.scorer == "sampling":
+            return await model.evaluate_features_scores_per_conversation(
+                [[conversation] for conversation in golden_set.conversations], golden_set.features, golden_set.models, configuration.num_evaluations_per_model
+            )
+
+        if configuration.scorer == "logprobs":
+            return await logprob_scoring.evaluate_features_scores_per_conversation_logprobs(
+                [[conversation] for conversation in golden_set.conversations], golden_set.features, golden_set.models, configuration.num_evaluations_per_model
+            )
+
+        route = cascade.CascadeRoute(**constants.CASCADE_ROUTES["evaluation"])
+        per_conversation_stats, _ = await cascade.evaluate_features_scores_per_conversation_cascade(
+            [[conversation] for conversation in golden_set.conversations], golden_set.features, route
+        )
+        return per_conversation_stats
+
+
+def score_agreement(reference: List[GoldenCell], per_conversation_stats: List[List[StatsFeatureEvaluation]]) -> Dict:
+    stats_by_cell = {
+        (index, stats.evaluations[0].feature.name): stats
+        for index, conversation_stats in enumerate(per_conversation_stats)
+        for stats in conversation_stats
+    }
+    cells = [cell for cell in reference if (cell.conversation_index, cell.feature_name) in stats_by_cell]
+
+    reference_means = np.array([np.mean(cell.scores) for cell in cells])
+    reference_stds = np.array([np.std(cell.scores, ddof=1) for cell in cells])
+    means = np.array([stats_by_cell[(cell.conversation_index, cell.feature_name)].average_score for cell in cells])
+    stds = np.array([stats_by_cell[(cell.conversation_index, cell.feature_name)].standard_deviation for cell in cells])
+
+    return {
+        "coverage": len(cells) / len(reference) if len(reference) > 0 else 0.0,
+        "mae": float(np.abs(means - reference_means).mean()) if len(cells) > 0 else None,
+        "spearman": correlation.spearman_correlation(reference_means, means),
+        "std_ratio": float(np.median(stds[reference_stds > 0] / reference_stds[reference_stds > 0])) if np.any(reference_stds > 0) else None,
+    }
+
+
+def gate_failures(agreement: Dict) -> List[str]:
+    failures = []
+    if agreement["mae"] is None or agreement["mae"] > GATE["max_mae"]:
+        failures.append(f"MAE {agreement['mae']} > {GATE['max_mae']}")
+    if agreement["spearman"] is None or agreement["spearman"] < GATE["min_spearman"]:
+        failures.append(f"Spearman {agreement['spearman']} < {GATE['min_spearman']}")
+    if agreement["std_ratio"] is not None and not GATE["min_std_ratio"] <= agreement["std_ratio"] <= GATE["max_std_ratio"]:
+        failures.append(f"std ratio {agreement['std_ratio']} outside [{GATE['min_std_ratio']}, {GATE['max_std_ratio']}]")
+    return failures
+
+
+async def run_benchmark(golden_set: GoldenSet, configuration_names: List[str]) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = {}
+    num_cells = len(golden_set.conversations) * len(golden_set.features)
+
+    for name in configuration_names:
+        print(f"Running configuration '{name}'...")
+        usage_before = metrics.usage_snapshot()
+        started_at = time.monotonic()
+
+        per_conversation_stats = await _score_golden_set(golden_set, CONFIGURATIONS[name])
+
+        seconds = time.monotonic() - started_at
+        usage = metrics.usage_since(usage_before)
+        num_calls = sum(_usage["calls"] for _usage in usage.values())
+        agreement = score_agreement(golden_set.reference, per_conversation_stats)
+
+        results[name] = {
+            "seconds": seconds,
+            "cells_per_second": num_cells / seconds if seconds > 0 else None,
+            "calls": num_calls,
+            "mean_call_latency_seconds": sum(_usage["latency_seconds"] for _usage in usage.values()) / num_calls if num_calls > 0 else None,
+            "cost_usd": metrics.estimate_cost(usage, constants.MODEL_PRICES),
+            "agreement": agreement,
+            "regressions": gate_failures(agreement),
+        }
+
+    return results
+
+
+def print_benchmark(results: Dict[str, Dict]) -> None:
+    print(f"{'configuration':<14} {'cells/s':>8} {'calls':>7} {'latency':>8} {'cost $':>8} {'MAE':>6} {'rho':>6} {'std r':>6}  gate")
+    for name, result in results.items():
+        agreement = result["agreement"]
+        print(
+            f"{name:<14} {result['cells_per_second'] or 0:>8.2f} {result['calls']:>7.0f} {result['mean_call_latency_seconds'] or 0:>8.2f} {result['cost_usd']:>8.3f} "
+            f"{agreement['mae'] if agreement['mae'] is not None else float('nan'):>6.2f} "
+            f"{agreement['spearman'] if agreement['spearman'] is not None else float('nan'):>6.2f} "
+            f"{agreement['std_ratio'] if agreement['std_ratio'] is not None else float('nan'):>6.2f}  "
+            f"{'ok' if len(result['regressions']) == 0 else 'REGRESSION: ' + '; '.join(result['regressions'])}"
+        )
+
+
+async def freeze_golden_set(bank_path: str, models: List[str], seed: int = 0) -> GoldenSet:
+    conversations, datasets = [], []
+    for dataset in GOLDEN_DATASETS:
+        random.seed(seed) # the loaders shuffle with `random`
+        _, test_set, validation_set = importlib.import_module(f"dataset_loader.{dataset}").load_dataset(f"dataset/{dataset}", max_words_per_batch=2000)
+        for batch in (validation_set + test_set)[:NUM_CONVERSATIONS_PER_DATASET]: # small datasets can have an empty validation set
+            conversations.append("\n".join([segment for segment in batch]))
+            datasets.append(dataset)
+
+    features = [Feature.model_validate(_feature) for _feature in json.load(open(bank_path))]
+    golden_set = GoldenSet(conversations=conversations, datasets=datasets, features=features, models=models, reference=[])
+
+    per_conversation_stats = await _score_golden_set(golden_set, CONFIGURATIONS["reference"])
+    golden_set.reference = [
+        GoldenCell(conversation_index=index, feature_name=stats.evaluations[0].feature.name, scores=[evaluation.score for evaluation in stats.evaluations])
+        for index, conversation_stats in enumerate(per_conversation_stats)
+        for stats in conversation_stats
+    ]
+    return golden_set
+
+
+def save_golden_set(golden_set: GoldenSet, golden_dir: str = GOLDEN_DIR) -> None:
+    os.makedirs(golden_dir, exist_ok=True)
+    with open(os.path.join(golden_dir, "golden_set.json"), "w") as f:
+        json.dump(golden_set.model_dump(), f, indent=4)
+
+
+def load_golden_set(golden_dir: str = GOLDEN_DIR) -> GoldenSet:
+    path = os.path.join(golden_dir, "golden_set.json")
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"No golden set at {path}: freeze one first with `benchmark_suite.py freeze --bank <features bank>` "
+            "(it scores the samples with the reference configuration, so it needs the API), then commit it"
+        )
+    return GoldenSet.model_validate(json.load(open(path)))
+
+
+def main():
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--golden-dir", default=GOLDEN_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    freeze = subparsers.add_parser("freeze")
+    freeze.add_argument("--bank", default="output/features_bank.json")
+
+    run = subparsers.add_parser("run")
+    run.add_argument("--configurations", nargs="+", default=list(CONFIGURATIONS), choices=list(CONFIGURATIONS))
+    run.add_argument("--output", default="output/benchmark_report.json")
+
+    args = parser.parse_args()
+
+    if args.command == "freeze":
+        golden_set = asyncio.run(freeze_golden_set(args.bank, constants.MODELS_TO_ANALYZE))
+        save_golden_set(golden_set, args.golden_dir)
+        print(f"Golden set: {len(golden_set.conversations)} conversations x {len(golden_set.features)} features, {len(golden_set.reference)} reference cells")
+
+    elif args.command == "run":
+        try:
+            golden_set = load_golden_set(args.golden_dir)
+        except FileNotFoundError as _error:
+            sys.exit(str(_error))
+
+        results = asyncio.run(run_benchmark(golden_set, args.configurations))
+        print_benchmark(results)
+
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+        if any(len(result["regressions"]) > 0 for result in results.values()):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
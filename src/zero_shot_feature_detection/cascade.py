@@ -0,0 +1,193 @@
+import math
+import time
+import model
+import metrics
+import constants
+import work_queue
+
+from tqdm import tqdm
+from pydantic import BaseModel
+from typing import Dict, List
+from model import Feature, FeatureEvaluation, StatsFeatureEvaluation
+from constants import MODEL_PRICES
+
+
+class CascadeRoute(BaseModel):
+    cheap_model: str
+    cheap_num_evaluations: int
+    strong_models: List[str]
+    strong_num_evaluations: int
+    max_std: float # escalate when the cheap scores are more spread than this
+    decision_boundary: float | None = None # escalate when the cheap mean lands close to this score...
+    boundary_margin: float = 0.0 # ...within this margin
+
+
+class CascadeReport(BaseModel):
+    num_cells: int # (conversation, feature) cells
+    num_escalated: int
+    escalated_fraction: float
+    num_calls: int
+    full_ensemble_num_calls: int
+    cost_usd: float
+    full_ensemble_cost_usd: float
+    call_seconds: float
+    full_ensemble_call_seconds: float
+    wall_seconds: float
+
+
+def _should_escalate(stats: StatsFeatureEvaluation | None, route: CascadeRoute) -> bool:
+    if stats is None:
+        return True # the cheap model failed on this feature
+
+    if stats.standard_deviation > route.max_std:
+        return True
+
+    if route.decision_boundary is not None and abs(stats.average_score - route.decision_boundary) < route.boundary_margin:
+        return True
+
+    return False
+
+
+async def _evaluate_conversation_cascade(conversation: str, features: List[Feature], route: CascadeRoute) -> tuple[List[StatsFeatureEvaluation], int]:
+
+    cheap_stats = await model.evaluate_features_scores(conversation, features, [route.cheap_model], num_evaluations_per_model=route.cheap_num_evaluations)
+    cheap_stats_by_name = {stats.evaluations[0].feature.name: stats for stats in cheap_stats}
+
+    escalated_features = [feature for feature in features if _should_escalate(cheap_stats_by_name.get(feature.name), route)]
+
+    if len(escalated_features) == 0:
+        return cheap_stats, 0
+
+    strong_stats = await model.evaluate_features_scores(conversation, escalated_features, route.strong_models, num_evaluations_per_model=route.strong_num_evaluations)
+
+    # Escalated features keep both the cheap and the strong evaluations
+    evaluations: Dict[str, List[FeatureEvaluation]] = {stats.evaluations[0].feature.name: list(stats.evaluations) for stats in cheap_stats}
+    for stats in strong_stats:
+        evaluations.setdefault(stats.evaluations[0].feature.name, []).extend(stats.evaluations)
+
+    return model.aggregate_features_evaluations(evaluations), len(escalated_features)
+
+
+def _build_report(num_cells: int, num_escalated: int, route: CascadeRoute, usage_by_model: Dict[str, Dict[str, float]], wall_seconds: float) -> CascadeReport:
+
+    num_calls = int(sum(usage["calls"] for usage in usage_by_model.values()))
+    safe_num_calls = max(num_calls, 1)
+
+    # Prompts are the same whatever the model, so the observed tokens per call are used for the models that did not run
+    input_tokens_per_call = sum(usage["input_tokens"] for usage in usage_by_model.values()) / safe_num_calls
+    output_tokens_per_call = sum(usage["output_tokens"] for usage in usage_by_model.values()) / safe_num_calls
+    latency_per_call = sum(usage["latency_seconds"] for usage in usage_by_model.values()) / safe_num_calls
+
+    # Calls per evaluation as observed (2 with the analysis then scoring calls), so the estimate follows the scoring setup
+    num_evaluations = num_cells * route.cheap_num_evaluations + num_escalated * route.strong_num_evaluations * len(route.strong_models)
+    calls_per_evaluation = num_calls / max(num_evaluations, 1)
+
+    # The full ensemble runs every model of the route, with the strong number of evaluations, on every cell
+    full_ensemble_usage: Dict[str, Dict[str, float]] = {}
+    full_ensemble_call_seconds = 0.0
+    for model_name in [route.cheap_model, *route.strong_models]:
+        calls = num_cells * route.strong_num_evaluations * calls_per_evaluation
+        observed = usage_by_model.get(model_name)
+        model_latency_per_call = observed["latency_seconds"] / observed["calls"] if observed and observed["calls"] > 0 else latency_per_call
+
+        full_ensemble_usage[model_name] = {
+            "calls": calls,
+            "input_tokens": calls * input_tokens_per_call,
+            "output_tokens": calls * output_tokens_per_call,
+        }
+        full_ensemble_call_seconds += calls * model_latency_per_call
+
+    return CascadeReport(
+        num_cells=num_cells,
+        num_escalated=num_escalated,
+        escalated_fraction=num_escalated / max(num_cells, 1),
+        num_calls=num_calls,
+        full_ensemble_num_calls=round(sum(usage["calls"] for usage in full_ensemble_usage.values())),
+        cost_usd=metrics.estimate_cost(usage_by_model, MODEL_PRICES),
+        full_ensemble_cost_usd=metrics.estimate_cost(full_ensemble_usage, MODEL_PRICES),
+        call_seconds=sum(usage["latency_seconds"] for usage in usage_by_model.values()),
+        full_ensemble_call_seconds=full_ensemble_call_seconds,
+        wall_seconds=wall_seconds,
+    )
+
+
+async def evaluate_features_scores_cascade(conversation: str, features: List[Feature], route: CascadeRoute) -> tuple[List[StatsFeatureEvaluation], CascadeReport]:
+    """Tiered counterpart of `model.evaluate_features_scores`."""
+
+    usage_before = metrics.usage_snapshot()
+    started_at = time.monotonic()
+
+    stats, num_escalated = await _evaluate_conversation_cascade(conversation, features, route)
+
+    report = _build_report(len(features), num_escalated, route, metrics.usage_since(usage_before), time.monotonic() - started_at)
+    return stats, report
+
+
+async def evaluate_features_scores_per_conversation_cascade(conversations: List[List[str]], features: List[Feature], route: CascadeRoute) -> tuple[List[List[StatsFeatureEvaluation]], CascadeReport]:
+    """Tiered counterpart of `model.evaluate_features_scores_per_conversation`."""
+
+    usage_before = metrics.usage_snapshot()
+    started_at = time.monotonic()
+
+    outputs: List[tuple[List[StatsFeatureEvaluation], int]] = [([], 0) for _ in conversations]
+
+    async def _evaluate(index: int) -> tuple[List[StatsFeatureEvaluation], int]:
+        return await _evaluate_conversation_cascade("\n".join([segment for segment in conversations[index]]), features, route)
+
+    pbar = tqdm(total=len(conversations), desc="Evaluating features scores across conversations (cascade)", leave=False)
+
+    def _on_result(index: int, output: tuple[List[StatsFeatureEvaluation], int] | None, error: Exception | None) -> None:
+        pbar.update(1)
+        if error is not None:
+            metrics.record_error(error)
+            print(f"Error while evaluating feature scores (cascade): {error=}, {type(error)=}")
+        else:
+            outputs[index] = output
+
+    # Conversations in flight: enough cheap calls to fill the API semaphore and the queue (same window as `model.py`)
+    await work_queue.run_work_queue(
+        ((0, index) for index in range(len(conversations))),
+        _evaluate,
+        _on_result,
+        num_workers=math.ceil(3 * constants.SEMAPHORE_MAX_CONCURRENCY / max(len(features) * route.cheap_num_evaluations, 1)) + 1,
+    )
+
+    per_conversation_stats = [stats for stats, _ in outputs]
+    num_escalated = sum(batch_num_escalated for _, batch_num_escalated in outputs)
+
+    report = _build_report(len(conversations) * len(features), num_escalated, route, metrics.usage_since(usage_before), time.monotonic() - started_at)
+    return per_conversation_stats, report
+
+
+async def evaluate_features_scores_across_conversations_cascade(conversations: List[List[str]], features: List[Feature], route: CascadeRoute) -> tuple[List[StatsFeatureEvaluation], CascadeReport]:
+    """Tiered counterpart of `model.evaluate_features_scores_across_conversations`."""
+
+    per_conversation_stats, report = await evaluate_features_scores_per_conversation_cascade(conversations, features, route)
+    return model.merge_conversations_stats(per_conversation_stats, features), report
+
+
+def merge_cascade_reports(reports: List[CascadeReport]) -> CascadeReport:
+    """Totals of several cascade runs (e.g. one per batch while building the bank)."""
+
+    num_cells = sum(report.num_cells for report in reports)
+    num_escalated = sum(report.num_escalated for report in reports)
+    return CascadeReport(
+        num_cells=num_cells,
+        num_escalated=num_escalated,
+        escalated_fraction=num_escalated / max(num_cells, 1),
+        num_calls=sum(report.num_calls for report in reports),
+        full_ensemble_num_calls=sum(report.full_ensemble_num_calls for report in reports),
+        cost_usd=sum(report.cost_usd for report in reports),
+        full_ensemble_cost_usd=sum(report.full_ensemble_cost_usd for report in reports),
+        call_seconds=sum(report.call_seconds for report in reports),
+        full_ensemble_call_seconds=sum(report.full_ensemble_call_seconds for report in reports),
+        wall_seconds=sum(report.wall_seconds for report in reports),
+    )
+
+
+def print_cascade_report(report: CascadeReport) -> None:
+    print(f"Escalated cells: {report.num_escalated}/{report.num_cells} ({report.escalated_fraction * 100:.1f}%)")
+    print(f"Calls: {report.num_calls} (full ensemble: {report.full_ensemble_num_calls})")
+    print(f"Estimated cost: ${report.cost_usd:.4f} (full ensemble: ${report.full_ensemble_cost_usd:.4f})")
+    print(f"Call-seconds: {report.call_seconds:.1f}s (full ensemble: {report.full_ensemble_call_seconds:.1f}s), wall time: {report.wall_seconds:.1f}s")
+    print("-" * 100, end="\n\n")
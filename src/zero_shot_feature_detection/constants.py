@@ -7,10 +7,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-SECRET_OPENROUTER_API_KEY = SecretStr(os.getenv("OPENROUTER_API_KEY"))
+# Backend used for model names without an explicit "<backend>:" prefix, one of "openrouter", "openai", "mock", "local"
+# (e.g. "local:Qwen/Qwen2.5-0.5B-Instruct" runs on CPU through transformers, see `src/llm_backends/`)
+LLM_BACKEND = "openrouter"
 
-if SECRET_OPENROUTER_API_KEY.get_secret_value() is None:
-    raise ValueError("OPENROUTER_API_KEY is not set")
+# NOTE: only required by the "openrouter" backend, it checks it when it is first used (see `OpenRouterBackend`)
+SECRET_OPENROUTER_API_KEY = SecretStr(os.getenv("OPENROUTER_API_KEY") or "")
 
 
 MODELS_TO_ANALYZE = [
@@ -27,8 +29,96 @@ MODELS_TO_ANALYZE = [
     # "google/gemini-2.5-pro",
 ]
 
+# Models used by the single-call stages of the features bank building
+STAGE_MODELS = {
+    "merge_similar_features": "openai/gpt-4.1",
+    "filter_features_candidates_against_bank": "openai/gpt-4.1",
+}
+
+# Tiered scoring (see `cascade.py`): score with a cheap model first, escalate a feature to the stronger
+# models only when the cheap scores are unstable or too close to the decision boundary. One route per stage.
+USE_SCORING_CASCADE = False
+CASCADE_ROUTES = {
+    # Scoring new candidates while building the bank (decision: is the feature stable, std <= MAX_STD_DEVIATION)
+    "bank_building": {
+        "cheap_model": "openai/gpt-4.1-mini",
+        "cheap_num_evaluations": 3,
+        "strong_models": ["openai/gpt-4.1"],
+        "strong_num_evaluations": 5,
+        "max_std": 1.0,
+        "decision_boundary": None,
+        "boundary_margin": 0.0,
+    },
+    # Scoring a bank against other personas (decision: is the feature expressed, above/below the neutral 5)
+    "evaluation": {
+        "cheap_model": "openai/gpt-4.1-mini",
+        "cheap_num_evaluations": 3,
+        "strong_models": ["openai/gpt-4.1"],
+        "strong_num_evaluations": 5,
+        "max_std": 1.5,
+        "decision_boundary": 5.0,
+        "boundary_margin": 1.0,
+    },
+}
+
+# USD per 1M tokens (input, output), only used to estimate costs in reports
+MODEL_PRICES = {
+    "openai/gpt-4.1-mini": (0.40, 1.60),
+    "openai/gpt-4.1": (2.00, 8.00),
+    "openai/gpt-4o": (2.50, 10.00),
+    "openai/gpt-5-mini": (0.25, 2.00),
+    "openai/gpt-5": (1.25, 10.00),
+    "google/gemini-2.5-flash-lite-preview-06-17": (0.10, 0.40),
+    "google/gemini-2.5-pro": (1.25, 10.00),
+    "anthropic/claude-sonnet-4.5": (3.00, 15.00),
+}
+
+# Logprob scoring (see `logprob_scoring.py`): read the score distribution from the logprobs of a single-token answer
+# instead of sampling NUM_EVALUATIONS_PER_MODEL times. Falls back to sampling for providers without logprobs.
+USE_LOGPROBS_SCORING = False
+MIN_LOGPROBS_SCORE_MASS = 0.5 # below this probability mass on valid scores (0-10), the distribution is not trusted
+
+# Verbosity of the scoring calls (see `model.SCORING_PROFILES`): "full", "compact", "brief" or "score-only"
+SCORING_PROFILE = "full"
+
+# Evidence spans quoted in the scoring explanations are checked against the conversation (see `evidence.py`):
+# "off", "flag" (explanation prefixed, evaluation kept) or "drop" (evaluation discarded and re-sampled)
+EVIDENCE_VERIFICATION = "flag"
+EVIDENCE_MIN_VERIFIED_FRACTION = 0.5 # below this share of quotes found in the conversation, the evidence is fabricated
+
+# Repeated samples of the same input (rubrics, scoring repeats) are requested together, so the prompt is paid once
+# (`n` choices where the provider supports it, see `llm_backends.base.LLMBackend.create_samples`)
+USE_MULTI_SAMPLE_REQUESTS = False
+
 NUM_RUBRICS_PER_MODEL = 3
 NUM_EVALUATIONS_PER_MODEL = 10
 MAX_STD_DEVIATION = 2
+MAX_FEATURE_CORRELATION = 0.8 # features correlated above this (in absolute value) are compacted into one
+
+SEMAPHORE_MAX_CONCURRENCY = 250 # also the number of workers of the cross-conversation scoring queue
+
+# Hedged scoring calls (see `hedging.py`): a call slower than the rolling HEDGING_QUANTILE latency of its model is
+# duplicated and the first response wins. Duplicates are capped to HEDGING_MAX_EXTRA_LOAD of the calls.
+USE_REQUEST_HEDGING = False
+HEDGING_QUANTILE = 0.95
+HEDGING_MAX_EXTRA_LOAD = 0.1
+
+# Persistent score matrix (see `score_store.py`): only the (feature, conversation, model) cells not scored yet are evaluated
+# (keyed by content hashes of the feature, the conversation batch and the scoring prompts/settings)
+USE_SCORE_STORE = False
+SCORE_STORE_DIR = "output/score_store"
+
+# Sparse scoring (see `matrix_completion.py`): score an actively chosen subset of the (conversation x feature) cells and
+# impute the rest with a low-rank factorization, until the cross-validated error of the completion reaches the target
+USE_SPARSE_SCORING = False
+SPARSE_SCORING_TARGET_RMSE = 0.75 # on the 0-10 scale
+SPARSE_SCORING_MAX_FRACTION = 0.6 # never score more than this share of the cells (then stop whatever the error)
+
+# Batch API limits (per input file), see `batch_jobs.py`
+BATCH_MAX_REQUESTS_PER_FILE = 50_000
+BATCH_MAX_BYTES_PER_FILE = 190 * 1024 * 1024 # 200MB limit, with some margin
 
-SEMAPHORE_MAX_CONCURRENCY = 250
+# Event-loop health / backpressure metrics, refreshed while a run is going on
+METRICS_OUTPUT_PATH = "output/loop_metrics.prom"
+METRICS_OUTPUT_FORMAT = "prometheus" # "prometheus" (text exposition format) or "json"
+METRICS_SAMPLE_INTERVAL = 1.0 # seconds
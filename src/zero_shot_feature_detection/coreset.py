@@ -0,0 +1,234 @@
+"""
+Representative sampling of the conversation batches of a persona (coreset), instead of keeping the first k.
+
+Every batch is fingerprinted with the text-statistics proxies of `proxy_metrics.py` (no LLM call), then k-medoids
+picks the k batches that best cover the stylistic variety of the persona. Each medoid stands for its cluster, whose
+size is its weight.
+
+The tracking report compares, on every proxy, the mean of the sample with the mean of the full corpus (in standard
+deviations of the corpus), for the coreset and for the previous "first k batches" truncation and random samples. As the
+coreset is built on these very proxies, this report is optimistic: `--check` scores the whole dataset with the LLM and does the
+same comparison on the feature scores.
+"""
+
+import os
+import sys
+import json
+import model
+import asyncio
+import argparse
+import importlib
+import numpy as np
+import proxy_metrics
+
+from typing import Dict, List
+from pydantic import BaseModel
+from model import Feature
+from constants import MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL
+
+
+NUM_KMEDOIDS_ITERATIONS = 50
+NUM_RANDOM_SAMPLES = 100 # random baselines of the tracking report
+
+
+class CoresetSample(BaseModel):
+    indices: List[int]
+    weights: List[float] # share of the batches represented by each sampled batch
+
+
+def fingerprints(batches: List[List[str]]) -> np.ndarray:
+    """Standardized proxies of each batch (undefined proxies are imputed with the mean)."""
+
+    values = proxy_metrics.compute_proxies(batches)
+    mean = np.nanmean(values, axis=0)
+    std = np.nanstd(values, axis=0)
+    std[~(std > 0)] = 1.0
+    return np.nan_to_num((values - mean) / std, nan=0.0)
+
+
+def k_medoids(points: np.ndarray, k: int, rng: np.random.Generator, num_iterations: int = NUM_KMEDOIDS_ITERATIONS) -> tuple[np.ndarray, np.ndarray]:
+    """Medoid indices and the medoid assignment of every point (k-medoids++ seeding, then alternating updates)."""
+
+    distances = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=-1)
+
+    # Seeding: each new medoid is drawn with a probability proportional to its squared distance to the closest medoid
+    medoids = [int(rng.integers(len(points)))]
+    for _ in range(1, k):
+        closest = distances[:, medoids].min(axis=1) ** 2
+        medoids.append(int(rng.choice(len(points), p=closest / closest.sum())) if closest.sum() > 0 else int(rng.choice(np.setdiff1d(np.arange(len(points)), medoids))))
+    medoids = np.array(medoids)
+
+    for _ in range(num_iterations):
+        assignment = distances[:, medoids].argmin(axis=1)
+
+        # Each medoid moves to the point of its cluster minimizing the total distance to the others
+        new_medoids = medoids.copy()
+        for cluster in range(k):
+            members = np.nonzero(assignment == cluster)[0]
+            if len(members) > 0:
+                new_medoids[cluster] = members[distances[np.ix_(members, members)].sum(axis=1).argmin()]
+
+        if np.array_equal(new_medoids, medoids):
+            break
+        medoids = new_medoids
+
+    return medoids, distances[:, medoids].argmin(axis=1)
+
+
+def select_coreset(batches: List[List[str]], k: int, seed: int = 0) -> CoresetSample:
+    """The k medoids of the batch fingerprints, weighted by the share of the batches in their cluster (all the batches when there are at most k)."""
+
+    if k <= 0:
+        raise ValueError(f"k must be > 0: {k}")
+
+    if len(batches) == 0:
+        return CoresetSample(indices=[], weights=[])
+
+    if len(batches) <= k:
+        return CoresetSample(indices=list(range(len(batches))), weights=[1 / len(batches)] * len(batches))
+
+    medoids, assignment = k_medoids(fingerprints(batches), k, np.random.default_rng(seed))
+    return CoresetSample(
+        indices=[int(index) for index in medoids],
+        weights=[float((assignment == cluster).mean()) for cluster in range(k)],
+    )
+
+
+def _tracking_error(values: np.ndarray, indices: List[int], weights: List[float] | None = None) -> float:
+    """Mean absolute gap between the sample and the full-corpus means, in standard deviations of the corpus."""
+
+    valid = ~np.isnan(values).all(axis=0)
+    full_mean, full_std = np.nanmean(values[:, valid], axis=0), np.nanstd(values[:, valid], axis=0)
+    full_std[~(full_std > 0)] = 1.0
+
+    sample = values[indices][:, valid]
+    if weights is None:
+        sample_mean = np.nanmean(sample, axis=0)
+    else:
+        sample_weights = np.where(np.isnan(sample), 0.0, np.array(weights)[:, None])
+        sample_mean = (np.nan_to_num(sample) * sample_weights).sum(axis=0) / sample_weights.sum(axis=0)
+
+    return float(np.nanmean(np.abs(sample_mean - full_mean) / full_std))
+
+
+def tracking_report(values: np.ndarray, sample: CoresetSample, seed: int = 0) -> Dict[str, float]:
+    """Tracking error of the coreset (plain and weighted means) against the first-k truncation and random samples."""
+
+    k = len(sample.indices)
+    rng = np.random.default_rng(seed)
+    random_errors = [_tracking_error(values, rng.choice(len(values), size=k, replace=False).tolist()) for _ in range(NUM_RANDOM_SAMPLES)]
+
+    return {
+        "num_batches": len(values),
+        "sample_size": k,
+        "coreset": _tracking_error(values, sample.indices),
+        "coreset_weighted": _tracking_error(values, sample.indices, sample.weights),
+        "first_k": _tracking_error(values, list(range(k))),
+        "random_mean": float(np.mean(random_errors)),
+        "random_p90": float(np.percentile(random_errors, 90)),
+    }
+
+
+def print_tracking_report(report: Dict[str, float], label: str) -> None:
+    print(
+        f"{label}: {report['sample_size']}/{report['num_batches']} batches, mean gap to the full-corpus means (in std): "
+        f"coreset {report['coreset']:.2f} (weighted {report['coreset_weighted']:.2f}), first k {report['first_k']:.2f}, "
+        f"random {report['random_mean']:.2f} (p90 {report['random_p90']:.2f})"
+    )
+
+
+def select_representative_batches(batches: List[List[str]], k: int, seed: int = 0) -> tuple[List[List[str]], List[float]]:
+    """
+    Replacement of `batches[:k]`: the coreset batches and their weights (see `weighted_conversations_stats`), with the
+    proxy tracking report printed.
+    """
+
+    sample = select_coreset(batches, k, seed)
+    if len(batches) > k:
+        print_tracking_report(tracking_report(proxy_metrics.compute_proxies(batches), sample, seed), "Coreset (proxies)")
+    return [batches[index] for index in sample.indices], sample.weights
+
+
+def weighted_conversations_stats(per_conversation_stats: List[List[model.StatsFeatureEvaluation]], weights: List[float], features: List[Feature]) -> List[model.StatsFeatureEvaluation]:
+    """
+    `model.merge_conversations_stats` with every conversation weighted by the share of the corpus its cluster stands for,
+    so the statistics estimate the full corpus and not the (evenly spread) medoids. The evaluations of a conversation
+    share its weight; the weights of the conversations scored for a feature are renormalized.
+    """
+
+    stats = []
+    for feature in features:
+        scored = [(weight, _stats) for weight, batch in zip(weights, per_conversation_stats) for _stats in batch if _stats.evaluations[0].feature.name == feature.name]
+        evaluations = [_evaluation for _, _stats in scored for _evaluation in _stats.evaluations]
+
+        if len(evaluations) < 2:
+            print(f"Skipping feature '{feature.name}' because not enough evaluations. (Need at least 2 evaluations)")
+            continue
+
+        evaluation_weights = np.array([weight / len(_stats.evaluations) for weight, _stats in scored for _ in _stats.evaluations])
+        evaluation_weights /= evaluation_weights.sum()
+        scores = np.array([_evaluation.score for _evaluation in evaluations])
+        average_score = float(evaluation_weights @ scores)
+        # Unbiased for reliability weights, equal to `statistics.variance` when the weights are uniform
+        weighted_variance = float(evaluation_weights @ (scores - average_score) ** 2 / (1 - (evaluation_weights ** 2).sum()))
+
+        stats.append(model.StatsFeatureEvaluation(
+            evaluations=evaluations,
+            min_score=float(scores.min()),
+            max_score=float(scores.max()),
+            average_score=average_score,
+            standard_deviation=weighted_variance ** 0.5,
+            variance=weighted_variance,
+            num_evaluations=len(evaluations),
+        ))
+
+    return sorted(stats, key=lambda x: x.standard_deviation)
+
+
+def _load_conversations(dataset: str) -> List[List[str]]:
+    load_dataset = importlib.import_module(f"dataset_loader.{dataset}").load_dataset
+    train_set, test_set, validation_set = load_dataset(f"dataset/{dataset}", max_words_per_batch=2000)
+    return validation_set + train_set + test_set
+
+
+async def _llm_tracking_report(batches: List[List[str]], sample: CoresetSample, features: List[Feature]) -> Dict[str, float]:
+    per_batch_stats = await model.evaluate_features_scores_per_conversation(batches, features, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL)
+
+    feature_index = {feature.name: j for j, feature in enumerate(features)}
+    scores = np.full((len(batches), len(features)), np.nan)
+    for i, batch_stats in enumerate(per_batch_stats):
+        for stats in batch_stats:
+            j = feature_index.get(stats.evaluations[0].feature.name)
+            if j is not None:
+                scores[i, j] = stats.average_score
+
+    return tracking_report(scores, sample)
+
+
+def main():
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default="jess_lee", help="name of a `dataset_loader` module, data is read from dataset/<name>")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--bank", default="output/features_bank.json")
+    parser.add_argument("--check", action="store_true", help="score every batch with the LLM and report the tracking of the feature means")
+    args = parser.parse_args()
+
+    batches = _load_conversations(args.dataset)
+    sample = select_coreset(batches, args.k)
+
+    output = {"sample": sample.model_dump(), "proxies": tracking_report(proxy_metrics.compute_proxies(batches), sample)}
+    print_tracking_report(output["proxies"], "Proxies")
+
+    if args.check:
+        features_bank = [Feature.model_validate(_feature) for _feature in json.load(open(args.bank))]
+        output["llm_scores"] = asyncio.run(_llm_tracking_report(batches, sample, features_bank))
+        print_tracking_report(output["llm_scores"], "LLM scores")
+
+    with open(f"output/coreset_{args.dataset}.json", "w") as f:
+        json.dump(output, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Rank correlation between two sets of scores (benchmark agreement, proxy and distillation reports)."""
+
+import numpy as np
+
+
+def ranks(values: np.ndarray) -> np.ndarray:
+    """Ranks of the values (0-based), ties get the average of their ranks."""
+
+    values = np.asarray(values, dtype=float)
+    order = values.argsort(kind="stable")
+    sorted_values = values[order]
+
+    output = np.empty(len(values))
+    start = 0
+    while start < len(values):
+        end = start + 1
+        while end < len(values) and sorted_values[end] == sorted_values[start]:
+            end += 1
+        output[order[start:end]] = (start + end - 1) / 2
+        start = end
+
+    return output
+
+
+def spearman_correlation(x: np.ndarray, y: np.ndarray) -> float | None:
+    """Spearman rank correlation, None when it is undefined (fewer than 2 values, or a constant input)."""
+
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if len(x) < 2 or np.all(x == x[0]) or np.all(y == y[0]):
+        return None
+    return float(np.corrcoef(ranks(x), ranks(y))[0, 1])
@@ -0,0 +1,427 @@
+"""
+Distilled local predictor of the LLM feature scores.
+
+Every (conversation, feature) score of the score store (see `score_store.py`) is a training example. One regressor per
+feature of the bank is trained on CPU, on cached sentence embeddings of the conversations and on the text-statistics
+proxies of `proxy_metrics.py`:
+
+    1. `train`: for each feature, the ridge penalty is picked by k-fold cross-validation, the cross-validated predictions
+       calibrate the output (linear correction of the ridge shrinkage) and the confidence threshold, then a bootstrap
+       ensemble of ridge regressors is fitted on every example. Per-feature agreement metrics (MAE, Spearman, share of
+       predictions within 1 point of the LLM, coverage) are written to `output/distillation/report.json`
+    2. `predict`: scores the conversations of a dataset in milliseconds. Cells on which the ensemble disagrees more
+       than the calibrated threshold (low confidence) are sent to the LLM scorer, through the score store, so they also
+       become training examples for the next `train`
+
+The embeddings require `sentence-transformers` (`--no-embeddings` trains on the proxies only).
+"""
+
+import os
+import sys
+import json
+import time
+import model
+import asyncio
+import argparse
+import constants
+import importlib
+import score_store
+import numpy as np
+import proxy_metrics
+
+from typing import Dict, List
+from pydantic import BaseModel
+from model import Feature
+from correlation import spearman_correlation
+from constants import MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL
+
+
+DISTILLATION_DIR = "output/distillation"
+
+EMBEDDING_MODEL = "Qwen/Qwen3-Embedding-0.6B"
+EMBEDDING_MAX_CHARACTERS = 4000
+
+RIDGE_ALPHAS = [0.1, 1.0, 10.0, 100.0, 1000.0]
+NUM_FOLDS = 5
+ENSEMBLE_SIZE = 8
+MIN_EXAMPLES_PER_FEATURE = 10
+
+AGREEMENT_TOLERANCE = 1.0 # a prediction "agrees" with the LLM when within this many points (0-10 scale)
+TARGET_AGREEMENT = 0.9 # the confidence threshold keeps the cells whose cross-validated agreement reaches this rate
+
+
+class EmbeddingCache:
+    """Sentence embeddings of the conversations, cached on disk by conversation hash."""
+
+    def __init__(self, path: str = os.path.join(DISTILLATION_DIR, "embeddings.npz"), model_name: str = EMBEDDING_MODEL) -> None:
+        self._path = path
+        self._model_name = model_name
+        self._model = None
+        self._embeddings: Dict[str, np.ndarray] = {}
+
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self._embeddings = {key: data[key] for key in data.files}
+
+    def _load_model(self):
+        if self._model is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as _error:
+                raise ImportError("Embeddings require `sentence-transformers` (pip install sentence-transformers), or use --no-embeddings") from _error
+
+            self._model = SentenceTransformer(self._model_name, model_kwargs={"device_map": "cpu"}, tokenizer_kwargs={"padding_side": "left"})
+        return self._model
+
+    def encode(self, conversations: List[str]) -> np.ndarray:
+        hashes = [score_store.conversation_hash(conversation) for conversation in conversations]
+        missing = {_hash: conversation for _hash, conversation in zip(hashes, conversations) if _hash not in self._embeddings}
+
+        if len(missing) > 0:
+            vectors = self._load_model().encode([conversation[:EMBEDDING_MAX_CHARACTERS] for conversation in missing.values()], prompt_name="query")
+            self._embeddings.update(zip(missing.keys(), np.asarray(vectors, dtype=np.float32)))
+
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            np.savez(self._path, **self._embeddings)
+
+        return np.stack([self._embeddings[_hash] for _hash in hashes])
+
+
+def build_inputs(conversations: List[str], embeddings: EmbeddingCache | None) -> np.ndarray:
+    """(conversations x inputs) matrix: embeddings (if any) followed by the text-statistics proxies."""
+
+    proxies = proxy_metrics.compute_proxies([[conversation] for conversation in conversations])
+    if embeddings is None:
+        return proxies
+    return np.hstack([embeddings.encode(conversations).astype(float), proxies])
+
+
+def _fit_ridge(inputs: np.ndarray, targets: np.ndarray, alpha: float) -> np.ndarray:
+    """Ridge regression on standardized inputs, returns [intercept, weights...]."""
+
+    intercept = targets.mean()
+    num_examples, num_inputs = inputs.shape
+
+    # Dual form when there are fewer examples than inputs (typical with embeddings)
+    if num_examples < num_inputs:
+        weights = inputs.T @ np.linalg.solve(inputs @ inputs.T + alpha * np.eye(num_examples), targets - intercept)
+    else:
+        weights = np.linalg.solve(inputs.T @ inputs + alpha * np.eye(num_inputs), inputs.T @ (targets - intercept))
+
+    return np.concatenate([[intercept], weights])
+
+
+def _fit_ensemble(inputs: np.ndarray, targets: np.ndarray, alpha: float, rng: np.random.Generator) -> np.ndarray:
+    """(ENSEMBLE_SIZE x 1 + inputs) coefficients of ridge regressors fitted on bootstrap resamples."""
+
+    members = []
+    for _ in range(ENSEMBLE_SIZE):
+        sample = rng.integers(0, len(targets), size=len(targets))
+        members.append(_fit_ridge(inputs[sample], targets[sample], alpha))
+    return np.stack(members)
+
+
+def _predict_ensemble(coefficients: np.ndarray, inputs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Mean and spread (std) of the ensemble predictions."""
+
+    predictions = coefficients[:, :1].T + inputs @ coefficients[:, 1:].T # (examples x members)
+    return predictions.mean(axis=1), predictions.std(axis=1)
+
+
+def _folds(num_examples: int, rng: np.random.Generator) -> List[np.ndarray]:
+    return np.array_split(rng.permutation(num_examples), min(NUM_FOLDS, num_examples))
+
+
+class DistilledFeature(BaseModel):
+    name: str
+    feature_hash: str
+    num_examples: int
+    alpha: float
+    calibration_intercept: float
+    calibration_slope: float
+    max_std: float # cells whose ensemble spread is above this are sent to the LLM
+    metrics: Dict[str, float | None]
+
+
+class DistilledPredictor:
+    """One bootstrap ensemble of ridge regressors per feature, on standardized inputs."""
+
+    def __init__(self, features: List[DistilledFeature], coefficients: np.ndarray, input_mean: np.ndarray, input_std: np.ndarray, use_embeddings: bool) -> None:
+        self.features = features
+        self.coefficients = coefficients # (features x members x 1 + inputs)
+        self.input_mean = input_mean
+        self.input_std = input_std
+        self.use_embeddings = use_embeddings
+
+    def standardize(self, inputs: np.ndarray) -> np.ndarray:
+        # NOTE: undefined proxies (NaN) are imputed with the training mean, i.e. 0 once standardized
+        return np.nan_to_num((inputs - self.input_mean) / self.input_std, nan=0.0)
+
+    def predict(self, inputs: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(conversations x features) calibrated scores, ensemble spreads, and confidence (spread under the feature threshold)."""
+
+        standardized = self.standardize(inputs)
+        scores, spreads = np.empty((len(inputs), len(self.features))), np.empty((len(inputs), len(self.features)))
+
+        for index, feature in enumerate(self.features):
+            mean, spread = _predict_ensemble(self.coefficients[index], standardized)
+            scores[:, index] = np.clip(feature.calibration_intercept + feature.calibration_slope * mean, 0.0, 10.0)
+            spreads[:, index] = spread
+
+        max_stds = np.array([feature.max_std for feature in self.features])
+        return scores, spreads, spreads <= max_stds[None, :]
+
+    def save(self, directory: str = DISTILLATION_DIR) -> None:
+        os.makedirs(directory, exist_ok=True)
+        np.savez(os.path.join(directory, "predictor.npz"), coefficients=self.coefficients, input_mean=self.input_mean, input_std=self.input_std)
+        with open(os.path.join(directory, "predictor.json"), "w") as f:
+            json.dump({"use_embeddings": self.use_embeddings, "features": [feature.model_dump() for feature in self.features]}, f, indent=4)
+
+    @classmethod
+    def load(cls, directory: str = DISTILLATION_DIR) -> "DistilledPredictor":
+        metadata = json.load(open(os.path.join(directory, "predictor.json")))
+        with np.load(os.path.join(directory, "predictor.npz")) as data:
+            return cls(
+                [DistilledFeature.model_validate(feature) for feature in metadata["features"]],
+                data["coefficients"],
+                data["input_mean"],
+                data["input_std"],
+                metadata["use_embeddings"],
+            )
+
+
+def training_examples(store: score_store.ScoreStore, features: List[Feature], models: List[str], profile: str) -> tuple[List[str], Dict[str, Dict[str, float]]]:
+    """Conversation texts, and feature hash -> conversation hash -> mean stored LLM score."""
+
+    feature_hashes = {score_store.feature_hash(feature) for feature in features}
+    scores: Dict[str, Dict[str, List[float]]] = {}
+
+    scoring_hash = score_store.scoring_config_hash(profile)
+    for key in store.keys():
+        if key.feature_hash in feature_hashes and key.model in models and key.profile == profile and key.scoring_hash == scoring_hash:
+            scores.setdefault(key.feature_hash, {}).setdefault(key.conversation_hash, []).extend(evaluation.score for evaluation in store.evaluations(key))
+
+    texts = store.conversations()
+    conversation_hashes = sorted({_hash for feature_scores in scores.values() for _hash in feature_scores if _hash in texts})
+
+    return [texts[_hash] for _hash in conversation_hashes], {
+        _feature_hash: {_hash: float(np.mean(values)) for _hash, values in feature_scores.items() if _hash in texts}
+        for _feature_hash, feature_scores in scores.items()
+    }
+
+
+def _agreement_metrics(predictions: np.ndarray, targets: np.ndarray, confident: np.ndarray) -> Dict[str, float | None]:
+    agrees = np.abs(predictions - targets) <= AGREEMENT_TOLERANCE
+    return {
+        "mae": float(np.abs(predictions - targets).mean()),
+        "spearman": spearman_correlation(predictions, targets),
+        "agreement": float(agrees.mean()),
+        "coverage": float(confident.mean()), # share of the cells the predictor answers alone
+        "agreement_on_covered": float(agrees[confident].mean()) if confident.any() else None,
+    }
+
+
+def _calibrate_max_std(spreads: np.ndarray, agrees: np.ndarray) -> float:
+    """Largest spread threshold under which the cross-validated agreement stays above `TARGET_AGREEMENT`."""
+
+    order = np.argsort(spreads, kind="stable")
+    running_agreement = np.cumsum(agrees[order]) / np.arange(1, len(order) + 1)
+    valid = np.nonzero(running_agreement >= TARGET_AGREEMENT)[0]
+    return float(spreads[order][valid[-1]]) if len(valid) > 0 else -1.0 # -1: never confident
+
+
+def train_predictor(conversations: List[str], targets_by_feature: Dict[str, Dict[str, float]], features: List[Feature], embeddings: EmbeddingCache | None, seed: int = 0) -> DistilledPredictor:
+    rng = np.random.default_rng(seed)
+
+    inputs = build_inputs(conversations, embeddings)
+    input_mean = np.nanmean(inputs, axis=0)
+    input_std = np.nanstd(inputs, axis=0)
+    input_std[~(input_std > 0)] = 1.0
+    standardized = np.nan_to_num((inputs - input_mean) / input_std, nan=0.0)
+    row_by_hash = {score_store.conversation_hash(conversation): row for row, conversation in enumerate(conversations)}
+
+    distilled_features, coefficients = [], []
+    for feature in features:
+        _feature_hash = score_store.feature_hash(feature)
+        feature_targets = targets_by_feature.get(_feature_hash, {})
+        if len(feature_targets) < MIN_EXAMPLES_PER_FEATURE:
+            print(f"Skipping feature '{feature.name}': {len(feature_targets)} scored conversation(s) (need at least {MIN_EXAMPLES_PER_FEATURE})")
+            continue
+
+        rows = np.array([row_by_hash[_hash] for _hash in feature_targets])
+        x, y = standardized[rows], np.array(list(feature_targets.values()))
+        folds = _folds(len(y), rng)
+
+        # Penalty with the lowest cross-validated error
+        best_alpha, best_mae = RIDGE_ALPHAS[0], np.inf
+        for alpha in RIDGE_ALPHAS:
+            predictions = np.empty(len(y))
+            for fold in folds:
+                train = np.setdiff1d(np.arange(len(y)), fold)
+                _coefficients = _fit_ridge(x[train], y[train], alpha)
+                predictions[fold] = _coefficients[0] + x[fold] @ _coefficients[1:]
+            mae = np.abs(predictions - y).mean()
+            if mae < best_mae:
+                best_alpha, best_mae = alpha, mae
+
+        # Cross-validated ensemble predictions, to calibrate the output and the confidence threshold
+        cv_means, cv_spreads = np.empty(len(y)), np.empty(len(y))
+        for fold in folds:
+            train = np.setdiff1d(np.arange(len(y)), fold)
+            cv_means[fold], cv_spreads[fold] = _predict_ensemble(_fit_ensemble(x[train], y[train], best_alpha, rng), x[fold])
+
+        slope, intercept = np.polyfit(cv_means, y, 1) if np.std(cv_means) > 0 else (1.0, 0.0)
+        cv_predictions = np.clip(intercept + slope * cv_means, 0.0, 10.0)
+        max_std = _calibrate_max_std(cv_spreads, np.abs(cv_predictions - y) <= AGREEMENT_TOLERANCE)
+
+        distilled_features.append(DistilledFeature(
+            name=feature.name,
+            feature_hash=_feature_hash,
+            num_examples=len(y),
+            alpha=best_alpha,
+            calibration_intercept=float(intercept),
+            calibration_slope=float(slope),
+            max_std=max_std,
+            metrics=_agreement_metrics(cv_predictions, y, cv_spreads <= max_std),
+        ))
+        coefficients.append(_fit_ensemble(x, y, best_alpha, rng))
+
+    return DistilledPredictor(
+        distilled_features,
+        np.stack(coefficients) if len(coefficients) > 0 else np.empty((0, ENSEMBLE_SIZE, inputs.shape[1] + 1)),
+        input_mean,
+        input_std,
+        use_embeddings=embeddings is not None,
+    )
+
+
+def print_agreement_report(predictor: DistilledPredictor) -> None:
+    def _format(value: float | None) -> str:
+        return f"{value:>8.2f}" if value is not None else f"{'N/A':>8}"
+
+    print(f"{'feature':<40} {'n':>5} {'mae':>8} {'spearman':>8} {'agree':>8} {'coverage':>8} {'agree@cov':>9}")
+    for feature in predictor.features:
+        metrics = feature.metrics
+        print(
+            f"{feature.name[:40]:<40} {feature.num_examples:>5} {_format(metrics['mae'])} {_format(metrics['spearman'])} "
+            f"{_format(metrics['agreement'])} {_format(metrics['coverage'])} {_format(metrics['agreement_on_covered']):>9}"
+        )
+
+
+class DistilledScore(BaseModel):
+    feature_name: str
+    score: float
+    spread: float | None # ensemble spread of the predictor, None for LLM scores
+    source: str # "distilled" or "llm"
+
+
+async def score_with_fallback(
+    conversations: List[List[str]],
+    features: List[Feature],
+    predictor: DistilledPredictor,
+    embeddings: EmbeddingCache | None,
+    models: List[str],
+    num_evaluations_per_model: int,
+    store: score_store.ScoreStore | None = None,
+) -> List[List[DistilledScore]]:
+    """Distilled scores of each conversation, the low-confidence cells (and features without a predictor) scored by the LLM."""
+
+    store = store or score_store.ScoreStore()
+    joined_conversations = ["\n".join([segment for segment in batch]) for batch in conversations]
+
+    started_at = time.perf_counter()
+    scores, spreads, confident = predictor.predict(build_inputs(joined_conversations, embeddings))
+    print(f"Distilled predictions: {1000 * (time.perf_counter() - started_at) / max(len(conversations), 1):.1f} ms per conversation")
+
+    column_by_hash = {feature.feature_hash: column for column, feature in enumerate(predictor.features)}
+    outputs: List[List[DistilledScore]] = []
+    llm_features_per_conversation: List[List[Feature]] = []
+
+    for row in range(len(conversations)):
+        conversation_scores, llm_features = [], []
+        for feature in features:
+            column = column_by_hash.get(score_store.feature_hash(feature))
+            if column is not None and confident[row, column]:
+                conversation_scores.append(DistilledScore(feature_name=feature.name, score=float(scores[row, column]), spread=float(spreads[row, column]), source="distilled"))
+            else:
+                llm_features.append(feature)
+        outputs.append(conversation_scores)
+        llm_features_per_conversation.append(llm_features)
+
+    # The low-confidence cells of all the conversations are scored in a single pass of the work queue
+    profile = constants.SCORING_PROFILE
+    jobs = []
+    for row, llm_features in enumerate(llm_features_per_conversation):
+        if len(llm_features) > 0:
+            store.add_conversation(joined_conversations[row])
+            row_jobs = score_store.plan_missing_cells(store, [joined_conversations[row]], llm_features, models, num_evaluations_per_model, profile)
+            jobs.extend(job.model_copy(update={"conversation_index": row}) for job in row_jobs)
+    await score_store.run_scoring_jobs(store, joined_conversations, jobs, profile)
+
+    num_llm_cells = 0
+    for row, llm_features in enumerate(llm_features_per_conversation):
+        num_llm_cells += len(llm_features)
+        _conversation_hash = score_store.conversation_hash(joined_conversations[row])
+        evaluations = {
+            feature.name: [
+                evaluation
+                for model_name in models
+                for evaluation in store.evaluations(score_store.cell_key(score_store.feature_hash(feature), _conversation_hash, model_name, profile))[:num_evaluations_per_model]
+            ]
+            for feature in llm_features
+        }
+        stats = model.aggregate_features_evaluations(evaluations)
+        outputs[row].extend(DistilledScore(feature_name=_stats.evaluations[0].feature.name, score=_stats.average_score, spread=None, source="llm") for _stats in stats)
+
+    num_cells = len(conversations) * len(features)
+    print(f"{num_cells - num_llm_cells}/{num_cells} cells answered by the distilled predictor, {num_llm_cells} sent to the LLM")
+    return outputs
+
+
+def _load_conversations(dataset: str) -> List[List[str]]:
+    load_dataset = importlib.import_module(f"dataset_loader.{dataset}").load_dataset
+    train_set, test_set, validation_set = load_dataset(f"dataset/{dataset}", max_words_per_batch=2000)
+    return validation_set + train_set + test_set
+
+
+def main():
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bank", default="output/features_bank.json")
+    parser.add_argument("--directory", default=DISTILLATION_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train = subparsers.add_parser("train")
+    train.add_argument("--no-embeddings", action="store_true", help="train on the text-statistics proxies only")
+
+    predict = subparsers.add_parser("predict")
+    predict.add_argument("--dataset", default="jess_lee", help="name of a `dataset_loader` module, data is read from dataset/<name>")
+
+    args = parser.parse_args()
+    features_bank = [Feature.model_validate(_feature) for _feature in json.load(open(args.bank))]
+    store = score_store.ScoreStore()
+
+    if args.command == "train":
+        conversations, targets_by_feature = training_examples(store, features_bank, MODELS_TO_ANALYZE, constants.SCORING_PROFILE)
+        print(f"{len(conversations)} scored conversation(s) in the score store")
+
+        embeddings = None if args.no_embeddings else EmbeddingCache(os.path.join(args.directory, "embeddings.npz"))
+        predictor = train_predictor(conversations, targets_by_feature, features_bank, embeddings)
+        predictor.save(args.directory)
+        print_agreement_report(predictor)
+
+        with open(os.path.join(args.directory, "report.json"), "w") as f:
+            json.dump({feature.name: feature.model_dump() for feature in predictor.features}, f, indent=4)
+
+    elif args.command == "predict":
+        predictor = DistilledPredictor.load(args.directory)
+        embeddings = EmbeddingCache(os.path.join(args.directory, "embeddings.npz")) if predictor.use_embeddings else None
+
+        outputs = asyncio.run(score_with_fallback(_load_conversations(args.dataset), features_bank, predictor, embeddings, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL, store))
+        with open(os.path.join(args.directory, f"predictions_{args.dataset}.json"), "w") as f:
+            json.dump([[score.model_dump() for score in conversation_scores] for conversation_scores in outputs], f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Distributed scoring through a SQLite work queue, without any broker: processes (on one machine, or on several
+machines sharing a filesystem) coordinate through a single SQLite database file.
+
+    1. `enqueue`: the coordinator plans the cells missing from the score store (see `score_store.py`) and enqueues
+       one job per scoring call, along with the conversation texts (workers do not need the dataset)
+    2. `worker`: any number of worker processes lease jobs, score them and write the results back. A job whose lease
+       expires (crashed or killed worker) is leased again, a failed job is retried up to `--max-attempts` times
+    3. `collect`: the coordinator moves the finished results into the score store and prints the aggregated stats
+
+`status` prints the number of jobs per state.
+
+NOTE: SQLite file locking is reliable on local disks, and on network filesystems only if their locking is
+(e.g. NFSv4 with locking enabled). Transactions are short, the database is never held during a scoring call.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import model
+import socket
+import asyncio
+import sqlite3
+import argparse
+import importlib
+import score_store
+import multiprocessing
+
+from typing import Dict, List
+from model import Feature, FeatureEvaluation, StatsFeatureEvaluation, SCORING_PROFILES
+from constants import MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL, SCORING_PROFILE, SEMAPHORE_MAX_CONCURRENCY
+
+
+DEFAULT_DATABASE_PATH = "output/work_queue.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    conversation_hash TEXT PRIMARY KEY,
+    conversation TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_hash TEXT NOT NULL REFERENCES conversations (conversation_hash),
+    feature TEXT NOT NULL,
+    model TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending', -- pending, leased, done, failed, collected
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    result TEXT,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires_at);
+"""
+
+
+def connect(database_path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(database_path) or ".", exist_ok=True)
+    # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE (write lock) where needed
+    connection = sqlite3.connect(database_path, timeout=60, isolation_level=None)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def enqueue_missing_cells(connection: sqlite3.Connection, conversations: List[List[str]], features: List[Feature], models: List[str], num_evaluations_per_model: int, store: score_store.ScoreStore) -> int:
+    """Enqueue one job per scoring call missing from `store` (and not already in the queue). Returns the number of new jobs."""
+
+    joined_conversations = ["\n".join([segment for segment in batch]) for batch in conversations]
+    jobs = score_store.plan_missing_cells(store, joined_conversations, features, models, num_evaluations_per_model, SCORING_PROFILE)
+
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        for conversation in joined_conversations:
+            connection.execute(
+                "INSERT OR IGNORE INTO conversations (conversation_hash, conversation) VALUES (?, ?)",
+                (score_store.conversation_hash(conversation), conversation),
+            )
+
+        num_enqueued = 0
+        for job in jobs:
+            conversation_hash = score_store.conversation_hash(joined_conversations[job.conversation_index])
+            feature = job.feature.model_dump_json()
+
+            # Jobs already queued (not collected yet) count towards the missing evaluations
+            (num_queued,) = connection.execute(
+                "SELECT COUNT(*) FROM jobs WHERE conversation_hash = ? AND feature = ? AND model = ? AND profile = ? AND status IN ('pending', 'leased', 'done')",
+                (conversation_hash, feature, job.model, SCORING_PROFILE),
+            ).fetchone()
+
+            for _ in range(job.num_missing - num_queued):
+                connection.execute(
+                    "INSERT INTO jobs (conversation_hash, feature, model, profile) VALUES (?, ?, ?, ?)",
+                    (conversation_hash, feature, job.model, SCORING_PROFILE),
+                )
+                num_enqueued += 1
+
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+    return num_enqueued
+
+
+def lease_jobs(connection: sqlite3.Connection, worker_id: str, max_jobs: int, lease_seconds: float, max_attempts: int) -> List[Dict]:
+    """Lease up to `max_jobs` pending jobs (or jobs whose lease expired) to `worker_id`."""
+
+    now = time.time()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        # Expired leases that already used all their attempts are given up
+        connection.execute(
+            "UPDATE jobs SET status = 'failed', last_error = COALESCE(last_error, 'lease expired') WHERE status = 'leased' AND lease_expires_at < ? AND attempts >= ?",
+            (now, max_attempts),
+        )
+
+        rows = connection.execute(
+            """
+            SELECT jobs.id, jobs.feature, jobs.model, jobs.profile, conversations.conversation
+            FROM jobs JOIN conversations USING (conversation_hash)
+            WHERE jobs.status = 'pending' OR (jobs.status = 'leased' AND jobs.lease_expires_at < ?)
+            ORDER BY jobs.id
+            LIMIT ?
+            """,
+            (now, max_jobs),
+        ).fetchall()
+
+        connection.executemany(
+            "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1 WHERE id = ?",
+            [(worker_id, now + lease_seconds, row[0]) for row in rows],
+        )
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+    return [{"id": row[0], "feature": row[1], "model": row[2], "profile": row[3], "conversation": row[4]} for row in rows]
+
+
+def complete_job(connection: sqlite3.Connection, job_id: int, worker_id: str, evaluation: FeatureEvaluation | None, error: Exception | None, max_attempts: int) -> None:
+    # The `lease_owner` check drops late results of a worker whose lease expired and was given to another worker
+    if error is None:
+        connection.execute(
+            "UPDATE jobs SET status = 'done', result = ?, lease_expires_at = NULL WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+            (evaluation.model_dump_json(), job_id, worker_id),
+        )
+    else:
+        connection.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, last_error = ?, lease_expires_at = NULL "
+            "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+            (max_attempts, f"{type(error).__name__}: {error}", job_id, worker_id),
+        )
+
+
+async def run_worker(database_path: str, concurrency: int = 50, lease_seconds: float = 600.0, max_attempts: int = 3, poll_interval: float = 5.0, exit_when_empty: bool = True) -> int:
+    """Lease and score jobs until the queue is empty (or forever with `exit_when_empty=False`). Returns the number of jobs done."""
+
+    connection = connect(database_path)
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    num_done = 0
+
+    async def _run_job(job: Dict) -> None:
+        nonlocal num_done
+        try:
+            evaluation = await model.evaluate_single_feature_score(job["conversation"], Feature.model_validate_json(job["feature"]), job["model"], SCORING_PROFILES[job["profile"]])
+        except Exception as _error:
+            complete_job(connection, job["id"], worker_id, None, _error, max_attempts)
+            print(f"[{worker_id}] Job {job['id']} failed: {_error}")
+        else:
+            complete_job(connection, job["id"], worker_id, evaluation, None, max_attempts)
+            num_done += 1
+
+    # Keeps `concurrency` jobs in flight, leasing new ones as others complete
+    in_flight: set[asyncio.Task] = set()
+    while True:
+        if len(in_flight) < concurrency:
+            for job in lease_jobs(connection, worker_id, concurrency - len(in_flight), lease_seconds, max_attempts):
+                in_flight.add(asyncio.create_task(_run_job(job)))
+
+        if len(in_flight) == 0:
+            (num_remaining,) = connection.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'leased')").fetchone()
+            if num_remaining == 0 and exit_when_empty:
+                break
+            await asyncio.sleep(poll_interval) # other workers hold the remaining leases, they may expire
+            continue
+
+        _, in_flight = await asyncio.wait(in_flight, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED)
+
+    connection.close()
+    print(f"[{worker_id}] Done, {num_done} job(s) scored")
+    return num_done
+
+
+def _run_worker_process(database_path: str, concurrency: int, lease_seconds: float, max_attempts: int) -> None:
+    asyncio.run(run_worker(database_path, concurrency=concurrency, lease_seconds=lease_seconds, max_attempts=max_attempts))
+
+
+def collect_results(connection: sqlite3.Connection, store: score_store.ScoreStore) -> int:
+    """
+    Move the results of the finished jobs into the score store. Returns the number of results collected.
+
+    The store is a file, outside of the database transaction: a coordinator killed between the two steps leaves the
+    jobs 'done', and they are collected again by the next run. Each result is added with its job as `record_id`
+    (the worker lease is unique), so the store skips the ones it already has instead of counting them twice.
+    """
+
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        rows = connection.execute("SELECT id, conversation_hash, feature, model, profile, result, lease_owner FROM jobs WHERE status = 'done'").fetchall()
+
+        for job_id, conversation_hash, feature, model_name, profile, result, lease_owner in rows:
+            key = score_store.cell_key(score_store.feature_hash(Feature.model_validate_json(feature)), conversation_hash, model_name, profile)
+            store.add(key, FeatureEvaluation.model_validate_json(result), record_id=f"{lease_owner}/{job_id}")
+
+        connection.executemany("UPDATE jobs SET status = 'collected', result = NULL WHERE id = ?", [(row[0],) for row in rows])
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+    return len(rows)
+
+
+def queue_status(connection: sqlite3.Connection) -> Dict[str, int]:
+    return dict(connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+def _load_conversations(dataset: str) -> List[List[str]]:
+    load_dataset = importlib.import_module(f"dataset_loader.{dataset}").load_dataset
+    train_set, test_set, validation_set = load_dataset(f"dataset/{dataset}", max_words_per_batch=2000)
+    return validation_set + train_set + test_set
+
+
+def _print_stats(stats: List[StatsFeatureEvaluation]) -> None:
+    for _stats in stats:
+        print(f"{_stats.evaluations[0].feature.name}: {_stats.average_score:.2f} (std {_stats.standard_deviation:.2f}, n={_stats.num_evaluations})")
+
+
+def main():
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=DEFAULT_DATABASE_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = subparsers.add_parser("enqueue")
+    enqueue.add_argument("--dataset", default="jess_lee", help="name of a `dataset_loader` module, data is read from dataset/<name>")
+    enqueue.add_argument("--bank", default="output/features_bank.json")
+
+    worker = subparsers.add_parser("worker")
+    worker.add_argument("--processes", type=int, default=1, help="worker processes to start on this machine")
+    worker.add_argument("--concurrency", type=int, default=SEMAPHORE_MAX_CONCURRENCY, help="jobs in flight per process")
+    worker.add_argument("--lease-seconds", type=float, default=600.0)
+    worker.add_argument("--max-attempts", type=int, default=3)
+
+    collect = subparsers.add_parser("collect")
+    collect.add_argument("--dataset", default="jess_lee")
+    collect.add_argument("--bank", default="output/features_bank.json")
+
+    subparsers.add_parser("status")
+
+    args = parser.parse_args()
+    connection = connect(args.database)
+
+    if args.command == "enqueue":
+        features_bank = [Feature.model_validate(_feature) for _feature in json.load(open(args.bank))]
+        num_enqueued = enqueue_missing_cells(connection, _load_conversations(args.dataset), features_bank, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL, score_store.ScoreStore())
+        print(f"{num_enqueued} job(s) enqueued")
+
+    elif args.command == "worker":
+        processes = [
+            multiprocessing.Process(target=_run_worker_process, args=(args.database, args.concurrency, args.lease_seconds, args.max_attempts))
+            for _ in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    elif args.command == "collect":
+        store = score_store.ScoreStore()
+        print(f"{collect_results(connection, store)} result(s) collected, queue: {queue_status(connection)}")
+
+        status = queue_status(connection)
+        if status.get("pending", 0) + status.get("leased", 0) > 0:
+            print("Jobs are still running, collect again once the workers are done to aggregate the scores")
+            return
+
+        # Everything is in the store now, so this only aggregates (and scores locally the cells of failed jobs, if any)
+        features_bank = [Feature.model_validate(_feature) for _feature in json.load(open(args.bank))]
+        stats = asyncio.run(score_store.evaluate_features_scores_across_conversations_incremental(
+            _load_conversations(args.dataset), features_bank, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL, store
+        ))
+        _print_stats(stats)
+
+    elif args.command == "status":
+        print(queue_status(connection))
+
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
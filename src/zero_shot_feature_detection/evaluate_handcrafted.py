@@ -1,6 +1,7 @@
 import csv
 import model
 import asyncio
+import coreset
 
 from pydantic import BaseModel
 from constants import MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL
@@ -314,6 +315,8 @@ pers_16 = [
 async def main():
 
     MAX_SAMPLES_PER_DATASET = 5 # Arbitrary number, just to limit the number of samples to evaluate (otherwise it costs a LOT)
+    # NOTE: the samples are a coreset of the dataset (k-medoids on stylistic fingerprints, see `coreset.py`), not its first batches,
+    # and each one is weighted by the share of the dataset it stands for in the statistics
 
     # Two different sets of features to evaluate, pick one or the other
     # features_bank = feature_set_1
@@ -328,25 +331,28 @@ async def main():
 
     validation_set.extend(train_set)
     validation_set.extend(test_set)
-    validation_set = validation_set[:min(MAX_SAMPLES_PER_DATASET, len(validation_set))]
-    jess_lee_stats = await model.evaluate_features_scores_across_conversations(validation_set, features_bank, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+    validation_set, weights = coreset.select_representative_batches(validation_set, MAX_SAMPLES_PER_DATASET)
+    per_conversation_stats = await model.evaluate_features_scores_per_conversation(validation_set, features_bank, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL)
+    jess_lee_stats = coreset.weighted_conversations_stats(per_conversation_stats, weights, features_bank)
 
     from dataset_loader.dara import load_dataset
     train_set, test_set, validation_set = load_dataset("dataset/dara/", max_words_per_batch=2000)
 
     validation_set.extend(train_set)
     validation_set.extend(test_set)
-    validation_set = validation_set[:min(MAX_SAMPLES_PER_DATASET, len(validation_set))]
-    dara_stats = await model.evaluate_features_scores_across_conversations(validation_set, features_bank, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+    validation_set, weights = coreset.select_representative_batches(validation_set, MAX_SAMPLES_PER_DATASET)
+    per_conversation_stats = await model.evaluate_features_scores_per_conversation(validation_set, features_bank, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL)
+    dara_stats = coreset.weighted_conversations_stats(per_conversation_stats, weights, features_bank)
 
     from dataset_loader.thytu import load_dataset
     train_set, test_set, validation_set = load_dataset("dataset/thytu/", max_words_per_batch=2000)
 
     validation_set.extend(train_set)
     validation_set.extend(test_set)
-    validation_set = validation_set[:min(MAX_SAMPLES_PER_DATASET, len(validation_set))]
+    validation_set, weights = coreset.select_representative_batches(validation_set, MAX_SAMPLES_PER_DATASET)
 
-    thytu_stats = await model.evaluate_features_scores_across_conversations(validation_set, features_bank, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+    per_conversation_stats = await model.evaluate_features_scores_per_conversation(validation_set, features_bank, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL)
+    thytu_stats = coreset.weighted_conversations_stats(per_conversation_stats, weights, features_bank)
 
 
     from dataset_loader.huberman_lab import load_dataset
@@ -354,9 +360,10 @@ async def main():
 
     validation_set.extend(train_set)
     validation_set.extend(test_set)
-    validation_set = validation_set[:min(MAX_SAMPLES_PER_DATASET, len(validation_set))]
+    validation_set, weights = coreset.select_representative_batches(validation_set, MAX_SAMPLES_PER_DATASET)
 
-    huberman_lab_stats = await model.evaluate_features_scores_across_conversations(validation_set, features_bank, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+    per_conversation_stats = await model.evaluate_features_scores_per_conversation(validation_set, features_bank, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL)
+    huberman_lab_stats = coreset.weighted_conversations_stats(per_conversation_stats, weights, features_bank)
 
 
     from dataset_loader.crucible_moments import load_dataset
@@ -364,9 +371,10 @@ async def main():
 
     validation_set.extend(train_set)
     validation_set.extend(test_set)
-    validation_set = validation_set[:min(MAX_SAMPLES_PER_DATASET, len(validation_set))]
+    validation_set, weights = coreset.select_representative_batches(validation_set, MAX_SAMPLES_PER_DATASET)
 
-    crucible_moments_stats = await model.evaluate_features_scores_across_conversations(validation_set, features_bank, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+    per_conversation_stats = await model.evaluate_features_scores_per_conversation(validation_set, features_bank, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL)
+    crucible_moments_stats = coreset.weighted_conversations_stats(per_conversation_stats, weights, features_bank)
 
     # group metrics per feature across datasets
     def _stats_to_metrics_map(stats: list[model.StatsFeatureEvaluation]) -> dict[str, dict]:
@@ -446,4 +454,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(model.run_with_loop_metrics(main()))
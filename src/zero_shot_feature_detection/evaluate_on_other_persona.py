@@ -1,9 +1,9 @@
 import json
 import model
 import asyncio
+import scoring_modes
 
 from model import Feature, StatsFeatureEvaluation
-from constants import MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL
 
 
 def _print_stats_features_evaluation(stats: list[StatsFeatureEvaluation]) -> None:
@@ -42,9 +42,9 @@ async def main():
     # validation_set = validation_set[:int(len(validation_set) * keep_ratio)]
     # ####################################################################################################################################
 
-    validation_stats = await model.evaluate_features_scores_across_conversations(validation_set, features_bank, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+    validation_stats = await scoring_modes.evaluate_features_scores_across_conversations(validation_set, features_bank)
     _print_stats_features_evaluation(validation_stats)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(model.run_with_loop_metrics(main()))
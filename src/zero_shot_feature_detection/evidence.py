@@ -0,0 +1,93 @@
+"""
+Local verification of the evidence spans quoted in the scoring explanations (see `RUBRIC_EVALUATION_SYSTEM_PROMPT`).
+
+Each conversation gets an index, built once and cached: its normalized text (lower-case words separated by single
+spaces) and the set of its word trigrams. A quoted span is verified when it appears verbatim in the normalized text
+(substring search), or when most of its trigrams do (light paraphrase, elided words). Checking an explanation takes
+microseconds, no LLM call.
+
+An evaluation whose quotes are mostly not found in the conversation is considered fabricated: it is flagged, or
+dropped (and re-sampled) depending on `constants.EVIDENCE_VERIFICATION`.
+"""
+
+import re
+import constants
+import functools
+
+from typing import List
+from pydantic import BaseModel
+
+
+MIN_SPAN_WORDS = 3 # shorter quotes ("yes", "I think") are too common to prove anything
+NGRAM_SIZE = 3
+MIN_NGRAM_COVERAGE = 0.8 # share of the span trigrams found in the conversation for a fuzzy match
+UNVERIFIED_PREFIX = "[UNVERIFIED EVIDENCE] "
+
+_WORD_REGEX = re.compile(r"\w+(?:'\w+)*")
+# Double quotes (straight or curly), and single quotes around several words (not apostrophes)
+_QUOTE_REGEX = re.compile(r"\"([^\"]+)\"|“([^”]+)”|(?<!\w)['‘]([^'‘’]+?\s[^'‘’]+?)['’](?!\w)")
+_ELLIPSIS_REGEX = re.compile(r"\.\.\.|…|\[\.\.\.\]")
+
+
+class FabricatedEvidenceError(ValueError):
+    pass
+
+
+class EvidenceCheck(BaseModel):
+    num_spans: int
+    num_verified: int
+    unverified_spans: List[str]
+
+    @property
+    def verified(self) -> bool:
+        return self.num_spans == 0 or self.num_verified / self.num_spans >= constants.EVIDENCE_MIN_VERIFIED_FRACTION
+
+
+def _normalize(text: str) -> List[str]:
+    return _WORD_REGEX.findall(text.lower().replace("’", "'"))
+
+
+def _ngrams(words: List[str]) -> set[tuple[str, ...]]:
+    return {tuple(words[i:i + NGRAM_SIZE]) for i in range(len(words) - NGRAM_SIZE + 1)}
+
+
+class EvidenceIndex:
+    def __init__(self, conversation: str) -> None:
+        words = _normalize(conversation)
+        self._text = f" {' '.join(words)} "
+        self._ngrams = _ngrams(words)
+
+    def contains(self, span: str) -> bool:
+        # An elided quote ("I started ... and then failed") is verified fragment by fragment
+        fragments = [_normalize(fragment) for fragment in _ELLIPSIS_REGEX.split(span)]
+        return all(self._contains_words(words) for words in fragments if len(words) > 0)
+
+    def _contains_words(self, words: List[str]) -> bool:
+        if f" {' '.join(words)} " in self._text:
+            return True
+        if len(words) < NGRAM_SIZE:
+            return False # too short for a fuzzy match, and not found verbatim
+
+        span_ngrams = _ngrams(words)
+        return len(span_ngrams & self._ngrams) / len(span_ngrams) >= MIN_NGRAM_COVERAGE
+
+
+@functools.lru_cache(maxsize=256)
+def get_index(conversation: str) -> EvidenceIndex:
+    # The same conversation is scored on every feature of the bank, the index is built once
+    return EvidenceIndex(conversation)
+
+
+def extract_spans(explanation: str) -> List[str]:
+    spans = [next(group for group in match.groups() if group is not None) for match in _QUOTE_REGEX.finditer(explanation)]
+    return [span.strip() for span in spans if len(_normalize(span)) >= MIN_SPAN_WORDS]
+
+
+def check_explanation(explanation: str, conversation: str) -> EvidenceCheck:
+    spans = extract_spans(explanation)
+    if len(spans) == 0:
+        return EvidenceCheck(num_spans=0, num_verified=0, unverified_spans=[])
+
+    index = get_index(conversation)
+    unverified = [span for span in spans if not index.contains(span)]
+    return EvidenceCheck(num_spans=len(spans), num_verified=len(spans) - len(unverified), unverified_spans=unverified)
@@ -0,0 +1,161 @@
+import json
+import time
+import random
+import asyncio
+import numpy as np
+
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, TypeVar
+
+T = TypeVar("T")
+
+
+class RequestHedger:
+    """
+    Hedged requests: when a call is still running after the rolling `quantile` latency of its key (e.g. p95 of the
+    model), a duplicate is fired and the first response wins, the other one is cancelled.
+
+    Duplicates are capped to `max_extra_load` of the primary calls (0.1 = at most 10% more requests), and no call
+    is hedged before `min_samples` latencies have been observed for its key.
+    """
+
+    def __init__(self, quantile: float = 0.95, max_extra_load: float = 0.1, min_samples: int = 20, window: int = 500) -> None:
+        self.quantile = quantile
+        self.max_extra_load = max_extra_load
+        self.min_samples = min_samples
+
+        self._latencies: Dict[str, Deque[float]] = {} # rolling window of completed (or cancelled, lower bound) attempts, per key
+        self.num_calls = 0
+        self.num_hedges = 0
+        self.num_hedge_wins = 0
+
+        # For the report: latency of the first attempt ("raw", what it would have been without hedging) and of the call
+        # NOTE: when the first attempt loses, it is cancelled, its raw latency is then a lower bound (censored)
+        self.raw_latencies: List[float] = []
+        self.effective_latencies: List[float] = []
+        self._window = window
+
+    def hedge_delay(self, key: str) -> float | None:
+        latencies = self._latencies.get(key)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        return float(np.quantile(latencies, self.quantile))
+
+    def _record_attempt(self, key: str, latency: float) -> None:
+        self._latencies.setdefault(key, deque(maxlen=self._window)).append(latency)
+
+    def _has_budget(self) -> bool:
+        return self.num_hedges < self.max_extra_load * self.num_calls
+
+    async def call(self, key: str, make_call: Callable[[], Awaitable[T]]) -> T:
+        """Await `make_call()`, hedged with a second `make_call()` if it is too slow (see class docstring)."""
+
+        self.num_calls += 1
+        started_at = time.monotonic()
+
+        async def _attempt() -> tuple[T, float]:
+            attempt_started_at = time.monotonic()
+            try:
+                result = await make_call()
+            except asyncio.CancelledError:
+                # NOTE: a cancelled loser was at least this slow; without it the window only keeps the winners and the
+                # quantile drifts down, hedging more and more calls
+                self._record_attempt(key, time.monotonic() - attempt_started_at)
+                raise
+            latency = time.monotonic() - attempt_started_at
+            self._record_attempt(key, latency)
+            return result, latency
+
+        primary = asyncio.create_task(_attempt())
+        tasks = {primary}
+
+        try:
+            delay = self.hedge_delay(key)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+
+                if len(done) == 0 and self._has_budget():
+                    self.num_hedges += 1
+                    tasks.add(asyncio.create_task(_attempt()))
+
+            # First successful response wins (if the first one to finish failed, the other one is still awaited)
+            while True:
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+
+                if winner is not None or len(pending) == 0:
+                    winner = winner or next(iter(done))
+                    break
+
+                tasks = pending
+
+            self.num_hedge_wins += winner is not primary
+            result, attempt_latency = winner.result() # re-raises if all attempts failed
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        effective_latency = time.monotonic() - started_at
+        self.effective_latencies.append(effective_latency)
+        self.raw_latencies.append(attempt_latency if winner is primary else effective_latency)
+
+        return result
+
+    def report(self) -> Dict:
+        def _percentiles(latencies: List[float]) -> Dict[str, float | None]:
+            if len(latencies) == 0:
+                return {"p50": None, "p99": None}
+            return {"p50": float(np.quantile(latencies, 0.5)), "p99": float(np.quantile(latencies, 0.99))}
+
+        return {
+            "num_calls": self.num_calls,
+            "num_hedges": self.num_hedges,
+            "num_hedge_wins": self.num_hedge_wins,
+            "extra_load": self.num_hedges / self.num_calls if self.num_calls > 0 else 0.0,
+            "raw_latency": _percentiles(self.raw_latencies),
+            "effective_latency": _percentiles(self.effective_latencies),
+            "hedge_delays": {key: self.hedge_delay(key) for key in self._latencies},
+        }
+
+
+def print_hedging_report(report: Dict) -> None:
+    print(f"Hedged {report['num_hedges']} / {report['num_calls']} calls (extra load {report['extra_load']:.1%}), {report['num_hedge_wins']} won by the duplicate")
+    for name in ["raw_latency", "effective_latency"]:
+        if report[name]["p50"] is not None:
+            print(f"{name}: p50 {report[name]['p50']:.2f}s, p99 {report[name]['p99']:.2f}s")
+
+
+async def main():
+    """Simulated scoring calls with a heavy latency tail (a few stuck requests), without and with hedging."""
+
+    rng = random.Random(0)
+
+    async def _simulated_call() -> None:
+        latency = rng.lognormvariate(-2.5, 0.4)
+        if rng.random() < 0.03:
+            latency *= 20 # stuck request
+        await asyncio.sleep(latency)
+
+    reports = {}
+    for name, max_extra_load in [("without_hedging", 0.0), ("with_hedging", 0.1)]:
+        hedger = RequestHedger(max_extra_load=max_extra_load)
+        semaphore = asyncio.Semaphore(50)
+
+        async def _call() -> None:
+            async with semaphore:
+                await hedger.call("simulated", _simulated_call)
+
+        started_at = time.monotonic()
+        await asyncio.gather(*[_call() for _ in range(2000)])
+        reports[name] = hedger.report() | {"wall_clock_seconds": time.monotonic() - started_at}
+
+        print(f"--- {name} ({reports[name]['wall_clock_seconds']:.1f}s) ---")
+        print_hedging_report(reports[name])
+
+    with open("output/hedging_benchmark.json", "w") as f:
+        json.dump(reports, f, indent=4)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,309 @@
+import json
+import math
+import time
+import model
+import openai
+import asyncio
+import metrics
+import constants
+import work_queue
+import numpy as np
+
+from tqdm import tqdm
+from pydantic import BaseModel
+from typing import Dict, List
+from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_not_exception_type
+from model import Feature, FeatureEvaluation, StatsFeatureEvaluation
+from constants import MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL, MIN_LOGPROBS_SCORE_MASS
+
+
+SINGLE_TOKEN_SCORE_SYSTEM_PROMPT = """
+You are an Social Science researcher scoring a subjective style/personality feature to conversational text.
+
+Your job: score how much the conversation expresses the feature, from 0 (matches the min anchor) to 10 (matches the max anchor), 5 being neutral.
+Answer with the score only: a single integer between 0 and 10, no other text.
+""".strip()
+
+SCORE_TOKENS = [str(score) for score in range(11)]
+
+
+class ScoreDistribution(BaseModel):
+    feature: Feature
+    model: str
+    probabilities: List[float] # probability of each score 0..10
+    covered_probability: float # probability mass of the first token that was a valid score, before renormalization
+    mean: float
+    variance: float
+
+
+def build_single_token_score_input(conversation: str, feature: Feature) -> List[Dict[str, str]]:
+    return [
+        {
+            "role": "system",
+            "content": SINGLE_TOKEN_SCORE_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": (
+                "Conversation:\n```\n"
+                f"{conversation}\n"
+                "```\n\n"
+                "Feature:\n```\n"
+                f"{feature.model_dump_json()}\n"
+                "```\n\n"
+                "Score (0-10):"
+            )
+        }
+    ]
+
+
+def score_distribution_from_logprobs(logprobs: Dict[str, float]) -> tuple[np.ndarray, float]:
+    """Probabilities of the scores 0..10 (renormalized) from first-token logprobs, and the mass they covered."""
+
+    probabilities = np.zeros(len(SCORE_TOKENS))
+    for token, logprob in logprobs.items():
+        token = token.strip()
+        if token in SCORE_TOKENS:
+            probabilities[int(token)] += math.exp(logprob)
+
+    covered = float(probabilities.sum())
+    if covered > 0:
+        probabilities /= covered
+
+    return probabilities, covered
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), reraise=True, sleep=asyncio.sleep, retry=retry_if_not_exception_type((NotImplementedError, ValueError, openai.BadRequestError, openai.NotFoundError)))
+async def evaluate_single_feature_score_distribution(conversation: str, feature: Feature, model_name: str) -> ScoreDistribution:
+    """
+    Score distribution from a single call: the score is asked as one token and read from its log-probabilities.
+
+    Raises `NotImplementedError` when the backend does not expose logprobs, and `ValueError` when too little of the
+    probability mass lands on valid scores (e.g. the model wants to write an explanation first). Neither is retried.
+    """
+
+    backend, backend_model_name = model.get_backend(model_name)
+
+    async with model._api_semaphore:
+        metrics.record_request()
+        started_at = time.monotonic()
+        async with asyncio.timeout(60):
+            response = await backend.first_token_logprobs(
+                model=backend_model_name,
+                input=build_single_token_score_input(conversation, feature),
+                top_logprobs=20,
+                timeout=60.0,
+            )
+        metrics.record_usage(model_name, response.usage, time.monotonic() - started_at)
+
+    probabilities, covered = score_distribution_from_logprobs(response.logprobs)
+
+    if covered < MIN_LOGPROBS_SCORE_MASS:
+        raise ValueError(f"Only {covered:.2f} of the probability mass is on valid scores for feature {feature.name} ({model_name})")
+
+    scores = np.arange(len(SCORE_TOKENS))
+    mean = float(probabilities @ scores)
+
+    return ScoreDistribution(
+        feature=feature,
+        model=model_name,
+        probabilities=probabilities.tolist(),
+        covered_probability=covered,
+        mean=mean,
+        variance=float(probabilities @ (scores - mean) ** 2),
+    )
+
+
+def _stats_from_distributions(distributions: List[ScoreDistribution]) -> StatsFeatureEvaluation:
+    # The distributions of the different models are mixed with equal weights
+    probabilities = np.mean([distribution.probabilities for distribution in distributions], axis=0)
+    scores = np.arange(len(SCORE_TOKENS))
+    mean = float(probabilities @ scores)
+    variance = float(probabilities @ (scores - mean) ** 2)
+    support = scores[probabilities > 0.01]
+
+    return StatsFeatureEvaluation(
+        evaluations=[
+            FeatureEvaluation(feature=distribution.feature, explanation=f"Expected score from {distribution.model} logprobs", score=distribution.mean)
+            for distribution in distributions
+        ],
+        min_score=float(support.min()) if len(support) > 0 else mean,
+        max_score=float(support.max()) if len(support) > 0 else mean,
+        average_score=mean,
+        standard_deviation=math.sqrt(variance),
+        variance=variance,
+        num_evaluations=len(distributions),
+    )
+
+
+async def evaluate_features_scores_logprobs(conversation: str, features: List[Feature], models: List[str], num_evaluations_per_model: int = NUM_EVALUATIONS_PER_MODEL) -> List[StatsFeatureEvaluation]:
+    """
+    Logprob counterpart of `model.evaluate_features_scores`: one call per (feature, model) instead of 2 x `num_evaluations_per_model`.
+
+    Models for which logprobs are not available (or not usable) fall back to repeated sampling with `num_evaluations_per_model`.
+    """
+
+    async def _evaluate(feature: Feature, model_name: str) -> ScoreDistribution | None:
+        try:
+            return await evaluate_single_feature_score_distribution(conversation, feature, model_name)
+        except (NotImplementedError, ValueError, openai.APIStatusError) as _error:
+            # NOTE: providers/models rejecting `logprobs` answer with a 400/404 status error
+            print(f"Falling back to sampling for feature '{feature.name}' ({model_name}): {_error}")
+            return None
+
+    distributions = await asyncio.gather(*[_evaluate(feature, model_name) for feature in features for model_name in models])
+
+    distributions_by_feature: Dict[str, List[ScoreDistribution]] = {feature.name: [] for feature in features}
+    fallback_features_by_model: Dict[str, List[Feature]] = {}
+    for (feature, model_name), distribution in zip([(f, m) for f in features for m in models], distributions):
+        if distribution is None:
+            fallback_features_by_model.setdefault(model_name, []).append(feature)
+        else:
+            distributions_by_feature[feature.name].append(distribution)
+
+    stats_by_feature: Dict[str, List[StatsFeatureEvaluation]] = {
+        feature_name: [_stats_from_distributions(feature_distributions)]
+        for feature_name, feature_distributions in distributions_by_feature.items()
+        if len(feature_distributions) > 0
+    }
+
+    for model_name, fallback_features in fallback_features_by_model.items():
+        for sampled in await model.evaluate_features_scores(conversation, fallback_features, [model_name], num_evaluations_per_model):
+            stats_by_feature.setdefault(sampled.evaluations[0].feature.name, []).append(sampled)
+
+    stats = [feature_stats[0] if len(feature_stats) == 1 else merge_stats(feature_stats) for feature_stats in stats_by_feature.values()]
+
+    return sorted(stats, key=lambda x: x.standard_deviation)
+
+
+def merge_stats(stats: List[StatsFeatureEvaluation]) -> StatsFeatureEvaluation:
+    """Merge stats of the same feature (law of total variance, each stats weighted equally)."""
+
+    means = np.array([s.average_score for s in stats])
+    variances = np.array([s.variance for s in stats])
+    variance = float(variances.mean() + means.var())
+
+    return StatsFeatureEvaluation(
+        evaluations=[evaluation for s in stats for evaluation in s.evaluations],
+        min_score=min(s.min_score for s in stats),
+        max_score=max(s.max_score for s in stats),
+        average_score=float(means.mean()),
+        standard_deviation=math.sqrt(variance),
+        variance=variance,
+        num_evaluations=sum(s.num_evaluations for s in stats),
+    )
+
+
+async def evaluate_features_scores_per_conversation_logprobs(conversations: List[List[str]], features: List[Feature], models: List[str], num_evaluations_per_model: int = NUM_EVALUATIONS_PER_MODEL) -> List[List[StatsFeatureEvaluation]]:
+    """Logprob counterpart of `model.evaluate_features_scores_per_conversation` (stats of each conversation apart, in input order)."""
+
+    outputs: List[List[StatsFeatureEvaluation]] = [[] for _ in conversations]
+
+    async def _evaluate(index: int) -> List[StatsFeatureEvaluation]:
+        return await evaluate_features_scores_logprobs("\n".join([segment for segment in conversations[index]]), features, models, num_evaluations_per_model)
+
+    pbar = tqdm(total=len(conversations), desc="Evaluating features scores across conversations (logprobs)", leave=False)
+
+    def _on_result(index: int, stats: List[StatsFeatureEvaluation] | None, error: Exception | None) -> None:
+        pbar.update(1)
+        if error is not None:
+            metrics.record_error(error)
+            print(f"Error while evaluating feature scores (logprobs): {error=}, {type(error)=}")
+        else:
+            outputs[index] = stats
+
+    # Conversations in flight: enough calls to fill the API semaphore and the queue (same window as `model.py`)
+    await work_queue.run_work_queue(
+        ((0, index) for index in range(len(conversations))),
+        _evaluate,
+        _on_result,
+        num_workers=math.ceil(3 * constants.SEMAPHORE_MAX_CONCURRENCY / max(len(features) * len(models), 1)) + 1,
+    )
+
+    return outputs
+
+
+async def evaluate_features_scores_across_conversations_logprobs(conversations: List[List[str]], features: List[Feature], models: List[str], num_evaluations_per_model: int = NUM_EVALUATIONS_PER_MODEL) -> List[StatsFeatureEvaluation]:
+
+    per_conversation_stats = await evaluate_features_scores_per_conversation_logprobs(conversations, features, models, num_evaluations_per_model)
+
+    stats_by_feature: Dict[str, List[StatsFeatureEvaluation]] = {}
+    for batch in per_conversation_stats:
+        for stats in batch:
+            stats_by_feature.setdefault(stats.evaluations[0].feature.name, []).append(stats)
+
+    return sorted([merge_stats(stats) for stats in stats_by_feature.values()], key=lambda x: x.standard_deviation)
+
+
+async def calibration_report(conversations: List[List[str]], features: List[Feature], models: List[str], num_evaluations_per_model: int = NUM_EVALUATIONS_PER_MODEL) -> Dict:
+    """Compare the logprob expected scores with the sampling pipeline, per (conversation, feature) cell."""
+
+    cells, timings = [], []
+    for batch in tqdm(conversations, desc="Calibrating logprobs against sampling", leave=False):
+        conversation = "\n".join([segment for segment in batch])
+        timing = {}
+
+        for mode, evaluate in [("sampling", model.evaluate_features_scores), ("logprobs", evaluate_features_scores_logprobs)]:
+            usage_before = metrics.usage_snapshot()
+            started_at = time.monotonic()
+            timing[mode] = await evaluate(conversation, features, models, num_evaluations_per_model)
+            timing[f"{mode}_seconds"] = time.monotonic() - started_at
+            timing[f"{mode}_calls"] = sum(usage["calls"] for usage in metrics.usage_since(usage_before).values())
+
+        expected_by_name = {s.evaluations[0].feature.name: s for s in timing.pop("logprobs")}
+        for s in timing.pop("sampling"):
+            feature_name = s.evaluations[0].feature.name
+            if feature_name in expected_by_name:
+                cells.append({
+                    "feature": feature_name,
+                    "sampling_mean": s.average_score,
+                    "sampling_std": s.standard_deviation,
+                    "logprobs_mean": expected_by_name[feature_name].average_score,
+                    "logprobs_std": expected_by_name[feature_name].standard_deviation,
+                })
+
+        timings.append(timing)
+
+    sampling_means = np.array([cell["sampling_mean"] for cell in cells])
+    logprobs_means = np.array([cell["logprobs_mean"] for cell in cells])
+    std_ratios = np.array([cell["logprobs_std"] / cell["sampling_std"] for cell in cells if cell["sampling_std"] > 0])
+
+    return {
+        "num_cells": len(cells),
+        "mean_absolute_error": float(np.abs(sampling_means - logprobs_means).mean()) if len(cells) > 0 else None,
+        "mean_correlation": float(np.corrcoef(sampling_means, logprobs_means)[0, 1]) if len(cells) > 1 else None,
+        "median_std_ratio": float(np.median(std_ratios)) if len(std_ratios) > 0 else None,
+        "sampling_calls": sum(t["sampling_calls"] for t in timings),
+        "logprobs_calls": sum(t["logprobs_calls"] for t in timings),
+        "sampling_seconds": sum(t["sampling_seconds"] for t in timings),
+        "logprobs_seconds": sum(t["logprobs_seconds"] for t in timings),
+        "cells": cells,
+    }
+
+
+async def main():
+
+    import sys, os
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+    from dataset_loader.jess_lee import load_dataset
+    _, _, validation_set = load_dataset("dataset/jess_lee", max_words_per_batch=2000)
+
+    features_bank = json.load(open("output/features_bank.json"))
+    features_bank = [Feature.model_validate(_feature) for _feature in features_bank]
+
+    report = await calibration_report(validation_set[:3], features_bank, MODELS_TO_ANALYZE)
+
+    print(f"Cells compared: {report['num_cells']}")
+    print(f"Mean absolute error (means): {report['mean_absolute_error']}")
+    print(f"Correlation (means): {report['mean_correlation']}")
+    print(f"Median std ratio (logprobs / sampling): {report['median_std_ratio']}")
+    print(f"Calls: {report['logprobs_calls']} (sampling: {report['sampling_calls']})")
+    print(f"Time: {report['logprobs_seconds']:.1f}s (sampling: {report['sampling_seconds']:.1f}s)")
+
+    with open("output/logprob_calibration.json", "w") as f:
+        json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,14 @@
 import json
 import model
+import cascade
 import asyncio
+import scoring_modes
+import bank_compaction
 
 from tqdm import tqdm
 from typing import List, Any
 from model import Feature, StatsFeatureEvaluation
-from constants import MODELS_TO_ANALYZE, NUM_RUBRICS_PER_MODEL, NUM_EVALUATIONS_PER_MODEL, MAX_STD_DEVIATION
+from constants import MODELS_TO_ANALYZE, NUM_RUBRICS_PER_MODEL, NUM_EVALUATIONS_PER_MODEL, MAX_STD_DEVIATION, USE_SCORING_CASCADE, CASCADE_ROUTES
 
 
 # NOTE: would be good to evaluate variance per model, so we know if some model are more reliable than others
@@ -42,6 +45,7 @@ async def main():
     train_set, test_set, validation_set = load_dataset("dataset/dara")
 
     features_bank: List[Feature] = [] # candidate features
+    cascade_reports: List[cascade.CascadeReport] = [] # one per batch when USE_SCORING_CASCADE
 
     # ####################################################################################################################################
     # # TODO: remove this (for debugging purposes)
@@ -71,7 +75,11 @@ async def main():
         if len(new_features_candidates) == 0:
             continue
 
-        new_features_candidates = await model.evaluate_features_scores(data_sample, new_features_candidates, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+        if USE_SCORING_CASCADE:
+            new_features_candidates, cascade_report = await cascade.evaluate_features_scores_cascade(data_sample, new_features_candidates, cascade.CascadeRoute(**CASCADE_ROUTES["bank_building"]))
+            cascade_reports.append(cascade_report)
+        else:
+            new_features_candidates = await model.evaluate_features_scores(data_sample, new_features_candidates, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
 
         new_features_candidates = list(filter(lambda x: x.standard_deviation <= MAX_STD_DEVIATION, new_features_candidates)) # filter out features with high standard deviation
 
@@ -79,13 +87,13 @@ async def main():
         pbar.set_postfix({"features": len(features_bank)})
 
     print(f"Features candidates generated: {len(features_bank)}")
+    if len(cascade_reports) > 0:
+        cascade.print_cascade_report(cascade.merge_cascade_reports(cascade_reports))
     _save_to_json([feature.model_dump() for feature in features_bank], "output/features_bank_unfiltered.json")
 
-    # NOTE: maybe we should try merging features from the bank who are covering the same aspect of personality (making broader more general features)
-    # or maybe this will be done by checking correlation
-
-    # Test on segments present in the train set
-    train_stats = await model.evaluate_features_scores_across_conversations(train_set, features_bank, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+    # Test on segments present in the train set (stats are kept per conversation to compute features correlation)
+    per_conversation_train_stats = await scoring_modes.evaluate_features_scores_per_conversation(train_set, features_bank, stage="bank_building")
+    train_stats = model.merge_conversations_stats(per_conversation_train_stats, features_bank)
     print("Train stats computed")
 
     # Filter out unstable features from both train_stats and features_bank
@@ -94,19 +102,25 @@ async def main():
     train_stats = [s for s in train_stats if s.evaluations[0].feature.name not in unstable_feature_names]
     print(f"Filtered bank to keep only stable features: {len(features_bank)}")
 
+    # Merge features from the bank who have a high correlation (keeps one representative feature per correlated group)
+    features_bank, compaction_report = await bank_compaction.compact_features_bank(features_bank, per_conversation_train_stats)
+    bank_compaction.print_compaction_report(compaction_report)
+    _save_to_json(compaction_report, "output/bank_compaction_report.json")
+
+    compacted_feature_names = {f.name for f in features_bank}
+    train_stats = [s for s in train_stats if s.evaluations[0].feature.name in compacted_feature_names]
+
     _save_to_json([feature.model_dump() for feature in features_bank], "output/features_bank.json")
     _print_stats_features_evaluation(train_stats)
 
-    # TODO: merge features from the bank who have a high correlation into broader more general features
-
     # Test on segments not present in the train set
-    test_stats = await model.evaluate_features_scores_across_conversations(test_set, features_bank, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+    test_stats = await scoring_modes.evaluate_features_scores_across_conversations(test_set, features_bank)
     _print_stats_features_evaluation(test_stats)
 
     # Test on podcast episodes not present in the train/test sets
-    validation_stats = await model.evaluate_features_scores_across_conversations(validation_set, features_bank, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+    validation_stats = await scoring_modes.evaluate_features_scores_across_conversations(validation_set, features_bank)
     _print_stats_features_evaluation(validation_stats)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(model.run_with_loop_metrics(main()))
@@ -0,0 +1,361 @@
+"""
+Sparse scoring: only a subset of the (conversation x feature) cells is scored, the rest is imputed by low-rank matrix completion.
+
+Persona score matrices are highly structured (features correlate, batches of a persona resemble each other), so a
+few scored cells per conversation and per feature are enough to predict the others:
+
+    1. an initial design scores a few cells of every conversation, spread evenly over the features
+    2. the matrix is completed with alternating least squares (per-feature means + rank-k factors), the rank being
+       picked by cross-validation on the scored cells, which also estimates the error of the imputed cells
+    3. the completion is refitted on subsamples of the scored cells: the spread of the imputed values is their uncertainty
+    4. while the cross-validated RMSE is above the target, the most uncertain cells are scored and the loop goes back to 2
+
+Scored cells go through the score store (see `score_store.py`), so nothing is ever scored twice.
+"""
+
+import os
+import sys
+import json
+import math
+import model
+import asyncio
+import argparse
+import constants
+import importlib
+import score_store
+import numpy as np
+
+from typing import Dict, List
+from pydantic import BaseModel
+from model import Feature, FeatureEvaluation, StatsFeatureEvaluation
+from constants import MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL
+
+
+RANKS = [1, 2, 3, 5]
+REGULARIZATION = 1.0
+NUM_ALS_ITERATIONS = 30
+NUM_FOLDS = 5
+NUM_SUBSAMPLES = 10
+SUBSAMPLE_FRACTION = 0.8
+
+INITIAL_CELLS_PER_CONVERSATION = 3
+CELLS_PER_ROUND = 0.05 # share of the cells scored at each active round
+
+
+def complete_matrix(observed: np.ndarray, rank: int, rng: np.random.Generator, regularization: float = REGULARIZATION, num_iterations: int = NUM_ALS_ITERATIONS) -> np.ndarray:
+    """
+    Fill the NaN cells of `observed` with alternating least squares: feature means plus a rank-`rank` factorization of
+    the residuals (ridge-regularized, so rows or columns with few scored cells shrink towards the feature means).
+    """
+
+    mask = ~np.isnan(observed)
+    global_mean = observed[mask].mean() if mask.any() else 5.0
+    column_means = np.array([observed[mask[:, j], j].mean() if mask[:, j].any() else global_mean for j in range(observed.shape[1])])
+    residuals = np.where(mask, observed - column_means[None, :], 0.0)
+
+    row_factors = rng.normal(scale=0.1, size=(observed.shape[0], rank))
+    column_factors = rng.normal(scale=0.1, size=(observed.shape[1], rank))
+    identity = regularization * np.eye(rank)
+
+    for _ in range(num_iterations):
+        for i in range(observed.shape[0]):
+            factors = column_factors[mask[i]]
+            row_factors[i] = np.linalg.solve(factors.T @ factors + identity, factors.T @ residuals[i, mask[i]])
+        for j in range(observed.shape[1]):
+            factors = row_factors[mask[:, j]]
+            column_factors[j] = np.linalg.solve(factors.T @ factors + identity, factors.T @ residuals[mask[:, j], j])
+
+    return np.clip(column_means[None, :] + row_factors @ column_factors.T, 0.0, 10.0)
+
+
+def cross_validated_rmse(observed: np.ndarray, rank: int, rng: np.random.Generator) -> float:
+    """RMSE of the completion on held-out scored cells (k-fold)."""
+
+    cells = np.argwhere(~np.isnan(observed))
+    if len(cells) < 2:
+        raise ValueError(f"Cross-validation needs at least 2 scored cells, got {len(cells)}")
+    folds = np.array_split(rng.permutation(len(cells)), min(NUM_FOLDS, len(cells)))
+    squared_errors = []
+
+    for fold in folds:
+        held_out = cells[fold]
+        training = observed.copy()
+        training[held_out[:, 0], held_out[:, 1]] = np.nan
+        completed = complete_matrix(training, rank, rng)
+        squared_errors.extend((completed[held_out[:, 0], held_out[:, 1]] - observed[held_out[:, 0], held_out[:, 1]]) ** 2)
+
+    return math.sqrt(np.mean(squared_errors))
+
+
+def completion_uncertainty(observed: np.ndarray, rank: int, rng: np.random.Generator) -> np.ndarray:
+    """Per-cell spread of the completions refitted on random subsamples of the scored cells."""
+
+    cells = np.argwhere(~np.isnan(observed))
+    completions = []
+
+    for _ in range(NUM_SUBSAMPLES):
+        dropped = cells[rng.permutation(len(cells))[:int(len(cells) * (1 - SUBSAMPLE_FRACTION))]]
+        subsample = observed.copy()
+        subsample[dropped[:, 0], dropped[:, 1]] = np.nan
+        completions.append(complete_matrix(subsample, rank, rng))
+
+    return np.std(completions, axis=0)
+
+
+def initial_design(num_conversations: int, num_features: int, cells_per_conversation: int, rng: np.random.Generator) -> List[tuple[int, int]]:
+    """A few cells per conversation, always picking the least covered features so every feature gets scored."""
+
+    coverage = np.zeros(num_features)
+    cells = []
+    for i in rng.permutation(num_conversations):
+        # Random tie-breaking between equally covered features
+        columns = np.lexsort((rng.random(num_features), coverage))[:min(cells_per_conversation, num_features)]
+        coverage[columns] += 1
+        cells.extend((int(i), int(j)) for j in columns)
+    return cells
+
+
+class SparseScoringRound(BaseModel):
+    num_scored_cells: int
+    rank: int
+    cross_validated_rmse: float
+    mean_uncertainty: float # of the imputed cells
+
+
+class SparseScoringReport(BaseModel):
+    num_cells: int
+    num_scored_cells: int
+    num_calls: int # scoring calls made by this run (cells already in the store are free)
+    dense_num_calls: int # calls of the dense sweep
+    call_savings: float
+    target_rmse: float
+    reached_target: bool
+    rounds: List[SparseScoringRound]
+
+
+class CompletedScores(BaseModel):
+    scores: List[List[float]] # conversation x feature
+    uncertainties: List[List[float]] # 0 for the scored cells
+    scored: List[List[bool]]
+    report: SparseScoringReport
+
+
+def _cell_means(store: score_store.ScoreStore, joined_conversations: List[str], features: List[Feature], models: List[str], num_evaluations_per_model: int, profile: str) -> np.ndarray:
+    """Mean stored score of each cell across models (NaN when not fully scored)."""
+
+    feature_hashes = [score_store.feature_hash(feature) for feature in features]
+    means = np.full((len(joined_conversations), len(features)), np.nan)
+
+    for i, conversation in enumerate(joined_conversations):
+        _conversation_hash = score_store.conversation_hash(conversation)
+        for j, _feature_hash in enumerate(feature_hashes):
+            scores = []
+            for model_name in models:
+                evaluations = store.evaluations(score_store.cell_key(_feature_hash, _conversation_hash, model_name, profile))
+                scores.extend(evaluation.score for evaluation in evaluations[:num_evaluations_per_model])
+            if len(scores) == len(models) * num_evaluations_per_model:
+                means[i, j] = np.mean(scores)
+
+    return means
+
+
+async def evaluate_features_scores_sparse(
+    conversations: List[List[str]],
+    features: List[Feature],
+    models: List[str],
+    num_evaluations_per_model: int,
+    target_rmse: float | None = None,
+    max_fraction: float | None = None,
+    store: score_store.ScoreStore | None = None,
+    seed: int = 0,
+) -> CompletedScores:
+    store = store or score_store.ScoreStore()
+    target_rmse = target_rmse if target_rmse is not None else constants.SPARSE_SCORING_TARGET_RMSE
+    max_fraction = max_fraction if max_fraction is not None else constants.SPARSE_SCORING_MAX_FRACTION
+    profile = constants.SCORING_PROFILE
+    rng = np.random.default_rng(seed)
+
+    joined_conversations = ["\n".join([segment for segment in batch]) for batch in conversations]
+    for conversation in joined_conversations:
+        store.add_conversation(conversation)
+
+    # Every missing (conversation, feature, model) job, to pick from when a cell is requested
+    jobs_by_cell: Dict[tuple[int, int], List[score_store.ScoringJob]] = {}
+    feature_index = {score_store.feature_hash(feature): j for j, feature in enumerate(features)}
+    for job in score_store.plan_missing_cells(store, joined_conversations, features, models, num_evaluations_per_model, profile):
+        jobs_by_cell.setdefault((job.conversation_index, feature_index[score_store.feature_hash(job.feature)]), []).append(job)
+
+    num_cells = len(joined_conversations) * len(features)
+    max_scored_cells = max(int(num_cells * max_fraction), 1)
+    num_calls, rounds = 0, []
+
+    async def _score(cells: List[tuple[int, int]]) -> None:
+        nonlocal num_calls
+        jobs = [job for cell in cells for job in jobs_by_cell.pop(cell, [])]
+        num_calls += sum(job.num_missing for job in jobs)
+        await score_store.run_scoring_jobs(store, joined_conversations, jobs, profile)
+
+    # Cells already complete in the store are used as they are
+    observed = _cell_means(store, joined_conversations, features, models, num_evaluations_per_model, profile)
+    design = [cell for cell in initial_design(len(joined_conversations), len(features), INITIAL_CELLS_PER_CONVERSATION, rng) if np.isnan(observed[cell])]
+    await _score(design[:max(max_scored_cells - int((~np.isnan(observed)).sum()), 0)])
+
+    while True:
+        observed = _cell_means(store, joined_conversations, features, models, num_evaluations_per_model, profile)
+        num_scored_cells = int((~np.isnan(observed)).sum())
+        if num_scored_cells < 2:
+            raise ValueError(
+                f"Sparse scoring: only {num_scored_cells}/{num_cells} cells could be scored (the scoring calls failed), "
+                "the completion needs at least 2; check the scoring errors above or use the dense scoring"
+            )
+
+        rmse_by_rank = {rank: cross_validated_rmse(observed, rank, rng) for rank in RANKS if rank < min(observed.shape)} or {1: cross_validated_rmse(observed, 1, rng)}
+        rank = min(rmse_by_rank, key=rmse_by_rank.get)
+        uncertainty = np.where(np.isnan(observed), completion_uncertainty(observed, rank, rng), 0.0)
+
+        rounds.append(SparseScoringRound(
+            num_scored_cells=num_scored_cells,
+            rank=rank,
+            cross_validated_rmse=rmse_by_rank[rank],
+            mean_uncertainty=float(uncertainty[np.isnan(observed)].mean()) if num_scored_cells < num_cells else 0.0,
+        ))
+        print(f"Sparse scoring: {num_scored_cells}/{num_cells} cells scored, rank {rank}, cross-validated RMSE {rmse_by_rank[rank]:.2f} (target {target_rmse})")
+
+        if rmse_by_rank[rank] <= target_rmse or num_scored_cells >= min(max_scored_cells, num_cells):
+            break
+
+        # The most uncertain cells that can still be scored (cells whose calls all failed are not requested again)
+        candidates = [tuple(cell) for cell in np.argwhere(np.isnan(observed)) if tuple(cell) in jobs_by_cell]
+        if len(candidates) == 0:
+            break
+        candidates.sort(key=lambda cell: -uncertainty[cell])
+        await _score(candidates[:max(min(int(num_cells * CELLS_PER_ROUND), max_scored_cells - num_scored_cells), 1)])
+
+    completed = np.where(np.isnan(observed), complete_matrix(observed, rank, rng), observed)
+    dense_num_calls = num_cells * len(models) * num_evaluations_per_model
+
+    return CompletedScores(
+        scores=completed.tolist(),
+        uncertainties=uncertainty.tolist(),
+        scored=(~np.isnan(observed)).tolist(),
+        report=SparseScoringReport(
+            num_cells=num_cells,
+            num_scored_cells=num_scored_cells,
+            num_calls=num_calls,
+            dense_num_calls=dense_num_calls,
+            call_savings=1 - num_scored_cells / num_cells,
+            target_rmse=target_rmse,
+            reached_target=rounds[-1].cross_validated_rmse <= target_rmse,
+            rounds=rounds,
+        ),
+    )
+
+
+def completed_scores_per_conversation(completed: CompletedScores, features: List[Feature]) -> List[List[StatsFeatureEvaluation]]:
+    """Stats of each conversation apart (in input order), one evaluation per cell: its mean score, scored or imputed."""
+
+    per_conversation_stats = []
+    for conversation_scores, conversation_uncertainties, conversation_scored in zip(completed.scores, completed.uncertainties, completed.scored):
+        stats = []
+        for feature, score, uncertainty, scored in zip(features, conversation_scores, conversation_uncertainties, conversation_scored):
+            explanation = "Mean of the scored evaluations" if scored else f"Imputed by low-rank completion (+/- {uncertainty:.2f})"
+            stats.append(StatsFeatureEvaluation(
+                evaluations=[FeatureEvaluation(feature=feature, explanation=explanation, score=score)],
+                min_score=score,
+                max_score=score,
+                average_score=score,
+                standard_deviation=0.0,
+                variance=0.0,
+                num_evaluations=1,
+            ))
+        per_conversation_stats.append(stats)
+
+    return per_conversation_stats
+
+
+def completed_scores_to_stats(completed: CompletedScores, features: List[Feature]) -> List[StatsFeatureEvaluation]:
+    """
+    Per-feature stats across conversations, one evaluation per cell (its mean score, scored or imputed). The standard
+    deviation is thus between conversations, not between repeated calls.
+    """
+
+    return model.merge_conversations_stats(completed_scores_per_conversation(completed, features), features)
+
+
+async def evaluate_features_scores_per_conversation_sparse(conversations: List[List[str]], features: List[Feature], models: List[str], num_evaluations_per_model: int) -> List[List[StatsFeatureEvaluation]]:
+    """Sparse counterpart of `model.evaluate_features_scores_per_conversation`."""
+
+    completed = await evaluate_features_scores_sparse(conversations, features, models, num_evaluations_per_model)
+    print_report(completed.report)
+    return completed_scores_per_conversation(completed, features)
+
+
+async def evaluate_features_scores_across_conversations_sparse(conversations: List[List[str]], features: List[Feature], models: List[str], num_evaluations_per_model: int) -> List[StatsFeatureEvaluation]:
+    """Sparse counterpart of `model.evaluate_features_scores_across_conversations`."""
+
+    per_conversation_stats = await evaluate_features_scores_per_conversation_sparse(conversations, features, models, num_evaluations_per_model)
+    return model.merge_conversations_stats(per_conversation_stats, features)
+
+
+def print_report(report: SparseScoringReport) -> None:
+    print(
+        f"Sparse scoring: {report.num_scored_cells}/{report.num_cells} cells scored ({report.call_savings:.0%} saved vs. the dense sweep), "
+        f"{report.num_calls} call(s) made (dense sweep: {report.dense_num_calls}), "
+        f"cross-validated RMSE {report.rounds[-1].cross_validated_rmse:.2f} ({'target reached' if report.reached_target else 'target NOT reached'})"
+    )
+
+
+def _load_conversations(dataset: str) -> List[List[str]]:
+    load_dataset = importlib.import_module(f"dataset_loader.{dataset}").load_dataset
+    train_set, test_set, validation_set = load_dataset(f"dataset/{dataset}", max_words_per_batch=2000)
+    return validation_set + train_set + test_set
+
+
+async def _check_against_dense(conversations: List[List[str]], features: List[Feature], completed: CompletedScores, store: score_store.ScoreStore) -> Dict:
+    """Score the full matrix (through the store, so the sparse cells are re-used) and measure the real error of the imputed cells."""
+
+    await score_store.evaluate_features_scores_across_conversations_incremental(conversations, features, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL, store)
+    joined_conversations = ["\n".join([segment for segment in batch]) for batch in conversations]
+    dense = _cell_means(store, joined_conversations, features, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL, constants.SCORING_PROFILE)
+
+    imputed = ~np.array(completed.scored) & ~np.isnan(dense)
+    errors = (np.array(completed.scores) - dense)[imputed]
+    uncertainties = np.array(completed.uncertainties)[imputed]
+
+    return {
+        "num_imputed_cells": int(imputed.sum()),
+        "imputed_rmse": float(np.sqrt(np.mean(errors ** 2))) if imputed.any() else None,
+        "imputed_mae": float(np.abs(errors).mean()) if imputed.any() else None,
+        "within_2_uncertainties": float((np.abs(errors) <= 2 * uncertainties).mean()) if imputed.any() else None,
+    }
+
+
+def main():
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default="jess_lee", help="name of a `dataset_loader` module, data is read from dataset/<name>")
+    parser.add_argument("--bank", default="output/features_bank.json")
+    parser.add_argument("--target-rmse", type=float, default=constants.SPARSE_SCORING_TARGET_RMSE)
+    parser.add_argument("--max-fraction", type=float, default=constants.SPARSE_SCORING_MAX_FRACTION)
+    parser.add_argument("--check", action="store_true", help="also score the dense matrix and report the real error of the imputed cells")
+    args = parser.parse_args()
+
+    features_bank = [Feature.model_validate(_feature) for _feature in json.load(open(args.bank))]
+    conversations = _load_conversations(args.dataset)
+    store = score_store.ScoreStore()
+
+    completed = asyncio.run(evaluate_features_scores_sparse(conversations, features_bank, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL, args.target_rmse, args.max_fraction, store))
+    print_report(completed.report)
+
+    output = {"features": [feature.name for feature in features_bank], **completed.model_dump()}
+    if args.check:
+        output["check"] = asyncio.run(_check_against_dense(conversations, features_bank, completed, store))
+        print(f"Check against the dense sweep: {output['check']}")
+
+    with open(f"output/sparse_scores_{args.dataset}.json", "w") as f:
+        json.dump(output, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import asyncio
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Literal
+
+
+# Counters updated by `model.py` while a run is going on (read and reset by the exporter)
+_counters: Dict[str, int] = {
+    "requests": 0,
+    "retries": 0,
+    "timeouts": 0,
+    "errors": 0,
+    "evidence_checks": 0,
+    "evidence_unverified": 0,
+}
+
+# Per-model usage: number of calls, tokens and cumulated latency (used for cost/latency reports)
+_usage_by_model: Dict[str, Dict[str, float]] = {}
+
+
+def record_request() -> None:
+    _counters["requests"] += 1
+
+
+def record_retry(error: BaseException | None) -> None:
+    _counters["retries"] += 1
+    if isinstance(error, TimeoutError):
+        _counters["timeouts"] += 1
+
+
+def record_error(error: BaseException | None) -> None:
+    _counters["errors"] += 1
+    if isinstance(error, TimeoutError):
+        _counters["timeouts"] += 1
+
+
+def record_evidence_check(verified: bool) -> None:
+    _counters["evidence_checks"] += 1
+    if not verified:
+        _counters["evidence_unverified"] += 1
+
+
+def record_usage(model: str, usage: Any, latency: float) -> None:
+    """Record the token usage (an OpenAI `ResponseUsage`, may be None) and latency of one call."""
+    model_usage = _usage_by_model.setdefault(model, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "latency_seconds": 0.0})
+    model_usage["calls"] += 1
+    model_usage["input_tokens"] += getattr(usage, "input_tokens", None) or 0
+    model_usage["output_tokens"] += getattr(usage, "output_tokens", None) or 0
+    model_usage["latency_seconds"] += latency
+
+
+def usage_snapshot() -> Dict[str, Dict[str, float]]:
+    return {model: dict(model_usage) for model, model_usage in _usage_by_model.items()}
+
+
+def usage_since(snapshot: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """Usage recorded since `snapshot` was taken, per model."""
+    return {
+        model: {key: value - snapshot.get(model, {}).get(key, 0) for key, value in model_usage.items()}
+        for model, model_usage in _usage_by_model.items()
+        if model_usage["calls"] - snapshot.get(model, {}).get("calls", 0) > 0
+    }
+
+
+def estimate_cost(usage_by_model: Dict[str, Dict[str, float]], prices: Dict[str, tuple[float, float]]) -> float:
+    """Cost in USD given `prices` as (input, output) USD per 1M tokens. Models without a known price count as free."""
+    cost = 0.0
+    for model, model_usage in usage_by_model.items():
+        input_price, output_price = prices.get(model, (0.0, 0.0))
+        cost += (model_usage["input_tokens"] * input_price + model_usage["output_tokens"] * output_price) / 1_000_000
+    return cost
+
+
+class TrackedSemaphore:
+    """`asyncio.Semaphore` counting its holders and waiters for the sampler (the asyncio one has no public API for it)."""
+
+    def __init__(self, value: int) -> None:
+        self.capacity = value
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(value)
+
+    async def __aenter__(self) -> None:
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+def _to_prometheus(snapshot: Dict[str, float]) -> str:
+    lines = []
+    for key, value in snapshot.items():
+        name = f"personascope_{key}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomically(path: str, content: str) -> None:
+    # Write then rename so that a scraper never reads a half-written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class LoopMetricsSampler:
+    """
+    Periodically samples the health of the running event loop and writes it to disk.
+
+    Event-loop lag is measured as the overshoot of an `asyncio.sleep(interval)`: if the loop
+    is blocked (e.g. parsing large JSON/pydantic responses), the sleep wakes up late.
+    """
+
+    def __init__(
+        self,
+        semaphore: TrackedSemaphore,
+        output_path: str,
+        output_format: Literal["prometheus", "json"] = "prometheus",
+        interval: float = 1.0,
+    ) -> None:
+        self.semaphore = semaphore
+        self.output_path = output_path
+        self.output_format = output_format
+        self.interval = interval
+        self.max_lag = 0.0
+        self._started_at = time.monotonic()
+        self._previous_counters = dict(_counters)
+
+    def sample(self, lag: float) -> Dict[str, float]:
+        self.max_lag = max(self.max_lag, lag)
+
+        tasks = asyncio.all_tasks()
+
+        # Rates are computed over the last sampling interval
+        deltas = {key: _counters[key] - self._previous_counters.get(key, 0) for key in _counters}
+        self._previous_counters = dict(_counters)
+        num_requests = max(deltas["requests"], 1)
+
+        return {
+            "uptime_seconds": round(time.monotonic() - self._started_at, 3),
+            "event_loop_lag_seconds": round(lag, 6),
+            "event_loop_max_lag_seconds": round(self.max_lag, 6),
+            "tasks_total": len(tasks),
+            # Tasks blocked on the semaphore are "queued", the ones holding it are "in flight"
+            "tasks_in_flight": self.semaphore.in_flight,
+            "tasks_queued": self.semaphore.waiting,
+            "semaphore_occupancy_ratio": round(self.semaphore.in_flight / self.semaphore.capacity, 4),
+            "requests_total": _counters["requests"],
+            "retries_total": _counters["retries"],
+            "timeouts_total": _counters["timeouts"],
+            "errors_total": _counters["errors"],
+            "evidence_unverified_total": _counters["evidence_unverified"],
+            "retry_rate": round(deltas["retries"] / num_requests, 4),
+            "timeout_rate": round(deltas["timeouts"] / num_requests, 4),
+            "evidence_unverified_rate": round(deltas["evidence_unverified"] / max(deltas["evidence_checks"], 1), 4),
+        }
+
+    def write(self, snapshot: Dict[str, float]) -> None:
+        if self.output_format == "prometheus":
+            _write_atomically(self.output_path, _to_prometheus(snapshot))
+        else:
+            _write_atomically(self.output_path, json.dumps(snapshot, indent=4))
+
+    async def run(self) -> None:
+        while True:
+            expected_wake_up = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - expected_wake_up)
+
+            try:
+                self.write(self.sample(lag))
+            except OSError as _error:
+                print(f"Error writing loop metrics: {_error}")
+
+
+@asynccontextmanager
+async def export_loop_metrics(
+    semaphore: TrackedSemaphore,
+    output_path: str,
+    output_format: Literal["prometheus", "json"] = "prometheus",
+    interval: float = 1.0,
+) -> AsyncIterator[LoopMetricsSampler]:
+    """Run a `LoopMetricsSampler` in the background for the duration of the `async with` block."""
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    sampler = LoopMetricsSampler(semaphore, output_path, output_format, interval)
+    task = asyncio.create_task(sampler.run())
+
+    try:
+        yield sampler
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        sampler.write(sampler.sample(lag=0.0)) # final snapshot, so the file reflects the end of the run
@@ -1,13 +1,24 @@
+import os
+import sys
+import math
+import time
 import asyncio
+import metrics
+import hedging
+import evidence
 import constants
+import work_queue
 
 from tqdm import tqdm
 from tenacity import retry, stop_after_attempt, wait_fixed, RetryCallState
-from typing import List, Dict
+from typing import Any, Awaitable, Callable, List, Dict, Type
 from pydantic import BaseModel
-from openai import AsyncOpenAI
 from statistics import mean, stdev, variance
 
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from llm_backends.base import LLMBackend, resolve_backend
+
 
 RUBRIC_GENERATION_SYSTEM_PROMPT = """
 You are an expert Social Science researcher designing feature detectors for subjective traits in conversational data.
@@ -64,14 +75,78 @@ Return a deep analysis explaining evidence for alignment or misalignment, contra
 This is a preparatory step; do NOT produce the final feature score here.
 """.strip()
 
-openrouter_client = AsyncOpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=constants.SECRET_OPENROUTER_API_KEY.get_secret_value(),
-)
+
+# Sampling temperatures of the two scoring steps
+FEATURE_MATCH_TEMPERATURE = 0.7
+FEATURE_SCORING_TEMPERATURE = 1.0
+
+
+class ScoringProfile(BaseModel):
+    """
+    How verbose the scoring calls are. Output tokens dominate the latency and cost of scoring, so leaner profiles
+    cap the step 1 analysis and the step 2 explanation (asked in the prompt, and enforced with `max_output_tokens`).
+    """
+    name: str
+    use_analysis: bool = True # run the step 1 free-form analysis
+    max_analysis_tokens: int | None = None
+    use_explanation: bool = True # ask for an explanation with evidence spans along the score
+    max_explanation_tokens: int | None = None
+
+
+SCORING_PROFILES: Dict[str, ScoringProfile] = {
+    "full": ScoringProfile(name="full"),
+    "compact": ScoringProfile(name="compact", max_analysis_tokens=300, max_explanation_tokens=80),
+    "brief": ScoringProfile(name="brief", max_analysis_tokens=100, max_explanation_tokens=30),
+    "score-only": ScoringProfile(name="score-only", use_analysis=False, use_explanation=False),
+}
+
+# Extra rounds re-sampling the failed or rejected samples of a multi-sample scoring call
+MAX_RESAMPLING_ROUNDS = 2
+
+# Room for the JSON keys and the score around the explanation, so a capped answer is not cut before it is valid JSON
+_SCORING_OUTPUT_TOKENS_OVERHEAD = 32
+
+
+def get_backend(model: str) -> tuple[LLMBackend, str]:
+    """Backend serving `model` (see `llm_backends.base.resolve_backend`) and the model name to send to it."""
+    return resolve_backend(model, constants.LLM_BACKEND)
 
 
 # Global concurrency gate for outbound API requests
-_api_semaphore = asyncio.Semaphore(constants.SEMAPHORE_MAX_CONCURRENCY)
+_api_semaphore = metrics.TrackedSemaphore(constants.SEMAPHORE_MAX_CONCURRENCY)
+
+
+# Hedged scoring calls (see `hedging.py`), only used when `constants.USE_REQUEST_HEDGING` is set
+_hedger = hedging.RequestHedger(quantile=constants.HEDGING_QUANTILE, max_extra_load=constants.HEDGING_MAX_EXTRA_LOAD)
+
+
+async def _hedged(key: str, make_call: Callable[[], Awaitable[Any]]) -> Any:
+    if not constants.USE_REQUEST_HEDGING:
+        return await make_call()
+    return await _hedger.call(key, make_call)
+
+
+async def _gated(key: str, make_call: Callable[[], Awaitable[Any]]) -> Any:
+    """One provider request of a multi-sample call: its own `_api_semaphore` slot, hedging and timeout."""
+    async with _api_semaphore:
+        async with asyncio.timeout(60):
+            return await _hedged(key, make_call)
+
+
+async def run_with_loop_metrics(coroutine: Awaitable[Any]) -> Any:
+    """Await `coroutine` while exporting event-loop and `_api_semaphore` metrics (see `metrics.py`)."""
+    async with metrics.export_loop_metrics(
+        _api_semaphore,
+        output_path=constants.METRICS_OUTPUT_PATH,
+        output_format=constants.METRICS_OUTPUT_FORMAT,
+        interval=constants.METRICS_SAMPLE_INTERVAL,
+    ):
+        output = await coroutine
+
+    if constants.USE_REQUEST_HEDGING:
+        hedging.print_hedging_report(_hedger.report())
+
+    return output
 
 
 class Feature(BaseModel):
@@ -91,6 +166,16 @@ class FeatureEvaluation(BaseModel):
     score: float
 
 
+class LeanFeatureEvaluation(BaseModel):
+    """Step 2 output of the lean profiles: the feature is not echoed back (it is known), saving output tokens."""
+    explanation: str
+    score: float
+
+
+class ScoreOnlyFeatureEvaluation(BaseModel):
+    score: float
+
+
 class StatsFeatureEvaluation(BaseModel):
     evaluations: List[FeatureEvaluation]
     min_score: float
@@ -106,7 +191,7 @@ class FeaturesEvaluationResponse(BaseModel):
 
 
 def __log_retried_error(retry_state: RetryCallState) -> None:
-    pass
+    metrics.record_retry(retry_state.outcome.exception())
     # print(f"An error occurred (at attempt {retry_state.outcome.attempt_number}): {retry_state.outcome.exception()}")
 
 
@@ -124,23 +209,28 @@ def await_time_limit(time_limit):
 # - Have the second output in the structured rubric format based on the first output
 # (like authors have done in General Social Agent paper)
 async def generate_features(conversation: str, model: str, n_rubrics: int) -> List[Feature]:
-    rubrics = await asyncio.gather(*[
-        openrouter_client.responses.parse(
-            model=model,
-            input=[
-                {
-                    "role": "system",
-                    "content": RUBRIC_GENERATION_SYSTEM_PROMPT
-                },
-                {
-                    "role": "user",
-                    "content": f"Conversation:\n```\n{conversation}\n```"
-                }
-            ],
-            text_format=FeatureListModelResponse
-        )
-        for _ in range(n_rubrics)
-    ], return_exceptions=True)
+    backend, model_name = get_backend(model)
+
+    input = [
+        {
+            "role": "system",
+            "content": RUBRIC_GENERATION_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"Conversation:\n```\n{conversation}\n```"
+        }
+    ]
+
+    if constants.USE_MULTI_SAMPLE_REQUESTS:
+        # The `n_rubrics` rubrics are sampled from the same input, so the prompt is processed once (see `LLMBackend.parse_samples`)
+        rubrics = await backend.parse_samples(model=model_name, input=input, text_format=FeatureListModelResponse, n=n_rubrics)
+        rubrics = [_rubric if isinstance(_rubric, Exception) or _rubric.output_parsed is not None else ValueError("Unparsed rubric") for _rubric in rubrics]
+    else:
+        rubrics = await asyncio.gather(*[
+            backend.parse(model=model_name, input=input, text_format=FeatureListModelResponse)
+            for _ in range(n_rubrics)
+        ], return_exceptions=True)
 
     num_errors = len([_rubric for _rubric in rubrics if isinstance(_rubric, Exception)])
 
@@ -156,77 +246,288 @@ async def generate_features(conversation: str, model: str, n_rubrics: int) -> Li
     return [_rubric.output_parsed.features for _rubric in rubrics if not isinstance(_rubric, Exception)]
 
 
+def _features_json(features: List[Feature]) -> str:
+    """Features as a JSON list for the prompts (the same serialization as a single feature, not the pydantic repr)."""
+    return "[" + ", ".join(_feature.model_dump_json() for _feature in features) + "]"
+
+
+def _profile_instructions(instructions: List[str]) -> str:
+    return "".join(f"\n{_instruction}" for _instruction in instructions)
+
+
+def build_feature_match_input(conversation: str, feature: Feature, profile: ScoringProfile | None = None) -> List[Dict[str, str]]:
+    """Input of the scoring step 1 (free-form analysis of the conversation against the feature)."""
+    profile = profile or SCORING_PROFILES["full"]
+    instructions = []
+    if profile.max_analysis_tokens is not None:
+        instructions.append(f"Keep the analysis under {int(profile.max_analysis_tokens * 0.75)} words: only the strongest evidence and the main uncertainty.")
+
+    return [
+        {
+            "role": "system",
+            "content": FEATURE_MATCH_SYSTEM_PROMPT + _profile_instructions(instructions)
+        },
+        {
+            "role": "user",
+            "content": (
+                "Conversation:\n```\n"
+                f"{conversation}\n"
+                "```\n\n"
+                "Target feature (with min/max anchors):\n```\n"
+                f"{feature.model_dump_json()}\n"
+                "```"
+            )
+        }
+    ]
+
+
+def build_feature_scoring_input(conversation: str, feature: Feature, analysis: str | None, profile: ScoringProfile | None = None) -> List[Dict[str, str]]:
+    """Input of the scoring step 2 (final score, informed by the step 1 analysis when there is one)."""
+    profile = profile or SCORING_PROFILES["full"]
+    instructions = []
+    if not profile.use_explanation:
+        instructions.append("Only return the score, without explanation.")
+    elif profile.max_explanation_tokens is not None:
+        instructions.append(f"Keep the explanation under {int(profile.max_explanation_tokens * 0.75)} words, citing at most two short evidence spans.")
+
+    prior_analysis = "" if analysis is None else (
+        "Prior analysis of the conversation and the feature (to inform your scoring):\n```\n"
+        f"{analysis}\n"
+        "```\n\n"
+        "Using the prior analysis as a guide (you may disagree with justification), now provide the final score and explanation for this feature."
+    )
+
+    return [
+        {
+            "role": "system",
+            "content": RUBRIC_EVALUATION_SYSTEM_PROMPT + _profile_instructions(instructions)
+        },
+        {
+            "role": "user",
+            "content": (
+                "Conversation:\n```\n"
+                f"{conversation}\n"
+                "```\n\n"
+                "Feature:\n```\n"
+                f"{feature.model_dump_json()}\n"
+                "```"
+                + ("\n\n" + prior_analysis if prior_analysis else "")
+            )
+        }
+    ]
+
+
+def scoring_output_format(profile: ScoringProfile) -> tuple[Type[BaseModel], int | None]:
+    """Response model and `max_output_tokens` of the scoring step 2 (the lean profiles do not ask the model to echo the feature back)."""
+    if not profile.use_explanation:
+        return ScoreOnlyFeatureEvaluation, _SCORING_OUTPUT_TOKENS_OVERHEAD
+    if profile.max_explanation_tokens is not None:
+        return LeanFeatureEvaluation, profile.max_explanation_tokens + _SCORING_OUTPUT_TOKENS_OVERHEAD
+    return FeatureEvaluation, None
+
+
+def _as_feature(feature: BaseModel) -> Feature:
+    # Banks of other shapes (e.g. `HandCraftedFeature`, `Pers16Feature` in `evaluate_handcrafted.py`) are scored too
+    if isinstance(feature, Feature):
+        return feature
+    return Feature(
+        name=feature.name,
+        description=getattr(feature, "description", ""),
+        description_min_value=getattr(feature, "description_min_score", getattr(feature, "descriptors_of_low_range", "")),
+        description_max_value=getattr(feature, "description_max_score", getattr(feature, "descriptors_of_high_range", "")),
+    )
+
+
+def as_feature_evaluation(output: BaseModel, feature: Feature) -> FeatureEvaluation:
+    """`FeatureEvaluation` from any of the `scoring_output_format` response models."""
+    if isinstance(output, FeatureEvaluation):
+        return output
+    return FeatureEvaluation(feature=_as_feature(feature), explanation=getattr(output, "explanation", ""), score=output.score)
+
+
+def verify_evidence(evaluation: FeatureEvaluation, conversation: str, mode: str | None = None) -> FeatureEvaluation:
+    """
+    Check the evidence spans quoted in the explanation, flag or reject the evaluation if they are fabricated
+    (`mode` defaults to `constants.EVIDENCE_VERIFICATION`).
+    """
+
+    mode = mode or constants.EVIDENCE_VERIFICATION
+    if mode == "off":
+        return evaluation
+
+    check = evidence.check_explanation(evaluation.explanation, conversation)
+    metrics.record_evidence_check(check.verified)
+    if check.verified:
+        return evaluation
+
+    if mode == "drop":
+        raise evidence.FabricatedEvidenceError(f"{check.num_spans - check.num_verified}/{check.num_spans} evidence span(s) not found in the conversation: {check.unverified_spans}")
+    return evaluation.model_copy(update={"explanation": evidence.UNVERIFIED_PREFIX + evaluation.explanation})
+
+
+def _to_feature_evaluation(output: BaseModel | None, feature: Feature, model: str) -> FeatureEvaluation:
+    if output is None:
+        raise ValueError(f"No output from model {model} for feature {feature.name}")
+    return as_feature_evaluation(output, feature)
+
+
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), reraise=True, sleep=asyncio.sleep, before_sleep=__log_retried_error)
-async def __evaluate_single_feature_score(conversation: str, feature: Feature, model: str) -> FeatureEvaluation:
+async def __evaluate_single_feature_score(conversation: str, feature: Feature, model: str, profile: ScoringProfile | None = None) -> FeatureEvaluation:
+    backend, model_name = get_backend(model)
+    profile = profile or SCORING_PROFILES[constants.SCORING_PROFILE]
+
+    text_format, max_output_tokens = scoring_output_format(profile)
+
     async with _api_semaphore:
 
         # Step 1: Analyze match strength between the conversation and the feature axis
-        async with asyncio.timeout(60):
-            match_response = await openrouter_client.responses.create(
-                model=model,
-                temperature=0.7,
-                input=[
-                    {
-                        "role": "system",
-                        "content": FEATURE_MATCH_SYSTEM_PROMPT
-                    },
-                    {
-                        "role": "user",
-                        "content": (
-                            "Conversation:\n```\n"
-                            f"{conversation}\n"
-                            "```\n\n"
-                            "Target feature (with min/max anchors):\n```\n"
-                            f"{feature}\n"
-                            "```"
-                        )
-                    }
-                ],
-                timeout=60.0,
-            )
+        analysis = None
+        if profile.use_analysis:
+            metrics.record_request()
+            started_at = time.monotonic()
+            async with asyncio.timeout(60):
+                match_response = await _hedged(f"{model}:analysis", lambda: backend.create(
+                    model=model_name,
+                    temperature=FEATURE_MATCH_TEMPERATURE,
+                    input=build_feature_match_input(conversation, feature, profile),
+                    timeout=60.0,
+                    max_output_tokens=profile.max_analysis_tokens,
+                ))
+            metrics.record_usage(model, match_response.usage, time.monotonic() - started_at)
+            analysis = match_response.output_text
 
         # Step 2: Produce the final feature score using the prior analysis as context
+        metrics.record_request()
+        started_at = time.monotonic()
         async with asyncio.timeout(60):
-            scoring_response = await openrouter_client.responses.parse(
-                model=model,
-                temperature=1.0,
-                input=[
-                    {
-                        "role": "system",
-                        "content": RUBRIC_EVALUATION_SYSTEM_PROMPT
-                    },
-                    {
-                        "role": "user",
-                        "content": (
-                            "Conversation:\n```\n"
-                            f"{conversation}\n"
-                            "```\n\n"
-                            "Feature:\n```\n"
-                            f"{feature}\n"
-                            "```\n\n"
-                            "Prior analysis of the conversation and the feature (to inform your scoring):\n```\n"
-                            f"{match_response.output_text}\n"
-                            "```\n\n"
-                            "Using the prior analysis as a guide (you may disagree with justification), now provide the final score and explanation for this feature."
-                        )
-                    }
-                ],
-                text_format=FeatureEvaluation,
+            scoring_response = await _hedged(f"{model}:scoring", lambda: backend.parse(
+                model=model_name,
+                temperature=FEATURE_SCORING_TEMPERATURE,
+                input=build_feature_scoring_input(conversation, feature, analysis, profile),
+                text_format=text_format,
                 timeout=60.0,
-            )
+                max_output_tokens=max_output_tokens,
+            ))
+        metrics.record_usage(model, scoring_response.usage, time.monotonic() - started_at)
+
+    return verify_evidence(_to_feature_evaluation(scoring_response.output_parsed, feature, model), conversation)
+
+
+async def __sample_feature_scores(conversation: str, feature: Feature, model: str, num_samples: int, profile: ScoringProfile) -> tuple[List[FeatureEvaluation], List[Exception]]:
+    """
+    One round of `num_samples` scores sampled together, so the shared prompt is paid once (see
+    `LLMBackend.create_samples`). Every provider request holds its own `_api_semaphore` slot, is hedged and timed out
+    on its own. Returns the valid evaluations and the errors of the failed (or rejected) samples.
+    """
+    backend, model_name = get_backend(model)
+    profile = profile or SCORING_PROFILES[constants.SCORING_PROFILE]
+    text_format, max_output_tokens = scoring_output_format(profile)
+    errors = []
+
+    # Step 1: `num_samples` analyses from a single request (or one request per sample, see `_fan_out`)
+    analyses: List[str | None] = [None]
+    if profile.use_analysis:
+        started_at = time.monotonic()
+        match_responses = await backend.create_samples(
+            model=model_name,
+            temperature=FEATURE_MATCH_TEMPERATURE,
+            input=build_feature_match_input(conversation, feature, profile),
+            n=num_samples,
+            timeout=60.0,
+            max_output_tokens=profile.max_analysis_tokens,
+            gate=lambda make_call: _gated(f"{model}:analysis", make_call),
+        )
+        errors += [_response for _response in match_responses if isinstance(_response, Exception)]
+        match_responses = [_response for _response in match_responses if not isinstance(_response, Exception)]
+        for _response in match_responses:
+            metrics.record_request()
+            metrics.record_usage(model, _response.usage, time.monotonic() - started_at)
+        analyses = [_response.output_text for _response in match_responses]
+
+    # Step 2: each analysis makes a different input (sharing the conversation and feature prefix, cached by the provider
+    # after the first call), without analysis the `num_samples` scores share the same input and are sampled together
+    started_at = time.monotonic()
+    if profile.use_analysis:
+        def _score(analysis: str) -> Awaitable[Any]:
+            return _gated(f"{model}:scoring", lambda: backend.parse(
+                model=model_name,
+                temperature=FEATURE_SCORING_TEMPERATURE,
+                input=build_feature_scoring_input(conversation, feature, analysis, profile),
+                text_format=text_format,
+                timeout=60.0,
+                max_output_tokens=max_output_tokens,
+            ))
+
+        scoring_responses = await asyncio.gather(*[_score(analysis) for analysis in analyses[:1]], return_exceptions=True)
+        scoring_responses += await asyncio.gather(*[_score(analysis) for analysis in analyses[1:]], return_exceptions=True)
+    else:
+        scoring_responses = await backend.parse_samples(
+            model=model_name,
+            temperature=FEATURE_SCORING_TEMPERATURE,
+            input=build_feature_scoring_input(conversation, feature, None, profile),
+            text_format=text_format,
+            n=num_samples,
+            timeout=60.0,
+            max_output_tokens=max_output_tokens,
+            gate=lambda make_call: _gated(f"{model}:scoring", make_call),
+        )
 
-    final_output = scoring_response.output_parsed
+    evaluations = []
+    for _response in scoring_responses:
+        if isinstance(_response, Exception):
+            errors.append(_response)
+            continue
 
-    if final_output is None:
-        raise ValueError(f"No output from model {model} for feature {feature.name}")
+        metrics.record_request()
+        metrics.record_usage(model, _response.usage, time.monotonic() - started_at)
+        try:
+            evaluations.append(verify_evidence(_to_feature_evaluation(_response.output_parsed, feature, model), conversation))
+        except ValueError as _error:
+            errors.append(_error)
 
-    return final_output
+    return evaluations, errors
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), reraise=True, sleep=asyncio.sleep, before_sleep=__log_retried_error)
-async def __evaluate_features_scores(conversation: str, features: List[Feature], model: str) -> List[FeatureEvaluation]:
+async def __evaluate_feature_score_samples(conversation: str, feature: Feature, model: str, num_samples: int, profile: ScoringProfile | None = None) -> List[FeatureEvaluation]:
+    """
+    `num_samples` independent scores of the feature, sampled together (see `__sample_feature_scores`). Failed samples,
+    and samples rejected for fabricated evidence, are re-sampled for up to `MAX_RESAMPLING_ROUNDS` more rounds; the call
+    fails only if no sample is valid.
+    """
+    profile = profile or SCORING_PROFILES[constants.SCORING_PROFILE]
+
+    evaluations, errors = [], []
+    for _ in range(1 + MAX_RESAMPLING_ROUNDS):
+        round_evaluations, round_errors = await __sample_feature_scores(conversation, feature, model, num_samples - len(evaluations), profile)
+        evaluations += round_evaluations
+        errors += round_errors
+        if len(evaluations) == num_samples:
+            break
+
+    if len(evaluations) == 0:
+        raise errors[0]
+
+    for _error in errors:
+        metrics.record_error(_error)
+
+    return evaluations
+
+
+async def evaluate_single_feature_score(conversation: str, feature: Feature, model: str, profile: ScoringProfile | None = None) -> FeatureEvaluation:
+    """One (retried) scoring call, for schedulers living outside this module (score store, work queues)."""
+    return await __evaluate_single_feature_score(conversation, feature, model, profile)
+
+
+async def evaluate_feature_score_samples(conversation: str, feature: Feature, model: str, num_samples: int, profile: ScoringProfile | None = None) -> List[FeatureEvaluation]:
+    """`num_samples` scores sampled together (see `__evaluate_feature_score_samples`), for schedulers living outside this module."""
+    return await __evaluate_feature_score_samples(conversation, feature, model, num_samples, profile)
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), reraise=True, sleep=asyncio.sleep, before_sleep=__log_retried_error)
+async def __evaluate_features_scores(conversation: str, features: List[Feature], model: str, profile: ScoringProfile | None = None) -> List[FeatureEvaluation]:
     tasks = [
-        asyncio.create_task(__evaluate_single_feature_score(conversation, _feature, model))
+        asyncio.create_task(__evaluate_single_feature_score(conversation, _feature, model, profile))
         for _feature in features
     ]
 
@@ -237,18 +538,27 @@ async def __evaluate_features_scores(conversation: str, features: List[Feature],
             result = await future
             outputs.append(result)
         except Exception as _error:
+            metrics.record_error(_error)
             print(f"Error while evaluating feature scores: {_error=}, {type(_error)=}")
 
     return outputs
 
 
-async def evaluate_features_scores(conversation: str, features: List[Feature], models: List[str], num_evaluations_per_model: int) -> List[StatsFeatureEvaluation]:
+async def evaluate_features_scores(conversation: str, features: List[Feature], models: List[str], num_evaluations_per_model: int, profile: ScoringProfile | None = None) -> List[StatsFeatureEvaluation]:
 
-    tasks = [
-        asyncio.create_task(__evaluate_features_scores(conversation, features, model=_model_name))
-        for _model_name in models
-        for _ in range(num_evaluations_per_model)
-    ]
+    if constants.USE_MULTI_SAMPLE_REQUESTS:
+        # The `num_evaluations_per_model` repeats of a feature are sampled together
+        tasks = [
+            asyncio.create_task(__evaluate_feature_score_samples(conversation, _feature, _model_name, num_evaluations_per_model, profile))
+            for _model_name in models
+            for _feature in features
+        ]
+    else:
+        tasks = [
+            asyncio.create_task(__evaluate_features_scores(conversation, features, model=_model_name, profile=profile))
+            for _model_name in models
+            for _ in range(num_evaluations_per_model)
+        ]
 
     pbar = tqdm(total=len(tasks), desc="Evaluating features scores (models x eval)", leave=False)
     evaluated_batches: List[List[FeatureEvaluation]] = []
@@ -312,31 +622,100 @@ async def evaluate_features_scores(conversation: str, features: List[Feature], m
     return sorted(output, key=lambda x: x.standard_deviation)
 
 
-async def evaluate_features_scores_across_conversations(conversations: List[str], features: List[Feature], models: List[str], num_evaluations_per_model: int) -> List[StatsFeatureEvaluation]:
-
-    evaluations: Dict[str, List[FeatureEvaluation]] = {feature.name: [] for feature in features}
-
-    coroutines = [
-        evaluate_features_scores(
-            "\n".join([segment for segment in batch]),
-            features,
-            models,
-            num_evaluations_per_model=num_evaluations_per_model
-        )
-        for batch in conversations
-    ]
+async def evaluate_features_scores_per_conversation(
+    conversations: List[List[str]],
+    features: List[Feature],
+    models: List[str],
+    num_evaluations_per_model: int,
+    priorities: List[int] | None = None,
+    on_conversation_done: Callable[[int, List[StatsFeatureEvaluation]], None] | None = None,
+    profile: ScoringProfile | None = None,
+) -> List[List[StatsFeatureEvaluation]]:
+    """
+    Same as `evaluate_features_scores_across_conversations` but keeps the stats of each conversation apart (in input order).
+
+    The (conversation, feature, model, repeat) calls are scheduled through a bounded work queue with a fixed pool of
+    `constants.SEMAPHORE_MAX_CONCURRENCY` workers. Only a window of conversations, just large enough to keep the workers
+    busy, is in flight at once (admitted by ascending `priorities` value, a new one when one completes), with their calls
+    interleaved. `on_conversation_done(index, stats)` is called as soon as a conversation has all its scores, so results
+    flow steadily before the whole dataset is evaluated.
+    """
+
+    num_calls_per_conversation = num_evaluations_per_model * len(models) * len(features)
+    remaining_calls = [num_calls_per_conversation for _ in conversations]
+    evaluations: List[Dict[str, List[FeatureEvaluation]]] = [{} for _ in conversations]
+    joined_conversations: Dict[int, str] = {} # only for conversations with calls in flight
+    outputs: List[List[StatsFeatureEvaluation]] = [[] for _ in conversations]
+
+    def _conversation_items(index: int):
+        priority = priorities[index] if priorities is not None else 0
+        if constants.USE_MULTI_SAMPLE_REQUESTS:
+            # The repeats of a (feature, model) are sampled together
+            for _model_name in models:
+                for _feature in features:
+                    yield priority, (index, _feature, _model_name, num_evaluations_per_model)
+        else:
+            for _ in range(num_evaluations_per_model):
+                for _model_name in models:
+                    for _feature in features:
+                        yield priority, (index, _feature, _model_name, 1)
+
+    async def _evaluate(payload: tuple[int, Feature, str, int]) -> List[FeatureEvaluation]:
+        index, feature, model_name, num_samples = payload
+        if index not in joined_conversations:
+            joined_conversations[index] = "\n".join([segment for segment in conversations[index]])
+
+        if num_samples > 1:
+            return await __evaluate_feature_score_samples(joined_conversations[index], feature, model_name, num_samples, profile)
+        return [await __evaluate_single_feature_score(joined_conversations[index], feature, model_name, profile)]
+
+    pbar = tqdm(total=num_calls_per_conversation * len(conversations), desc="Evaluating features scores across conversations", leave=False)
+
+    def _on_result(payload: tuple[int, Feature, str, int], feature_evaluations: List[FeatureEvaluation] | None, error: Exception | None) -> None:
+        index, num_samples = payload[0], payload[3]
+        pbar.update(num_samples)
+
+        if error is not None:
+            metrics.record_error(error)
+            print(f"Error while evaluating feature scores: {error=}, {type(error)=}")
+        else:
+            for evaluation in feature_evaluations:
+                evaluations[index].setdefault(evaluation.feature.name, []).append(evaluation)
+
+        remaining_calls[index] -= num_samples
+        if remaining_calls[index] == 0:
+            window.release()
+            joined_conversations.pop(index, None)
+            outputs[index] = aggregate_features_evaluations(evaluations[index])
+            evaluations[index] = {}
+            if on_conversation_done is not None:
+                on_conversation_done(index, outputs[index])
+
+    # Enough conversations to fill the workers and their queue, plus one to overlap with the tail of the others
+    num_items_per_conversation = len(models) * len(features) * (1 if constants.USE_MULTI_SAMPLE_REQUESTS else num_evaluations_per_model)
+    window = work_queue.AdmissionWindow(
+        [_conversation_items(index) for index in range(len(conversations))],
+        order=sorted(range(len(conversations)), key=lambda index: priorities[index] if priorities is not None else 0),
+        size=math.ceil(3 * constants.SEMAPHORE_MAX_CONCURRENCY / max(num_items_per_conversation, 1)) + 1,
+    )
 
-    pbar = tqdm(total=len(coroutines), desc="Evaluating features scores across conversations", leave=False)
-    for _coroutine in asyncio.as_completed(coroutines):
-        batch = await _coroutine
+    await work_queue.run_work_queue(
+        window,
+        _evaluate,
+        _on_result,
+        num_workers=constants.SEMAPHORE_MAX_CONCURRENCY,
+    )
 
-        for _feature_evaluation in batch:
-            evaluations[_feature_evaluation.evaluations[0].feature.name].extend(_feature_evaluation.evaluations)
+    return outputs
 
-        pbar.update(1)
 
+def aggregate_features_evaluations(evaluations: Dict[str, List[FeatureEvaluation]]) -> List[StatsFeatureEvaluation]:
     stats = []
-    for feature_evaluations in evaluations.values():
+    for feature_name, feature_evaluations in evaluations.items():
+
+        if len(feature_evaluations) < 2:
+            print(f"Skipping feature '{feature_name}' because not enough evaluations. (Need at least 2 evaluations)")
+            continue
 
         stats.append(StatsFeatureEvaluation(
             evaluations=feature_evaluations,
@@ -351,10 +730,27 @@ async def evaluate_features_scores_across_conversations(conversations: List[str]
     return sorted(stats, key=lambda x: x.standard_deviation)
 
 
+def merge_conversations_stats(per_conversation_stats: List[List[StatsFeatureEvaluation]], features: List[Feature]) -> List[StatsFeatureEvaluation]:
+    evaluations: Dict[str, List[FeatureEvaluation]] = {feature.name: [] for feature in features}
+
+    for batch in per_conversation_stats:
+        for _feature_evaluation in batch:
+            evaluations.setdefault(_feature_evaluation.evaluations[0].feature.name, []).extend(_feature_evaluation.evaluations)
+
+    return aggregate_features_evaluations(evaluations)
+
+
+async def evaluate_features_scores_across_conversations(conversations: List[List[str]], features: List[Feature], models: List[str], num_evaluations_per_model: int, profile: ScoringProfile | None = None) -> List[StatsFeatureEvaluation]:
+    per_conversation_stats = await evaluate_features_scores_per_conversation(conversations, features, models, num_evaluations_per_model, profile=profile)
+    return merge_conversations_stats(per_conversation_stats, features)
+
+
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), reraise=True, sleep=asyncio.sleep, before_sleep=__log_retried_error)
-async def merge_similar_features(features: List[Feature], model: str = "openai/gpt-4.1") -> List[Feature]:
-    response = await openrouter_client.responses.parse(
-        model=model,
+async def merge_similar_features(features: List[Feature], model: str = constants.STAGE_MODELS["merge_similar_features"]) -> List[Feature]:
+    backend, model_name = get_backend(model)
+
+    response = await backend.parse(
+        model=model_name,
         input=[
             {
                 "role": "system",
@@ -362,7 +758,7 @@ async def merge_similar_features(features: List[Feature], model: str = "openai/g
             },
             {
                 "role": "user",
-                "content": f"Features:\n```\n{features}\n```"
+                "content": f"Features:\n```\n{_features_json(features)}\n```"
             }
         ],
         text_format=FeatureListModelResponse
@@ -371,7 +767,7 @@ async def merge_similar_features(features: List[Feature], model: str = "openai/g
     return response.output_parsed.features
 
 
-async def filter_features_candidates_against_bank(candidates: List[Feature], bank: List[Feature], model: str = "openai/gpt-4.1") -> List[Feature]:
+async def filter_features_candidates_against_bank(candidates: List[Feature], bank: List[Feature], model: str = constants.STAGE_MODELS["filter_features_candidates_against_bank"]) -> List[Feature]:
 
     if len(candidates) == 0:
         return []
@@ -379,8 +775,10 @@ async def filter_features_candidates_against_bank(candidates: List[Feature], ban
     if len(bank) == 0:
         return candidates
 
-    response = await openrouter_client.responses.parse(
-        model=model,
+    backend, model_name = get_backend(model)
+
+    response = await backend.parse(
+        model=model_name,
         input=[
             {
                 "role": "system",
@@ -390,10 +788,10 @@ async def filter_features_candidates_against_bank(candidates: List[Feature], ban
                 "role": "user",
                 "content": (
                     "Bank features:\n```\n"
-                    f"{bank}\n"
+                    f"{_features_json(bank)}\n"
                     "```\n\n"
                     "Candidate features:\n```\n"
-                    f"{candidates}\n"
+                    f"{_features_json(candidates)}\n"
                     "```"
                 )
             }
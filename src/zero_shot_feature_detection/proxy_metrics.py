@@ -0,0 +1,387 @@
+"""
+Text-statistics proxies of the hand-crafted features (see `HandCraftedFeature.proxy_metric` in `evaluate_handcrafted.py`).
+
+Each conversation batch is tokenized once (lower-cased words and sentences). The word lexicons are counted in the
+same pass over the tokens (set lookups of the 1 to 4-grams starting at each token), the few character patterns
+(numerals, punctuation...) with one regex each. The counts of all the batches form a (batches x counts) matrix, from
+which every proxy is derived with vectorized operations.
+
+`main()` scores the same batches with the LLM, writes the proxies next to the LLM scores, and reports the correlation
+of each feature with its proxies: a proxy that strongly agrees with the LLM can replace the scoring calls of its feature.
+"""
+
+import os
+import re
+import sys
+import json
+import model
+import asyncio
+import correlation
+import numpy as np
+
+from typing import Dict, List
+from pydantic import BaseModel
+from constants import MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+
+MAX_BATCHES_PER_DATASET = 5
+DATASETS = ["jess_lee", "dara", "thytu", "huberman_lab", "crucible_moments"]
+
+AGREEMENT_THRESHOLD = 0.7 # |Spearman| from which a proxy is considered to agree with the LLM scores
+MATTR_WINDOW = 50
+
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)*")
+_SENTENCE_PATTERN = re.compile(r"[^.!?\n]+[.!?]*")
+
+
+class Lexicon(BaseModel):
+    phrases: List[tuple[str, ...]] # word sequences, matched on the tokens of each sentence
+    symbols: List[str] = [] # non-word entries (e.g. "%"), counted anywhere in the text, also right after a digit
+
+
+def _lexicon(*entries: str) -> Lexicon:
+    phrases, symbols = [], []
+    for entry in entries:
+        words = tuple(_WORD_PATTERN.findall(entry))
+        if " ".join(words) == entry:
+            phrases.append(words)
+        else:
+            symbols.append(entry)
+    return Lexicon(phrases=phrases, symbols=symbols)
+
+
+# Word lexicons, counted on the tokens of each batch
+LEXICONS: Dict[str, Lexicon] = {
+    "discourse_markers": _lexicon(
+        "first", "firstly", "second", "secondly", "third", "then", "next", "finally", "lastly", "because", "therefore",
+        "thus", "hence", "so that", "however", "moreover", "furthermore", "in addition", "for example", "for instance",
+        "in other words", "as a result", "consequently", "in conclusion", "to summarize", "on the other hand",
+    ),
+    "units": _lexicon(
+        "percent", "%", "dollars", "euros", "km", "kg", "mb", "gb", "hours", "minutes", "seconds", "days", "weeks",
+        "months", "years", "miles", "meters", "pounds", "grams", "million", "billion", "thousand", "hundred",
+    ),
+    "dates": _lexicon(
+        "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday", "january", "february", "march",
+        "april", "june", "july", "august", "september", "october", "november", "december", "yesterday", "tomorrow",
+        "today", "last week", "next week", "last year", "next year",
+    ),
+    "hedges": _lexicon(
+        "might", "maybe", "perhaps", "possibly", "probably", "somewhat", "seems", "seem", "appears", "appear",
+        "i think", "i guess", "i suppose", "sort of", "kind of", "tend to", "suggests", "arguably", "potentially",
+        "likely", "not sure", "could be",
+    ),
+    "boosters": _lexicon(
+        "clearly", "obviously", "definitely", "certainly", "undoubtedly", "always", "never", "shows", "demonstrates",
+        "proves", "of course", "without a doubt", "in fact", "sure", "absolutely", "must",
+    ),
+    "empathy_markers": _lexicon(
+        "i understand", "i see", "makes sense", "that makes sense", "thanks", "thank you", "i appreciate", "sorry",
+        "i hear you", "i feel you", "that sounds", "good point", "fair enough", "no worries", "glad",
+    ),
+    "politeness_markers": _lexicon("please", "could you", "would you", "would", "could", "kindly", "if you don't mind", "may i"),
+    "second_person": _lexicon("you", "your", "yours", "yourself", "yourselves", "you're", "you've", "you'll", "you'd"),
+    "first_person_singular": _lexicon("i", "me", "my", "mine", "myself", "i'm", "i've", "i'll", "i'd"),
+    "first_person_plural": _lexicon("we", "us", "our", "ours", "ourselves", "we're", "we've", "we'll", "we'd"),
+    "intensifiers": _lexicon(
+        "very", "really", "so much", "extremely", "absolutely", "incredibly", "completely", "totally", "super",
+        "truly", "highly", "deeply",
+    ),
+    "fillers": _lexicon("uh", "um", "hmm", "er", "like", "you know", "i mean", "well", "okay", "ok", "right", "actually", "basically", "anyway", "wait"),
+    "contrast_markers": _lexicon(
+        "however", "although", "though", "while", "yet", "but", "whereas", "depends on", "it depends", "in some cases",
+        "on the other hand", "to be fair", "that said", "nevertheless",
+    ),
+    "analogy_markers": _lexicon("like a", "as if", "as though", "similar to", "resembles", "reminds me of", "imagine", "picture this", "just as", "it's like"),
+}
+
+# Character patterns, counted on the lower-cased text of each batch
+PATTERNS: Dict[str, re.Pattern] = {
+    "numerals": re.compile(r"(?<![\w.])\d+(?:[.,:/]\d+)*(?:st|nd|rd|th|%|k|m|x)?(?![\w])"),
+    "contractions": re.compile(r"(?<=\w)'(?:s|re|ve|ll|d|m|t)(?![\w'])|(?<=\w)n't(?![\w'])"),
+    "exclamations": re.compile(r"!+"),
+    "parentheticals": re.compile(r"\([^()]*\)|\s[-–—]{1,2}\s|—|\.\.\.|…"),
+}
+
+# Phrase -> lexicons containing it, so all the lexicons are matched with one lookup per n-gram
+_PHRASE_LEXICONS: Dict[tuple[str, ...], List[str]] = {}
+for _name, _lexicon_entries in LEXICONS.items():
+    for _phrase in _lexicon_entries.phrases:
+        _PHRASE_LEXICONS.setdefault(_phrase, []).append(_name)
+_MAX_PHRASE_LENGTH = max(len(_phrase) for _phrase in _PHRASE_LEXICONS)
+
+PROXIES = [
+    "discourse_markers_per_1k",
+    "transition_sentences_share",
+    "concrete_tokens_per_1k",
+    "hedge_share",
+    "hedges_per_1k",
+    "boosters_per_1k",
+    "empathy_markers_per_1k",
+    "politeness_markers_per_1k",
+    "second_person_per_100",
+    "first_person_per_100",
+    "first_person_plural_share",
+    "mean_sentence_length",
+    "sentence_length_cv",
+    "trigram_repetition",
+    "type_token_ratio",
+    "mattr",
+    "mean_word_length",
+    "contractions_per_1k",
+    "intensifiers_per_1k",
+    "exclamations_per_1k",
+    "fillers_per_1k",
+    "contrast_markers_per_1k",
+    "analogy_markers_per_1k",
+    "parentheticals_per_1k",
+]
+
+# Hand-crafted feature name -> proxies implementing (part of) its `proxy_metric`
+FEATURE_PROXIES: Dict[str, List[str]] = {
+    # feature_set_1
+    "Clarity & Coherence": ["discourse_markers_per_1k", "transition_sentences_share"],
+    "Concreteness": ["concrete_tokens_per_1k"],
+    "Confidence / Hedging": ["hedge_share", "hedges_per_1k", "boosters_per_1k"],
+    "Warmth / Empathy": ["empathy_markers_per_1k", "second_person_per_100", "politeness_markers_per_1k"],
+    "Brevity / Verbosity": ["mean_sentence_length", "trigram_repetition"],
+    "Lexical Richness": ["mattr", "type_token_ratio"],
+    "Formality / Register": ["contractions_per_1k", "fillers_per_1k", "mean_word_length"],
+    "Emotional Tone & Energy": ["intensifiers_per_1k", "exclamations_per_1k"],
+    "Spontaneity": ["fillers_per_1k", "parentheticals_per_1k"],
+    # feature_set_2
+    "Sentence Length Variability": ["sentence_length_cv"],
+    "Lexical Diversity": ["mattr", "type_token_ratio"],
+    "Register Formality": ["contractions_per_1k", "mean_word_length"],
+    "Directness": ["hedges_per_1k", "hedge_share"],
+    "Emotional Expressiveness": ["exclamations_per_1k", "intensifiers_per_1k"],
+    "Self-Reference Frequency": ["first_person_per_100", "first_person_plural_share"],
+    "Nuance Acknowledgment": ["contrast_markers_per_1k", "hedges_per_1k"],
+    "Analogical Thinking": ["analogy_markers_per_1k"],
+    "Digression Tendency": ["parentheticals_per_1k"],
+}
+
+
+class TokenizedBatch(BaseModel):
+    text: str # lower-cased
+    words: List[str]
+    sentence_lengths: List[int] # in words
+    num_transition_sentences: int
+    counts: Dict[str, int] # occurrences of each of the `LEXICONS` and `PATTERNS`
+
+
+def count_phrases(words: List[str], counts: Dict[str, int]) -> None:
+    """
+    Add the occurrences of every lexicon in `words` to `counts`. Like a regex alternation sorted by length, the
+    longest phrase starting at a token is matched first ("i think" before "i"), and the matches of a lexicon do not overlap.
+    """
+
+    next_free_index = dict.fromkeys(LEXICONS, 0)
+    for start in range(len(words)):
+        for length in range(min(_MAX_PHRASE_LENGTH, len(words) - start), 0, -1):
+            for name in _PHRASE_LEXICONS.get(tuple(words[start:start + length]), []):
+                if next_free_index[name] <= start:
+                    counts[name] += 1
+                    next_free_index[name] = start + length
+
+
+def tokenize(batch: List[str]) -> TokenizedBatch:
+    text = "\n".join(batch).lower().replace("’", "'")
+    sentences = [sentence for sentence in _SENTENCE_PATTERN.findall(text) if _WORD_PATTERN.search(sentence)]
+    tokenized_sentences = [_WORD_PATTERN.findall(sentence) for sentence in sentences]
+
+    # NOTE: phrases are matched within a sentence, so a transition sentence is one with a discourse marker of its own
+    counts = dict.fromkeys(LEXICONS, 0)
+    num_transition_sentences = 0
+    for sentence in tokenized_sentences:
+        num_discourse_markers = counts["discourse_markers"]
+        count_phrases(sentence, counts)
+        num_transition_sentences += int(counts["discourse_markers"] > num_discourse_markers)
+
+    for name, lexicon in LEXICONS.items():
+        counts[name] += sum(text.count(symbol) for symbol in lexicon.symbols)
+    for name, pattern in PATTERNS.items():
+        counts[name] = len(pattern.findall(text))
+
+    return TokenizedBatch(
+        text=text,
+        words=[word for sentence in tokenized_sentences for word in sentence],
+        sentence_lengths=[len(sentence) for sentence in tokenized_sentences],
+        num_transition_sentences=num_transition_sentences,
+        counts=counts,
+    )
+
+
+def _trigram_repetition(words: List[str]) -> float:
+    trigrams = list(zip(words, words[1:], words[2:]))
+    return 1.0 - len(set(trigrams)) / len(trigrams) if len(trigrams) > 0 else 0.0
+
+
+def _mattr(words: List[str], window: int = MATTR_WINDOW) -> float:
+    # Moving-average type-token ratio, less sensitive to the length of the batch than the plain TTR
+    if len(words) <= window:
+        return len(set(words)) / len(words) if len(words) > 0 else 0.0
+
+    counts: Dict[str, int] = {}
+    for word in words[:window]:
+        counts[word] = counts.get(word, 0) + 1
+
+    ratios = [len(counts)]
+    for old_word, new_word in zip(words, words[window:]):
+        counts[old_word] -= 1
+        if counts[old_word] == 0:
+            del counts[old_word]
+        counts[new_word] = counts.get(new_word, 0) + 1
+        ratios.append(len(counts))
+
+    return float(np.mean(ratios)) / window
+
+
+def compute_proxies(batches: List[List[str]]) -> np.ndarray:
+    """(batches x `PROXIES`) matrix of the proxy values of each batch."""
+
+    tokenized = [tokenize(batch) for batch in batches]
+
+    count = {name: np.array([batch.counts[name] for batch in tokenized], dtype=float) for name in [*LEXICONS, *PATTERNS]}
+
+    num_words = np.array([len(batch.words) for batch in tokenized], dtype=float)
+    num_sentences = np.array([len(batch.sentence_lengths) for batch in tokenized], dtype=float)
+    sentence_length_std = np.array([np.std(batch.sentence_lengths) if len(batch.sentence_lengths) > 0 else 0.0 for batch in tokenized])
+    num_characters = np.array([sum(len(word) for word in batch.words) for batch in tokenized], dtype=float)
+    num_types = np.array([len(set(batch.words)) for batch in tokenized], dtype=float)
+    num_transition_sentences = np.array([batch.num_transition_sentences for batch in tokenized], dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_1k = 1000.0 / num_words
+        mean_sentence_length = num_words / num_sentences
+        first_person = count["first_person_singular"] + count["first_person_plural"]
+
+        proxies = {
+            "discourse_markers_per_1k": count["discourse_markers"] * per_1k,
+            "transition_sentences_share": num_transition_sentences / num_sentences,
+            "concrete_tokens_per_1k": (count["numerals"] + count["units"] + count["dates"]) * per_1k,
+            "hedge_share": count["hedges"] / (count["hedges"] + count["boosters"]),
+            "hedges_per_1k": count["hedges"] * per_1k,
+            "boosters_per_1k": count["boosters"] * per_1k,
+            "empathy_markers_per_1k": count["empathy_markers"] * per_1k,
+            "politeness_markers_per_1k": count["politeness_markers"] * per_1k,
+            "second_person_per_100": count["second_person"] * per_1k / 10,
+            "first_person_per_100": first_person * per_1k / 10,
+            "first_person_plural_share": count["first_person_plural"] / first_person,
+            "mean_sentence_length": mean_sentence_length,
+            "sentence_length_cv": sentence_length_std / mean_sentence_length,
+            "trigram_repetition": np.array([_trigram_repetition(batch.words) for batch in tokenized]),
+            "type_token_ratio": num_types / num_words,
+            "mattr": np.array([_mattr(batch.words) for batch in tokenized]),
+            "mean_word_length": num_characters / num_words,
+            "contractions_per_1k": count["contractions"] * per_1k,
+            "intensifiers_per_1k": count["intensifiers"] * per_1k,
+            "exclamations_per_1k": count["exclamations"] * per_1k,
+            "fillers_per_1k": count["fillers"] * per_1k,
+            "contrast_markers_per_1k": count["contrast_markers"] * per_1k,
+            "analogy_markers_per_1k": count["analogy_markers"] * per_1k,
+            "parentheticals_per_1k": count["parentheticals"] * per_1k,
+        }
+
+    # NOTE: undefined ratios (empty batch, no hedge nor booster...) are kept as NaN and ignored by the correlations
+    values = np.stack([proxies[name] for name in PROXIES], axis=1).reshape(len(batches), len(PROXIES))
+    values[~np.isfinite(values)] = np.nan
+    return values
+
+
+def _pearson(x: np.ndarray, y: np.ndarray) -> float | None:
+    if len(x) < 3 or np.std(x) == 0 or np.std(y) == 0:
+        return None
+    return float(np.corrcoef(x, y)[0, 1])
+
+
+def correlation_report(proxy_values: np.ndarray, llm_scores: Dict[str, np.ndarray]) -> Dict[str, Dict[str, Dict]]:
+    """Pearson and Spearman correlation of each feature's LLM mean scores (per batch) with each of its proxies."""
+
+    report: Dict[str, Dict[str, Dict]] = {}
+    for feature_name, scores in llm_scores.items():
+        report[feature_name] = {}
+        for proxy_name in FEATURE_PROXIES.get(feature_name, []):
+            proxy = proxy_values[:, PROXIES.index(proxy_name)]
+            valid = np.isfinite(proxy) & np.isfinite(scores)
+            x, y = proxy[valid], scores[valid]
+
+            # Average ranks (see `correlation.ranks`), so ties (frequent with integer scores) do not bias Spearman
+            spearman = correlation.spearman_correlation(x, y) if len(x) >= 3 else None
+            report[feature_name][proxy_name] = {
+                "num_batches": int(valid.sum()),
+                "pearson": _pearson(x, y),
+                "spearman": spearman,
+                "agrees": spearman is not None and abs(spearman) >= AGREEMENT_THRESHOLD,
+            }
+    return report
+
+
+def print_correlation_report(report: Dict[str, Dict[str, Dict]]) -> None:
+    def _format(value: float | None) -> str:
+        return f"{value:>8.2f}" if value is not None else f"{'N/A':>8}"
+
+    print(f"{'feature':<30} {'proxy':<28} {'n':>4} {'pearson':>8} {'spearman':>8}")
+    for feature_name, proxies in report.items():
+        for proxy_name, proxy_correlation in proxies.items():
+            flag = "  <- agrees" if proxy_correlation["agrees"] else ""
+            print(f"{feature_name:<30} {proxy_name:<28} {proxy_correlation['num_batches']:>4} {_format(proxy_correlation['pearson'])} {_format(proxy_correlation['spearman'])}{flag}")
+
+    num_agreeing = sum(1 for proxies in report.values() if any(proxy_correlation["agrees"] for proxy_correlation in proxies.values()))
+    print(f"\n{num_agreeing}/{len(report)} feature(s) with a proxy agreeing with the LLM scores (|spearman| >= {AGREEMENT_THRESHOLD})")
+
+
+async def main():
+    import importlib
+    from evaluate_handcrafted import feature_set_1, feature_set_2
+
+    features_bank = feature_set_1 + feature_set_2
+
+    batches: List[List[str]] = []
+    batch_datasets: List[str] = []
+    for dataset_name in DATASETS:
+        train_set, test_set, validation_set = importlib.import_module(f"dataset_loader.{dataset_name}").load_dataset(f"dataset/{dataset_name}/", max_words_per_batch=2000)
+        dataset_batches = (validation_set + train_set + test_set)[:MAX_BATCHES_PER_DATASET]
+        batches.extend(dataset_batches)
+        batch_datasets.extend([dataset_name] * len(dataset_batches))
+
+    proxy_values = compute_proxies(batches)
+
+    per_batch_stats = await model.evaluate_features_scores_per_conversation(batches, features_bank, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL)
+    llm_scores = {feature.name: np.full(len(batches), np.nan) for feature in features_bank}
+    for index, batch_stats in enumerate(per_batch_stats):
+        for stats in batch_stats:
+            # NOTE: the stats are keyed by the feature the model echoed back, a renamed one is left as NaN
+            scores = llm_scores.get(stats.evaluations[0].feature.name)
+            if scores is None:
+                print(f"Skipping scores of unknown feature '{stats.evaluations[0].feature.name}'")
+                continue
+            scores[index] = stats.average_score
+
+    report = correlation_report(proxy_values, llm_scores)
+    print_correlation_report(report)
+
+    def _value(value: float) -> float | None:
+        return float(value) if np.isfinite(value) else None
+
+    output = {
+        "batches": [
+            {
+                "dataset": batch_datasets[index],
+                "proxies": {name: _value(proxy_values[index, column]) for column, name in enumerate(PROXIES)},
+                "llm_scores": {feature_name: _value(scores[index]) for feature_name, scores in llm_scores.items()},
+            }
+            for index in range(len(batches))
+        ],
+        "correlations": report,
+    }
+
+    with open("output/proxy_metrics.json", "w") as f:
+        json.dump(output, f, indent=4)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
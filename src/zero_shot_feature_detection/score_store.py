@@ -0,0 +1,251 @@
+import os
+import json
+import model
+import hashlib
+import functools
+import constants
+import work_queue
+
+from tqdm import tqdm
+from pydantic import BaseModel
+from typing import Dict, List
+from model import Feature, FeatureEvaluation, StatsFeatureEvaluation, SCORING_PROFILES
+
+
+def feature_hash(feature: Feature) -> str:
+    return hashlib.sha256(feature.model_dump_json().encode()).hexdigest()[:16]
+
+
+def conversation_hash(conversation: str) -> str:
+    return hashlib.sha256(conversation.encode()).hexdigest()[:16]
+
+
+def scoring_config_hash(profile: str) -> str:
+    """
+    Hash of everything else a score depends on: scoring prompts, temperatures, output schema, profile settings and
+    evidence verification (flagged explanations, dropped and re-sampled evaluations).
+    """
+    return _scoring_config_hash(profile, constants.EVIDENCE_VERIFICATION, constants.EVIDENCE_MIN_VERIFIED_FRACTION)
+
+
+@functools.lru_cache(maxsize=None)
+def _scoring_config_hash(profile: str, evidence_verification: str, evidence_min_verified_fraction: float) -> str:
+    text_format, max_output_tokens = model.scoring_output_format(SCORING_PROFILES[profile])
+    config = {
+        "prompts": [model.FEATURE_MATCH_SYSTEM_PROMPT, model.RUBRIC_EVALUATION_SYSTEM_PROMPT],
+        "temperatures": [model.FEATURE_MATCH_TEMPERATURE, model.FEATURE_SCORING_TEMPERATURE],
+        "schema": text_format.model_json_schema(),
+        "max_output_tokens": max_output_tokens,
+        "profile": SCORING_PROFILES[profile].model_dump(),
+        "evidence_verification": [evidence_verification, evidence_min_verified_fraction],
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class CellKey(BaseModel, frozen=True):
+    """One cell of the score matrix: a feature scored on a conversation by a model, with a scoring configuration."""
+    feature_hash: str
+    conversation_hash: str
+    model: str
+    profile: str
+    scoring_hash: str = "" # `scoring_config_hash` of the profile (empty in stores written before it was keyed)
+
+
+def cell_key(feature_hash: str, conversation_hash: str, model: str, profile: str) -> CellKey:
+    return CellKey(feature_hash=feature_hash, conversation_hash=conversation_hash, model=model, profile=profile, scoring_hash=scoring_config_hash(profile))
+
+
+class ScoringJob(BaseModel):
+    conversation_index: int
+    feature: Feature
+    model: str
+    num_missing: int
+
+
+class ScoreStore:
+    """
+    Persistent score matrix: every scoring call ever made, keyed by `CellKey` (content hashes, so a renamed file
+    or a reordered bank still hits the store, and an edited feature, conversation or scoring prompt does not).
+
+    NOTE: conversations are batches of paragraphs filling `max_words_per_batch`, and batches span the files of a
+    persona. Adding (or editing) one transcript shifts the batch boundaries of the files loaded after it, so most of
+    their cells get new conversation hashes and are scored again.
+
+    Two append-only JSONL files in `directory`: `scores.jsonl` (one line per evaluation) and `conversations.jsonl`
+    (the text of each conversation hash, to re-use the scores outside of the scripts that produced them).
+    """
+
+    def __init__(self, directory: str = constants.SCORE_STORE_DIR) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self._scores_path = os.path.join(directory, "scores.jsonl")
+        self._conversations_path = os.path.join(directory, "conversations.jsonl")
+
+        self._evaluations: Dict[CellKey, List[FeatureEvaluation]] = {}
+        self._conversation_hashes: set[str] = set()
+        self._record_ids: set[str] = set()
+
+        for record in self._read_records(self._scores_path):
+            self._evaluations.setdefault(CellKey.model_validate(record["key"]), []).append(FeatureEvaluation.model_validate(record["evaluation"]))
+            if record.get("record_id") is not None:
+                self._record_ids.add(record["record_id"])
+
+        for record in self._read_records(self._conversations_path):
+            self._conversation_hashes.add(record["conversation_hash"])
+
+    @staticmethod
+    def _read_records(path: str) -> List[Dict]:
+        if not os.path.exists(path):
+            return []
+
+        records = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"Skipping a malformed line in {path} (interrupted write?)")
+        return records
+
+    def count(self, key: CellKey) -> int:
+        return len(self._evaluations.get(key, []))
+
+    def evaluations(self, key: CellKey) -> List[FeatureEvaluation]:
+        return self._evaluations.get(key, [])
+
+    def keys(self) -> List[CellKey]:
+        return list(self._evaluations.keys())
+
+    def conversations(self) -> Dict[str, str]:
+        """Conversation hash -> text, read from disk on demand (texts are not kept in memory)."""
+        return {record["conversation_hash"]: record["conversation"] for record in self._read_records(self._conversations_path)}
+
+    def add_conversation(self, conversation: str) -> str:
+        _hash = conversation_hash(conversation)
+        if _hash not in self._conversation_hashes:
+            with open(self._conversations_path, "a") as f:
+                f.write(json.dumps({"conversation_hash": _hash, "conversation": conversation}) + "\n")
+            self._conversation_hashes.add(_hash)
+        return _hash
+
+    def add(self, key: CellKey, evaluation: FeatureEvaluation, record_id: str | None = None) -> bool:
+        """
+        Store one evaluation. With a `record_id` (e.g. a work queue job), adding the same record again is a no-op,
+        so a result can be re-sent safely after a crash. Returns whether the evaluation was added.
+        """
+
+        if record_id is not None and record_id in self._record_ids:
+            return False
+
+        # Written right away, so an interrupted run keeps everything scored so far
+        with open(self._scores_path, "a") as f:
+            f.write(json.dumps({"key": key.model_dump(), "evaluation": evaluation.model_dump(), "record_id": record_id}) + "\n")
+        self._evaluations.setdefault(key, []).append(evaluation)
+
+        if record_id is not None:
+            self._record_ids.add(record_id)
+        return True
+
+
+def plan_missing_cells(store: ScoreStore, conversations: List[str], features: List[Feature], models: List[str], num_evaluations_per_model: int, profile: str) -> List[ScoringJob]:
+    """(conversation, feature, model) cells with fewer than `num_evaluations_per_model` stored evaluations."""
+
+    feature_hashes = [feature_hash(feature) for feature in features]
+    jobs = []
+
+    for index, conversation in enumerate(conversations):
+        _conversation_hash = conversation_hash(conversation)
+        for feature, _feature_hash in zip(features, feature_hashes):
+            for model_name in models:
+                num_stored = store.count(cell_key(_feature_hash, _conversation_hash, model_name, profile))
+                if num_stored < num_evaluations_per_model:
+                    jobs.append(ScoringJob(conversation_index=index, feature=feature, model=model_name, num_missing=num_evaluations_per_model - num_stored))
+
+    return jobs
+
+
+async def run_scoring_jobs(store: ScoreStore, joined_conversations: List[str], jobs: List[ScoringJob], profile: str) -> None:
+    """Score `jobs` through the work queue and add every evaluation to the store."""
+
+    pbar = tqdm(total=sum(job.num_missing for job in jobs), desc="Evaluating missing features scores", leave=False)
+
+    async def _evaluate(job: ScoringJob) -> List[FeatureEvaluation]:
+        conversation = joined_conversations[job.conversation_index]
+        if job.num_missing > 1:
+            return await model.evaluate_feature_score_samples(conversation, job.feature, job.model, job.num_missing, SCORING_PROFILES[profile])
+        return [await model.evaluate_single_feature_score(conversation, job.feature, job.model, SCORING_PROFILES[profile])]
+
+    def _on_result(job: ScoringJob, evaluations: List[FeatureEvaluation] | None, error: Exception | None) -> None:
+        pbar.update(job.num_missing)
+        if error is not None:
+            print(f"Error while evaluating feature scores: {error=}, {type(error)=}")
+            return
+
+        key = cell_key(feature_hash(job.feature), conversation_hash(joined_conversations[job.conversation_index]), job.model, profile)
+        for evaluation in evaluations:
+            store.add(key, evaluation)
+
+    # With multi-sample requests a job is scored in one go, otherwise it is split in single calls
+    if constants.USE_MULTI_SAMPLE_REQUESTS:
+        items = ((0, job) for job in jobs)
+    else:
+        items = ((0, job.model_copy(update={"num_missing": 1})) for job in jobs for _ in range(job.num_missing))
+
+    await work_queue.run_work_queue(
+        items,
+        _evaluate,
+        _on_result,
+        num_workers=constants.SEMAPHORE_MAX_CONCURRENCY,
+    )
+
+
+async def evaluate_features_scores_per_conversation_incremental(
+    conversations: List[List[str]],
+    features: List[Feature],
+    models: List[str],
+    num_evaluations_per_model: int,
+    store: ScoreStore | None = None,
+) -> List[List[StatsFeatureEvaluation]]:
+    """
+    Incremental counterpart of `model.evaluate_features_scores_per_conversation`: only the cells missing from
+    the store are scored, then stored and new evaluations are aggregated together (per conversation, in input order).
+    """
+
+    store = store or ScoreStore()
+    profile = constants.SCORING_PROFILE
+    joined_conversations = ["\n".join([segment for segment in batch]) for batch in conversations]
+
+    for conversation in joined_conversations:
+        store.add_conversation(conversation)
+
+    jobs = plan_missing_cells(store, joined_conversations, features, models, num_evaluations_per_model, profile)
+    num_cells = len(joined_conversations) * len(features) * len(models)
+    num_missing_calls = sum(job.num_missing for job in jobs)
+    print(f"Score store: {num_cells - len(jobs)}/{num_cells} cells complete, {num_missing_calls} scoring call(s) to make (out of {num_cells * num_evaluations_per_model})")
+
+    await run_scoring_jobs(store, joined_conversations, jobs, profile)
+
+    # Aggregate from the store: exactly `num_evaluations_per_model` per model when more were stored (e.g. by a run with more repeats)
+    per_conversation_stats = []
+    for conversation in joined_conversations:
+        _conversation_hash = conversation_hash(conversation)
+        evaluations: Dict[str, List[FeatureEvaluation]] = {feature.name: [] for feature in features}
+        for feature in features:
+            for model_name in models:
+                key = cell_key(feature_hash(feature), _conversation_hash, model_name, profile)
+                evaluations[feature.name].extend(store.evaluations(key)[:num_evaluations_per_model])
+        per_conversation_stats.append(model.aggregate_features_evaluations(evaluations))
+
+    return per_conversation_stats
+
+
+async def evaluate_features_scores_across_conversations_incremental(
+    conversations: List[List[str]],
+    features: List[Feature],
+    models: List[str],
+    num_evaluations_per_model: int,
+    store: ScoreStore | None = None,
+) -> List[StatsFeatureEvaluation]:
+    """Incremental counterpart of `model.evaluate_features_scores_across_conversations` (see the per-conversation one)."""
+
+    per_conversation_stats = await evaluate_features_scores_per_conversation_incremental(conversations, features, models, num_evaluations_per_model, store)
+    return model.merge_conversations_stats(per_conversation_stats, features)
@@ -0,0 +1,55 @@
+"""
+Scoring of a feature bank across conversations with the mode selected in `constants.py` (the dense ensemble of
+`model.py` by default), shared by `main.py`, `bank_compaction.py` and `evaluate_on_other_persona.py`.
+"""
+
+import model
+import cascade
+import constants
+import score_store
+import logprob_scoring
+import matrix_completion
+
+from typing import List
+from model import Feature, StatsFeatureEvaluation
+from constants import MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL
+
+
+async def evaluate_features_scores_per_conversation(conversations: List[List[str]], features: List[Feature], stage: str = "evaluation") -> List[List[StatsFeatureEvaluation]]:
+    """Stats of each conversation apart (in input order); `stage` picks the cascade route."""
+
+    if constants.USE_SCORING_CASCADE:
+        per_conversation_stats, report = await cascade.evaluate_features_scores_per_conversation_cascade(conversations, features, cascade.CascadeRoute(**constants.CASCADE_ROUTES[stage]))
+        cascade.print_cascade_report(report)
+        return per_conversation_stats
+
+    if constants.USE_LOGPROBS_SCORING:
+        return await logprob_scoring.evaluate_features_scores_per_conversation_logprobs(conversations, features, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+
+    if constants.USE_SPARSE_SCORING:
+        return await matrix_completion.evaluate_features_scores_per_conversation_sparse(conversations, features, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+
+    if constants.USE_SCORE_STORE:
+        return await score_store.evaluate_features_scores_per_conversation_incremental(conversations, features, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+
+    return await model.evaluate_features_scores_per_conversation(conversations, features, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+
+
+async def evaluate_features_scores_across_conversations(conversations: List[List[str]], features: List[Feature], stage: str = "evaluation") -> List[StatsFeatureEvaluation]:
+    """Stats of each feature over all the conversations; `stage` picks the cascade route."""
+
+    if constants.USE_SCORING_CASCADE:
+        stats, report = await cascade.evaluate_features_scores_across_conversations_cascade(conversations, features, cascade.CascadeRoute(**constants.CASCADE_ROUTES[stage]))
+        cascade.print_cascade_report(report)
+        return stats
+
+    if constants.USE_LOGPROBS_SCORING:
+        return await logprob_scoring.evaluate_features_scores_across_conversations_logprobs(conversations, features, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+
+    if constants.USE_SPARSE_SCORING:
+        return await matrix_completion.evaluate_features_scores_across_conversations_sparse(conversations, features, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+
+    if constants.USE_SCORE_STORE:
+        return await score_store.evaluate_features_scores_across_conversations_incremental(conversations, features, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
+
+    return await model.evaluate_features_scores_across_conversations(conversations, features, MODELS_TO_ANALYZE, num_evaluations_per_model=NUM_EVALUATIONS_PER_MODEL)
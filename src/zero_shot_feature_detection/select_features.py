@@ -0,0 +1,176 @@
+import csv
+import json
+import math
+import numpy as np
+
+from pydantic import BaseModel
+from typing import Any, Dict, List, Sequence
+
+
+class PersonaScoreTable(BaseModel):
+    feature_names: List[str]
+    persona_names: List[str]
+    means: List[List[float]] # (feature x persona)
+    stds: List[List[float]]  # (feature x persona)
+
+
+class FeatureSelectionReport(BaseModel):
+    selected_features: List[str]
+    fisher_ratio_by_feature: Dict[str, float]
+    accuracy_by_step: List[float]
+    full_bank_accuracy: float
+    selected_accuracy: float
+    worst_separated_personas: List[str]
+
+
+def load_persona_score_table(csv_path: str) -> PersonaScoreTable:
+    """
+    Read the table exported by `evaluate_handcrafted.py` (`features_stats_by_dataset.csv`).
+
+    Persona columns are detected by pairs of "<persona>'s score" / "<persona>'s std" headers.
+    Features with a missing value for any persona are skipped.
+    """
+
+    with open(csv_path, "r", newline="") as f:
+        rows = list(csv.reader(f))
+
+    headers = rows[0]
+    persona_names = [header[:-len("'s score")] for header in headers if header.endswith("'s score")]
+    score_columns = [headers.index(f"{persona}'s score") for persona in persona_names]
+    std_columns = [headers.index(f"{persona}'s std") for persona in persona_names]
+
+    feature_names, means, stds = [], [], []
+    for row in rows[1:]:
+        try:
+            feature_means = [float(row[column]) for column in score_columns]
+            feature_stds = [float(row[column]) for column in std_columns]
+        except ValueError:
+            print(f"Skipping feature '{row[0]}' because some personas have no score")
+            continue
+
+        feature_names.append(row[0])
+        means.append(feature_means)
+        stds.append(feature_stds)
+
+    return PersonaScoreTable(feature_names=feature_names, persona_names=persona_names, means=means, stds=stds)
+
+
+def fisher_ratios(means: np.ndarray, stds: np.ndarray) -> np.ndarray:
+    """Between-persona variance of the means over the average within-persona variance, per feature."""
+    between = means.var(axis=1)
+    within = np.maximum((stds ** 2).mean(axis=1), 1e-6)
+    return between / within
+
+
+def _pairwise_squared_distances(means: np.ndarray, stds: np.ndarray) -> np.ndarray:
+    """
+    Per-feature contribution to the (diagonal) Mahalanobis distance between every pair of personas.
+
+    Returns an array of shape (feature x pair), summing it over a subset of features gives the squared distance.
+    """
+
+    first, second = np.triu_indices(means.shape[1], k=1)
+    squared_difference = (means[:, first] - means[:, second]) ** 2
+    pooled_variance = np.maximum((stds[:, first] ** 2 + stds[:, second] ** 2) / 2, 1e-6)
+    return squared_difference / pooled_variance
+
+
+def _pairwise_accuracy(squared_distances: np.ndarray) -> np.ndarray:
+    # Bayes accuracy between two equal-covariance gaussians separated by a Mahalanobis distance d: Phi(d / 2)
+    distances = np.sqrt(squared_distances)
+    return np.array([0.5 * (1.0 + math.erf(d / (2.0 * math.sqrt(2.0)))) for d in distances])
+
+
+def greedy_select_features(table: PersonaScoreTable, max_accuracy_drop: float = 0.01) -> FeatureSelectionReport:
+    """
+    Forward selection of the smallest feature subset that keeps personas separable.
+
+    Separability is the expected pairwise classification accuracy of a gaussian classifier built from the
+    per-persona means and stds. At each step the feature that improves the worst-separated pair the most
+    is added (ties broken on the average accuracy), until the accuracy is within `max_accuracy_drop` of the full bank.
+    """
+
+    means = np.asarray(table.means, dtype=float)
+    stds = np.asarray(table.stds, dtype=float)
+
+    contributions = _pairwise_squared_distances(means, stds)
+    full_accuracy = float(_pairwise_accuracy(contributions.sum(axis=0)).mean())
+
+    selected: List[int] = []
+    accuracy_by_step: List[float] = []
+    current = np.zeros(contributions.shape[1])
+    remaining = list(range(len(table.feature_names)))
+
+    while remaining:
+        candidates = current[None, :] + contributions[remaining]
+        candidate_accuracies = np.array([_pairwise_accuracy(candidate) for candidate in candidates])
+
+        best = int(np.lexsort((candidate_accuracies.mean(axis=1), candidate_accuracies.min(axis=1)))[-1])
+        best_feature = remaining.pop(best)
+
+        selected.append(best_feature)
+        current = current + contributions[best_feature]
+        accuracy_by_step.append(float(candidate_accuracies[best].mean()))
+
+        if accuracy_by_step[-1] >= full_accuracy - max_accuracy_drop:
+            break
+
+    first, second = np.triu_indices(means.shape[1], k=1)
+    worst_pair = int(np.argmin(current)) if len(current) > 0 else None
+
+    return FeatureSelectionReport(
+        selected_features=[table.feature_names[i] for i in selected],
+        fisher_ratio_by_feature={
+            name: round(float(ratio), 4)
+            for name, ratio in zip(table.feature_names, fisher_ratios(means, stds))
+        },
+        accuracy_by_step=[round(accuracy, 4) for accuracy in accuracy_by_step],
+        full_bank_accuracy=round(full_accuracy, 4),
+        selected_accuracy=round(accuracy_by_step[-1], 4) if accuracy_by_step else 0.0,
+        worst_separated_personas=(
+            [table.persona_names[first[worst_pair]], table.persona_names[second[worst_pair]]] if worst_pair is not None else []
+        ),
+    )
+
+
+def filter_bank(features: Sequence[BaseModel], selected_feature_names: List[str]) -> List[BaseModel]:
+    """Keep only the selected features of a bank, in selection order (most informative first)."""
+    features_by_name = {feature.name: feature for feature in features}
+    return [features_by_name[name] for name in selected_feature_names if name in features_by_name]
+
+
+def export_bank(features: Sequence[BaseModel], path: str) -> None:
+    with open(path, "w") as f:
+        json.dump([feature.model_dump() for feature in features], f, indent=4)
+
+
+def print_selection_report(report: FeatureSelectionReport, num_features: int) -> None:
+    print(f"Selected {len(report.selected_features)}/{num_features} features")
+    for name, accuracy in zip(report.selected_features, report.accuracy_by_step):
+        print(f"- {name:<40} fisher ratio: {report.fisher_ratio_by_feature[name]:>8.2f}\tpairwise accuracy: {accuracy:.4f}")
+    print(f"Pairwise accuracy (selected / full bank): {report.selected_accuracy:.4f} / {report.full_bank_accuracy:.4f}")
+    print(f"Worst separated personas: {' vs '.join(report.worst_separated_personas)}")
+    print("-" * 100, end="\n\n")
+
+
+def main(max_accuracy_drop: float = 0.01) -> Dict[str, Any]:
+
+    table = load_persona_score_table("output/features_stats_by_dataset.csv")
+    report = greedy_select_features(table, max_accuracy_drop=max_accuracy_drop)
+    print_selection_report(report, num_features=len(table.feature_names))
+
+    # The bank must be the one used to produce the CSV, pick one or the other
+    from evaluate_handcrafted import pers_16 as features_bank
+    # from evaluate_handcrafted import feature_set_1 as features_bank
+    # from evaluate_handcrafted import feature_set_2 as features_bank
+
+    export_bank(filter_bank(features_bank, report.selected_features), "output/features_bank_selected.json")
+
+    with open("output/feature_selection_report.json", "w") as f:
+        json.dump(report.model_dump(), f, indent=4)
+
+    return report.model_dump()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Watch-folder daemon: keeps per-persona feature statistics current as transcripts are added to `dataset/<persona>/`.
+
+Every `--interval` seconds, the persona directories are scanned. Only new or changed files are parsed (with the
+`dataset_loader` parser of the persona) and scored against a fixed bank, through the score store (see
+`score_store.py`), so unchanged batches of an edited file are not scored again. Each file keeps its contribution
+(n, sum, sum of squares per feature), so the per-persona running statistics are updated without touching the other
+files, and a deleted file simply removes its contribution.
+
+After each update, a drift report compares the persona statistics with the previous ones and with the baseline
+(the statistics of the first scan).
+"""
+
+import os
+import sys
+import json
+import math
+import asyncio
+import hashlib
+import argparse
+import importlib
+import score_store
+
+from pydantic import BaseModel
+from typing import Callable, Dict, List
+from model import Feature, StatsFeatureEvaluation
+from constants import MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+
+# Persona directory -> `dataset_loader` module parsing its files. Personas not listed (e.g. Delphi dumps) are plain
+# single-speaker text, parsed like `jess_lee`.
+PERSONA_PARSERS: Dict[str, str] = {
+    "jess_lee": "jess_lee",
+    "dara": "dara",
+    "thytu": "thytu",
+    "huberman_lab": "huberman_lab",
+    "crucible_moments": "crucible_moments",
+}
+DEFAULT_PARSER = "jess_lee"
+
+DRIFT_THRESHOLD = 0.5 # mean score change (0-10 scale) reported as drift
+
+
+class FeatureContribution(BaseModel):
+    n: int = 0
+    sum: float = 0.0
+    sum_of_squares: float = 0.0
+
+
+class FileState(BaseModel):
+    persona: str
+    size: int
+    mtime: float
+    sha256: str
+    contributions: Dict[str, FeatureContribution] # feature name -> contribution
+
+
+class RunningStats(BaseModel):
+    n: int
+    mean: float
+    standard_deviation: float
+
+
+class WatchState(BaseModel):
+    bank_hash: str
+    files: Dict[str, FileState] = {}
+    baseline: Dict[str, Dict[str, RunningStats]] = {} # persona -> feature name -> stats
+
+
+def _file_sha256(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def get_file_parser(persona: str) -> Callable[[str], List[List[str]]]:
+    return importlib.import_module(f"dataset_loader.{PERSONA_PARSERS.get(persona, DEFAULT_PARSER)}").load_file_batches
+
+
+def contributions_from_stats(stats: List[StatsFeatureEvaluation]) -> Dict[str, FeatureContribution]:
+    contributions = {}
+    for _stats in stats:
+        scores = [evaluation.score for evaluation in _stats.evaluations]
+        contributions[_stats.evaluations[0].feature.name] = FeatureContribution(n=len(scores), sum=sum(scores), sum_of_squares=sum(score ** 2 for score in scores))
+    return contributions
+
+
+def persona_running_stats(state: WatchState) -> Dict[str, Dict[str, RunningStats]]:
+    totals: Dict[str, Dict[str, FeatureContribution]] = {}
+    for file_state in state.files.values():
+        for feature_name, contribution in file_state.contributions.items():
+            total = totals.setdefault(file_state.persona, {}).setdefault(feature_name, FeatureContribution())
+            total.n += contribution.n
+            total.sum += contribution.sum
+            total.sum_of_squares += contribution.sum_of_squares
+
+    stats: Dict[str, Dict[str, RunningStats]] = {}
+    for persona, persona_totals in totals.items():
+        for feature_name, total in persona_totals.items():
+            if total.n == 0:
+                continue
+            mean = total.sum / total.n
+            variance = (total.sum_of_squares - total.n * mean ** 2) / (total.n - 1) if total.n > 1 else 0.0
+            stats.setdefault(persona, {})[feature_name] = RunningStats(n=total.n, mean=mean, standard_deviation=math.sqrt(max(variance, 0.0)))
+    return stats
+
+
+def scan_changes(dataset_dir: str, personas: List[str], state: WatchState) -> tuple[List[tuple[str, str]], List[str]]:
+    """(persona, path) of the new or changed files, and the paths of the deleted files."""
+
+    changed, seen = [], set()
+    for persona in personas:
+        persona_dir = os.path.join(dataset_dir, persona)
+        if not os.path.isdir(persona_dir):
+            continue
+
+        for name in sorted(os.listdir(persona_dir)):
+            if not name.lower().endswith(".txt"):
+                continue
+            path = os.path.join(persona_dir, name)
+            seen.add(path)
+
+            file_stat = os.stat(path)
+            previous = state.files.get(path)
+            if previous is not None and previous.size == file_stat.st_size and previous.mtime == file_stat.st_mtime:
+                continue # unchanged (cheap check)
+            if previous is not None and previous.sha256 == _file_sha256(path):
+                previous.mtime = file_stat.st_mtime # touched only
+                continue
+            changed.append((persona, path))
+
+    deleted = [path for path, file_state in state.files.items() if file_state.persona in personas and path not in seen]
+    return changed, deleted
+
+
+async def process_changes(dataset_dir: str, personas: List[str], features: List[Feature], state: WatchState, store: score_store.ScoreStore) -> int:
+    """Score the new or changed files and update `state`. Returns the number of files updated (including deletions)."""
+
+    changed, deleted = scan_changes(dataset_dir, personas, state)
+
+    for path in deleted:
+        print(f"Removed: {path}")
+        del state.files[path]
+
+    for persona, path in changed:
+        try:
+            batches = get_file_parser(persona)(path)
+        except Exception as _error:
+            print(f"Error parsing {path}: {_error}")
+            continue
+
+        print(f"{'Updated' if path in state.files else 'New'}: {path} ({len(batches)} batch(es))")
+        stats = await score_store.evaluate_features_scores_across_conversations_incremental(batches, features, MODELS_TO_ANALYZE, NUM_EVALUATIONS_PER_MODEL, store) if len(batches) > 0 else []
+
+        file_stat = os.stat(path)
+        state.files[path] = FileState(
+            persona=persona,
+            size=file_stat.st_size,
+            mtime=file_stat.st_mtime,
+            sha256=_file_sha256(path),
+            contributions=contributions_from_stats(stats),
+        )
+
+    return len(changed) + len(deleted)
+
+
+def drift_report(previous: Dict[str, Dict[str, RunningStats]], current: Dict[str, Dict[str, RunningStats]], baseline: Dict[str, Dict[str, RunningStats]]) -> Dict:
+    report = {}
+    for persona, persona_stats in current.items():
+        report[persona] = {}
+        for feature_name, stats in persona_stats.items():
+            before = previous.get(persona, {}).get(feature_name)
+            reference = baseline.get(persona, {}).get(feature_name)
+            report[persona][feature_name] = {
+                "n": stats.n,
+                "mean": stats.mean,
+                "standard_deviation": stats.standard_deviation,
+                "delta_since_last_update": stats.mean - before.mean if before is not None else None,
+                "delta_since_baseline": stats.mean - reference.mean if reference is not None else None,
+            }
+    return report
+
+
+def print_drift_report(report: Dict) -> None:
+    for persona, persona_report in report.items():
+        drifting = {
+            feature_name: feature_report for feature_name, feature_report in persona_report.items()
+            if feature_report["delta_since_baseline"] is not None and abs(feature_report["delta_since_baseline"]) >= DRIFT_THRESHOLD
+        }
+        print(f"{persona}: {len(drifting)} feature(s) drifted by >= {DRIFT_THRESHOLD} since the baseline")
+        for feature_name, feature_report in sorted(drifting.items(), key=lambda item: -abs(item[1]["delta_since_baseline"])):
+            print(f"- {feature_name}: {feature_report['mean']:.2f} ({feature_report['delta_since_baseline']:+.2f}, n={feature_report['n']})")
+
+
+def _save_json(data: Dict, path: str) -> None:
+    # Atomic write, the state must never be left half written if the daemon is killed
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(temporary_path, path)
+
+
+async def watch(dataset_dir: str, personas: List[str], bank_path: str, output_dir: str, interval: float, once: bool = False) -> None:
+    features = [Feature.model_validate(_feature) for _feature in json.load(open(bank_path))]
+    bank_hash = hashlib.sha256(json.dumps([feature.model_dump() for feature in features]).encode()).hexdigest()
+
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = os.path.join(output_dir, "state.json")
+    state = WatchState.model_validate(json.load(open(state_path))) if os.path.exists(state_path) else WatchState(bank_hash=bank_hash)
+
+    if state.bank_hash != bank_hash:
+        print("The features bank changed, starting from a fresh state (scores already in the store are re-used)")
+        state = WatchState(bank_hash=bank_hash)
+
+    store = score_store.ScoreStore()
+
+    while True:
+        previous = persona_running_stats(state)
+        num_updated = await process_changes(dataset_dir, personas, features, state, store)
+
+        if num_updated > 0:
+            current = persona_running_stats(state)
+            for persona, persona_stats in current.items():
+                state.baseline.setdefault(persona, persona_stats)
+
+            report = drift_report(previous, current, state.baseline)
+            print_drift_report(report)
+
+            _save_json(state.model_dump(), state_path)
+            _save_json(report, os.path.join(output_dir, "drift_report.json"))
+
+        if once:
+            break
+        await asyncio.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset-dir", default="dataset")
+    parser.add_argument("--personas", nargs="+", default=None, help="persona directories to watch (default: all of them)")
+    parser.add_argument("--bank", default="output/features_bank.json")
+    parser.add_argument("--output-dir", default="output/watch")
+    parser.add_argument("--interval", type=float, default=60.0, help="seconds between two scans")
+    parser.add_argument("--once", action="store_true", help="process the pending changes and exit")
+    args = parser.parse_args()
+
+    personas = args.personas or sorted(name for name in os.listdir(args.dataset_dir) if os.path.isdir(os.path.join(args.dataset_dir, name)))
+    asyncio.run(watch(args.dataset_dir, personas, args.bank, args.output_dir, args.interval, once=args.once))
+
+
+if __name__ == "__main__":
+    main()
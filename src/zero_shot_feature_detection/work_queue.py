@@ -0,0 +1,101 @@
+import asyncio
+import itertools
+
+from collections import deque
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Iterator, List
+
+
+# Sorts after any real work item, so workers only stop once the queue is drained
+_STOP = (float("inf"), float("inf"), None)
+
+
+class AdmissionWindow:
+    """
+    Admits groups of items (e.g. all the calls of one conversation) at most `size` at a time, in the given order,
+    and interleaves the items of the admitted groups one at a time (a, b, c, a, b, c, ...). A new group is admitted
+    when `release` reports that an admitted group is done (all its items completed, not just produced), so every
+    group completes early instead of all of them completing in the last round.
+    """
+
+    def __init__(self, groups: List[Iterable[Any]], order: List[int], size: int) -> None:
+        self._groups = groups
+        self._order = order
+        self._free_slots = asyncio.Semaphore(max(size, 1))
+
+    def release(self) -> None:
+        self._free_slots.release()
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        pending = deque(self._order)
+        active: List[tuple[Iterator[Any], list[int]]] = [] # (items, number of items produced)
+
+        while len(pending) > 0 or len(active) > 0:
+            # Admit groups while slots are free, wait for one only when there is nothing else to produce
+            while len(pending) > 0 and (len(active) == 0 or not self._free_slots.locked()):
+                await self._free_slots.acquire()
+                active.append((iter(self._groups[pending.popleft()]), [0]))
+
+            still_active = []
+            for iterator, num_produced in active:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    if num_produced[0] == 0:
+                        self.release() # an empty group never completes, its slot is freed right away
+                    continue
+                num_produced[0] += 1
+                still_active.append((iterator, num_produced))
+                yield item
+            active = still_active
+
+
+async def run_work_queue(
+    items: Iterable[tuple[int, Any]] | AsyncIterable[tuple[int, Any]],
+    worker: Callable[[Any], Awaitable[Any]],
+    on_result: Callable[[Any, Any, Exception | None], None],
+    num_workers: int,
+    max_queue_size: int | None = None,
+) -> None:
+    """
+    Run `worker` on every item with a fixed pool of `num_workers` workers fed through a bounded priority queue.
+
+    `items` is a (lazy, possibly async, e.g. `AdmissionWindow`) iterable of (priority, payload), lower priorities first.
+    It is only consumed as fast as the workers free up room in the queue (backpressure), so the number of payloads alive
+    at once does not depend on the dataset size. Priorities reorder the items waiting in the queue, ties are served in production order.
+
+    `on_result(payload, result, error)` is called as soon as each item completes, `error` being the exception raised
+    by the worker (if any). Exceptions of `on_result` itself stop the queue.
+    """
+
+    queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=max_queue_size or 2 * num_workers)
+    sequence = itertools.count()
+
+    async def _produce() -> None:
+        if isinstance(items, AsyncIterable):
+            async for priority, payload in items:
+                await queue.put((priority, next(sequence), payload))
+        else:
+            for priority, payload in items:
+                await queue.put((priority, next(sequence), payload))
+        for _ in range(num_workers):
+            await queue.put(_STOP)
+
+    async def _consume() -> None:
+        while True:
+            priority, _, payload = await queue.get()
+            if payload is None and priority == _STOP[0]:
+                return
+
+            try:
+                result = await worker(payload)
+            except Exception as _error:
+                on_result(payload, None, _error)
+            else:
+                on_result(payload, result, None)
+
+    tasks = [asyncio.create_task(_produce())] + [asyncio.create_task(_consume()) for _ in range(num_workers)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The scripts import their siblings by bare name, as when run from `src/zero_shot_feature_detection`
+_SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+for _path in [_SRC_DIR, os.path.join(_SRC_DIR, "zero_shot_feature_detection")]:
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
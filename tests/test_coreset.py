@@ -0,0 +1,46 @@
+import unittest
+import numpy as np
+
+from coreset import k_medoids, select_coreset
+
+
+class KMedoidsTest(unittest.TestCase):
+
+    def test_one_medoid_per_cluster(self) -> None:
+        rng = np.random.default_rng(0)
+        centers = np.array([[0.0, 0.0], [10.0, 0.0], [0.0, 10.0]])
+        points = np.concatenate([center + rng.normal(scale=0.5, size=(10, 2)) for center in centers])
+
+        medoids, assignment = k_medoids(points, 3, rng)
+
+        self.assertEqual(sorted(int(medoid) // 10 for medoid in medoids), [0, 1, 2])
+        for cluster, medoid in enumerate(medoids):
+            self.assertEqual(set(np.nonzero(assignment == cluster)[0] // 10), {int(medoid) // 10})
+
+
+class SelectCoresetTest(unittest.TestCase):
+
+    def test_empty_dataset(self) -> None:
+        sample = select_coreset([], k=5)
+        self.assertEqual((sample.indices, sample.weights), ([], []))
+
+    def test_fewer_batches_than_k_keeps_them_all(self) -> None:
+        sample = select_coreset([["Hello there."], ["How are you?"]], k=5)
+        self.assertEqual(sample.indices, [0, 1])
+        self.assertEqual(sample.weights, [0.5, 0.5])
+
+    def test_weights_sum_to_one(self) -> None:
+        batches = [[f"Sentence number {i}. " * (i + 1), "Well, I think so!" * (i % 3)] for i in range(12)]
+        sample = select_coreset(batches, k=4)
+
+        self.assertEqual(len(sample.indices), 4)
+        self.assertEqual(len(set(sample.indices)), 4)
+        self.assertAlmostEqual(sum(sample.weights), 1.0)
+
+    def test_invalid_k(self) -> None:
+        with self.assertRaises(ValueError):
+            select_coreset([["Hello there."]], k=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+import numpy as np
+
+from correlation import ranks, spearman_correlation
+
+
+class CorrelationTest(unittest.TestCase):
+
+    def test_ties_get_average_ranks(self) -> None:
+        np.testing.assert_array_equal(ranks(np.array([3.0, 1.0, 3.0, 2.0])), [2.5, 0.0, 2.5, 1.0])
+
+    def test_spearman_is_invariant_to_monotonic_transforms(self) -> None:
+        x = np.array([0.1, 0.5, 0.2, 0.9, 0.7])
+        self.assertAlmostEqual(spearman_correlation(x, np.exp(3 * x)), 1.0)
+        self.assertAlmostEqual(spearman_correlation(x, -x), -1.0)
+
+    def test_undefined_correlation(self) -> None:
+        self.assertIsNone(spearman_correlation(np.array([1.0]), np.array([2.0])))
+        self.assertIsNone(spearman_correlation(np.array([1.0, 2.0, 3.0]), np.array([5.0, 5.0, 5.0])))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from dataset_loader.dedup import find_near_duplicates, remove_near_duplicates
+
+
+def _paragraph(prefix: str, start: int, end: int) -> list[str]:
+    return [f"{prefix}{index}" for index in range(start, end)]
+
+
+class FindNearDuplicatesTest(unittest.TestCase):
+
+    def test_exact_and_near_duplicates(self) -> None:
+        paragraph = " ".join(_paragraph("w", 0, 60))
+        near = " ".join(_paragraph("w", 0, 59) + ["changed"])
+        other = " ".join(_paragraph("z", 0, 60))
+
+        self.assertEqual(find_near_duplicates([paragraph, other, paragraph, near]), [2, 3])
+
+    def test_short_paragraphs_are_kept(self) -> None:
+        self.assertEqual(find_near_duplicates(["Yeah.", "Yeah.", "Exactly, yes.", "Exactly, yes."]), [])
+
+    def test_chains_are_not_transitive(self) -> None:
+        # A ~ B and B ~ C (estimated Jaccard ~0.4), but C is far from A (~0.13): B is dropped as a near-duplicate of A,
+        # C is only compared against the kept A and stays
+        a = _paragraph("w", 0, 60)
+        b = a[:40] + _paragraph("x", 40, 60)
+        c = a[:20] + _paragraph("y", 20, 40) + b[40:]
+
+        self.assertEqual(find_near_duplicates([" ".join(a), " ".join(b), " ".join(c)], threshold=0.3), [1])
+
+
+class RemoveNearDuplicatesTest(unittest.TestCase):
+
+    def test_first_occurrence_is_kept_across_files(self) -> None:
+        intro = "Welcome back to the show, today we are talking about sleep and focus with a great guest"
+        segments_per_file = {"a.txt": [intro, "First episode content here."], "b.txt": [intro, "Second episode content here."]}
+
+        output = remove_near_duplicates(segments_per_file)
+
+        self.assertEqual(output, {"a.txt": [intro, "First episode content here."], "b.txt": ["Second episode content here."]})
+
+
+if __name__ == "__main__":
+    unittest.main()
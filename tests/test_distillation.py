@@ -0,0 +1,62 @@
+import tempfile
+import unittest
+import numpy as np
+
+from distillation import DistilledFeature, DistilledPredictor, _fit_ensemble, _fit_ridge, _predict_ensemble
+
+
+class RidgeTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.rng = np.random.default_rng(0)
+
+    def test_recovers_linear_weights(self) -> None:
+        inputs = self.rng.normal(size=(200, 3))
+        inputs -= inputs.mean(axis=0) # standardized inputs, as the predictor fits them
+        targets = 2.0 + inputs @ np.array([1.0, -2.0, 0.5])
+
+        coefficients = _fit_ridge(inputs, targets, alpha=1e-6)
+
+        np.testing.assert_allclose(coefficients, [2.0, 1.0, -2.0, 0.5], atol=1e-3)
+
+    def test_dual_form_matches_primal_form(self) -> None:
+        inputs = self.rng.normal(size=(5, 20)) # fewer examples than inputs
+        targets = self.rng.normal(size=5)
+
+        coefficients = _fit_ridge(inputs, targets, alpha=3.0)
+        primal = np.linalg.solve(inputs.T @ inputs + 3.0 * np.eye(20), inputs.T @ (targets - targets.mean()))
+
+        np.testing.assert_allclose(coefficients[1:], primal, atol=1e-8)
+
+    def test_ensemble_spread_grows_away_from_the_data(self) -> None:
+        inputs = self.rng.normal(size=(50, 2))
+        targets = inputs @ np.array([1.0, 1.0]) + self.rng.normal(scale=0.5, size=50)
+        coefficients = _fit_ensemble(inputs, targets, alpha=1.0, rng=self.rng)
+
+        _, near = _predict_ensemble(coefficients, np.zeros((1, 2)))
+        _, far = _predict_ensemble(coefficients, np.full((1, 2), 10.0))
+
+        self.assertGreater(far[0], near[0])
+
+
+class DistilledPredictorTest(unittest.TestCase):
+
+    def test_save_load_round_trip(self) -> None:
+        feature = DistilledFeature(
+            name="warmth", feature_hash="abc", num_examples=30, alpha=1.0, calibration_intercept=0.5,
+            calibration_slope=1.0, max_std=0.2, metrics={"mae": 0.4, "spearman": None},
+        )
+        predictor = DistilledPredictor([feature], np.ones((1, 4, 3)), np.zeros(2), np.ones(2), use_embeddings=False)
+        inputs = np.array([[1.0, 2.0], [np.nan, 0.0]])
+
+        with tempfile.TemporaryDirectory() as directory:
+            predictor.save(directory)
+            loaded = DistilledPredictor.load(directory)
+
+        for expected, actual in zip(predictor.predict(inputs), loaded.predict(inputs)):
+            np.testing.assert_array_equal(expected, actual)
+        self.assertEqual(loaded.features, [feature])
+
+
+if __name__ == "__main__":
+    unittest.main()
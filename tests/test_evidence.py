@@ -0,0 +1,52 @@
+import unittest
+
+from evidence import EvidenceIndex, check_explanation, extract_spans
+
+
+CONVERSATION = "Honestly, I started the company in my garage and then we failed twice before anything worked. It's what I've learned."
+
+
+class EvidenceIndexTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.index = EvidenceIndex(CONVERSATION)
+
+    def test_verbatim_span(self) -> None:
+        self.assertTrue(self.index.contains("I started the company in my garage"))
+
+    def test_case_and_punctuation_are_ignored(self) -> None:
+        self.assertTrue(self.index.contains("honestly i started THE company"))
+        self.assertTrue(self.index.contains("It’s what I’ve learned"))
+
+    def test_light_paraphrase_matches_on_trigrams(self) -> None:
+        # One word changed at the end: 9 of the 10 trigrams are in the conversation
+        self.assertTrue(self.index.contains("I started the company in my garage and then we failed three"))
+
+    def test_elided_span_is_checked_by_fragment(self) -> None:
+        self.assertTrue(self.index.contains("I started the company ... failed twice before anything worked"))
+        self.assertFalse(self.index.contains("I started the company ... sold it for a billion dollars"))
+
+    def test_fabricated_span(self) -> None:
+        self.assertFalse(self.index.contains("we raised a huge round from investors"))
+
+    def test_short_span_must_be_verbatim(self) -> None:
+        self.assertFalse(self.index.contains("garage then"))
+
+
+class CheckExplanationTest(unittest.TestCase):
+
+    def test_spans_are_extracted_from_quotes(self) -> None:
+        explanation = "The speaker is candid (\"we failed twice before anything worked\"), 'I started the company' and says \"yes\"."
+        self.assertEqual(extract_spans(explanation), ["we failed twice before anything worked", "I started the company"])
+
+    def test_fabricated_evidence(self) -> None:
+        check = check_explanation("Quotes: \"we raised a huge round\" and \"investors loved our pitch deck\".", CONVERSATION)
+        self.assertEqual((check.num_spans, check.num_verified), (2, 0))
+        self.assertFalse(check.verified)
+
+    def test_no_quote_is_verified(self) -> None:
+        self.assertTrue(check_explanation("A warm and candid tone overall.", CONVERSATION).verified)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+
+from model import Feature
+from matrix_completion import CompletedScores, SparseScoringReport, complete_matrix, completed_scores_per_conversation, initial_design
+
+
+def _feature(name: str) -> Feature:
+    return Feature(name=name, description=name, description_min_value="low", description_max_value="high")
+
+
+class CompleteMatrixTest(unittest.TestCase):
+
+    def test_recovers_a_low_rank_matrix(self) -> None:
+        rng = np.random.default_rng(0)
+        truth = 5.0 + np.outer(rng.normal(size=40), rng.normal(size=8))
+        observed = np.where(rng.random(truth.shape) < 0.5, truth, np.nan)
+
+        completed = complete_matrix(observed, rank=1, rng=rng, regularization=0.01)
+
+        missing = np.isnan(observed)
+        completion_rmse = np.sqrt(np.mean((completed[missing] - truth[missing]) ** 2))
+        # Baseline: imputing the feature means (the rank-0 completion)
+        feature_means = np.broadcast_to(np.nanmean(observed, axis=0), truth.shape)
+        baseline_rmse = np.sqrt(np.mean((feature_means[missing] - truth[missing]) ** 2))
+        self.assertLess(completion_rmse, 0.25 * baseline_rmse)
+
+    def test_scores_stay_on_the_scale(self) -> None:
+        observed = np.array([[0.0, 10.0], [10.0, np.nan], [np.nan, 0.0]])
+        completed = complete_matrix(observed, rank=1, rng=np.random.default_rng(0))
+        self.assertTrue(((completed >= 0.0) & (completed <= 10.0)).all())
+
+
+class InitialDesignTest(unittest.TestCase):
+
+    def test_every_feature_is_covered_evenly(self) -> None:
+        cells = initial_design(num_conversations=10, num_features=6, cells_per_conversation=3, rng=np.random.default_rng(0))
+
+        self.assertEqual(len(cells), 30)
+        self.assertEqual(len(set(cells)), 30)
+        coverage = np.bincount([j for _, j in cells], minlength=6)
+        self.assertEqual(coverage.tolist(), [5] * 6)
+
+
+class CompletedScoresTest(unittest.TestCase):
+
+    def test_one_stat_per_cell(self) -> None:
+        features = [_feature("warmth"), _feature("humor")]
+        report = SparseScoringReport(num_cells=4, num_scored_cells=3, num_calls=3, dense_num_calls=4, call_savings=0.25, target_rmse=0.75, reached_target=True, rounds=[])
+        completed = CompletedScores(scores=[[7.0, 2.0], [6.0, 3.5]], uncertainties=[[0.0, 0.0], [0.0, 0.4]], scored=[[True, True], [True, False]], report=report)
+
+        per_conversation_stats = completed_scores_per_conversation(completed, features)
+
+        self.assertEqual([[stats.average_score for stats in conversation] for conversation in per_conversation_stats], [[7.0, 2.0], [6.0, 3.5]])
+        self.assertIn("Imputed", per_conversation_stats[1][1].evaluations[0].explanation)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from proxy_metrics import tokenize
+
+
+class LexiconCountTest(unittest.TestCase):
+
+    def test_symbols_are_counted_after_digits(self) -> None:
+        self.assertEqual(tokenize(["It went up 5% and then 20 percent."]).counts["units"], 2)
+
+    def test_longest_phrase_wins_without_overlap(self) -> None:
+        counts = tokenize(["That makes sense, I mean it."]).counts
+        self.assertEqual(counts["empathy_markers"], 1) # "that makes sense", not also "makes sense"
+        self.assertEqual(counts["fillers"], 1) # "i mean"
+        self.assertEqual(counts["first_person_singular"], 1) # the "i" of "i mean" (another lexicon)
+
+    def test_phrases_do_not_span_sentences(self) -> None:
+        self.assertEqual(tokenize(["Go there, I. Think about it."]).counts["hedges"], 0)
+        self.assertEqual(tokenize(["I think so."]).num_transition_sentences, 0)
+        self.assertEqual(tokenize(["Hello. Then we left. Fine."]).num_transition_sentences, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+import constants
+
+from score_store import ScoreStore, cell_key, conversation_hash, feature_hash, plan_missing_cells, scoring_config_hash
+from model import Feature, FeatureEvaluation
+
+
+FEATURE = Feature(name="warmth", description="How warm the speaker is", description_min_value="cold", description_max_value="warm")
+
+
+class ScoreStoreTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = self._directory.name
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def test_round_trip(self) -> None:
+        store = ScoreStore(self.directory)
+        _conversation_hash = store.add_conversation("hello there")
+        key = cell_key(feature_hash(FEATURE), _conversation_hash, "openai/gpt-4.1-mini", "full")
+        store.add(key, FeatureEvaluation(feature=FEATURE, explanation="friendly", score=7.0))
+        store.add(key, FeatureEvaluation(feature=FEATURE, explanation="friendly", score=8.0))
+
+        reloaded = ScoreStore(self.directory)
+        self.assertEqual(reloaded.count(key), 2)
+        self.assertEqual([evaluation.score for evaluation in reloaded.evaluations(key)], [7.0, 8.0])
+
+    def test_record_id_is_added_once(self) -> None:
+        store = ScoreStore(self.directory)
+        key = cell_key(feature_hash(FEATURE), conversation_hash("hello there"), "openai/gpt-4.1-mini", "full")
+        evaluation = FeatureEvaluation(feature=FEATURE, explanation="friendly", score=7.0)
+
+        self.assertTrue(store.add(key, evaluation, record_id="worker-1/1"))
+        self.assertFalse(store.add(key, evaluation, record_id="worker-1/1"))
+        # e.g. a coordinator collecting again after a crash
+        self.assertFalse(ScoreStore(self.directory).add(key, evaluation, record_id="worker-1/1"))
+        self.assertEqual(ScoreStore(self.directory).count(key), 1)
+
+    def test_conversations_are_stored_once(self) -> None:
+        store = ScoreStore(self.directory)
+        store.add_conversation("hello there")
+        store.add_conversation("hello there")
+
+        with open(os.path.join(self.directory, "conversations.jsonl")) as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_malformed_line_is_skipped(self) -> None:
+        store = ScoreStore(self.directory)
+        key = cell_key(feature_hash(FEATURE), conversation_hash("hello there"), "openai/gpt-4.1-mini", "full")
+        store.add(key, FeatureEvaluation(feature=FEATURE, explanation="friendly", score=7.0))
+
+        with open(os.path.join(self.directory, "scores.jsonl"), "a") as f:
+            f.write('{"key": {"feature_hash"') # interrupted write
+
+        self.assertEqual(ScoreStore(self.directory).count(key), 1)
+
+    def test_plan_only_schedules_missing_calls(self) -> None:
+        store = ScoreStore(self.directory)
+        conversations = ["hello there", "how are you"]
+        key = cell_key(feature_hash(FEATURE), conversation_hash(conversations[0]), "openai/gpt-4.1-mini", "full")
+        store.add(key, FeatureEvaluation(feature=FEATURE, explanation="friendly", score=7.0))
+
+        jobs = plan_missing_cells(store, conversations, [FEATURE], ["openai/gpt-4.1-mini"], num_evaluations_per_model=2, profile="full")
+
+        self.assertEqual([(job.conversation_index, job.num_missing) for job in jobs], [(0, 1), (1, 2)])
+
+    def test_edited_feature_misses_the_store(self) -> None:
+        edited = FEATURE.model_copy(update={"description": "How warm and kind the speaker is"})
+        self.assertNotEqual(feature_hash(FEATURE), feature_hash(edited))
+
+    def test_evidence_verification_is_part_of_the_scoring_config(self) -> None:
+        original = constants.EVIDENCE_VERIFICATION
+        try:
+            hashes = set()
+            for mode in ["off", "flag", "drop"]:
+                constants.EVIDENCE_VERIFICATION = mode
+                hashes.add(scoring_config_hash("full"))
+        finally:
+            constants.EVIDENCE_VERIFICATION = original
+
+        self.assertEqual(len(hashes), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()